@@ -0,0 +1,40 @@
+import time
+from imports.mcp.base import MCPServer
+
+
+def tool_result(name: str, arguments: dict, text: str) -> dict:
+    """Result in the shape returned by BaseToolsMCP tools."""
+    return {"tool_name": name, "tool_arguments": arguments, "tool_result": text, "truncate": False, "error": None}
+
+
+DEFAULT_RESULTS = {
+    "fetch_weather": "Kyiv: 14.2°C, wind 11 km/h, partly cloudy.",
+    "web_search": "1. SpaceX launches Starship flight test - https://example.com/starship\n2. Falcon 9 completes 300th landing - https://example.com/falcon",
+    "web_fetch": "Starship lifted off at 07:00 local time and completed its flight test, including a booster catch.",
+}
+
+
+class BenchToolsMCP(MCPServer):
+    """Offline stand-in for the tool and memory servers used by benchmarks.
+
+    Tool results are canned (``results`` overrides them per tool name) and every
+    call sleeps for ``latency_ms`` to mimic network tools.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, results: dict | None = None) -> None:
+        self.latency_ms = latency_ms
+        self.results = dict(DEFAULT_RESULTS)
+        self.results.update(results or {})
+        self.calls: dict[str, int] = {}
+
+    def _rpc_tool_execute(self, params: dict):
+        name = params.get("name", "")
+        arguments = params.get("arguments", {})
+        self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency_ms / 1000.0)
+
+        if name in ("search_memory", "search_archived_messages"):
+            return {"results": []}
+        if name in ("save_memory", "save_archived_message"):
+            return {"status": "saved"}
+        return tool_result(name, arguments, self.results.get(name, f"{name} completed."))
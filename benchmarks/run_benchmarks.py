@@ -0,0 +1,316 @@
+"""Offline end-to-end pipeline benchmarks.
+
+Runs scripted scenarios against a local stub LLM provider (both provider
+structures), directly through ``PipelineEngine.run_pipeline`` and end to end
+through the ``MessageBus`` and backend worker. Reports LLM calls, bytes sent
+and p50/p95 wall time per scenario.
+
+With ``--replay PATH`` the recorded pipeline inputs of a traffic archive
+(``traffic.mode: "record"``) are run again against the archived provider
+responses instead, comparing latency, LLM calls and prompt bytes with the
+recording.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --iterations 20 --latency-ms 50
+    python -m benchmarks.run_benchmarks --replay logs/traffic --replay-speed 0
+"""
+import argparse
+import copy
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+from imports.agent.pipeline.pipeline_engine import PipelineEngine
+from imports.history_manager import ChatHistories, HistoryManager, HistoryRecord
+from imports.mcp.connector import MCPConnector
+from imports.messaging.backend_worker import backend_worker_loop
+from imports.messaging.message_models import AgentRequest
+from imports.messaging.queue_manager import MessageBus
+from imports.payload_logger import payload_logger
+from imports.providers_manager import Model, ProvidersManager
+from imports.tracing import tracer
+from imports.traffic_archive import traffic_archive
+from imports.usage_tracker import usage_tracker
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stub_provider import StubProvider
+
+CONFIG_PATH = "./config/config.json"
+MCP_CONFIG_PATH = "./config/mcp_config.json"
+STRUCTURES = {"google": "google-compatible", "openai": "openai-compatible"}
+BENCH_TOOLS = ("fetch_weather", "web_search", "web_fetch", "save_memory", "search_memory", "save_archived_message", "search_archived_messages")
+RESPONSE_TIMEOUT = 120
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def build_app_config(base_config: dict, base_url: str, structure: str, log_dir: str, stream: bool, prompt_cache: bool = False) -> dict:
+    """Repository config with providers, caches and side channels pointed at the benchmark sandbox."""
+    config = copy.deepcopy(base_config)
+    # Cache every prefix, however small, so the stub's prompts exercise the cache path
+    prompt_cache_config = {"active": prompt_cache, "min_chars": 1}
+    config["providers"] = [
+        {"name": "stub-google", "endpoint": f"{base_url}/v1beta/models/", "structure": "google-compatible", "prompt_cache": prompt_cache_config},
+        {"name": "stub-openai", "endpoint": f"{base_url}/v1/", "structure": "openai-compatible", "prompt_cache": prompt_cache_config,
+         "capabilities": {"stream_usage": True}},
+    ]
+    provider = "stub-google" if structure == "google" else "stub-openai"
+    config["agent"] = {"model": {"provider": provider, "model_id": "bench-model", "api_key_name": None}}
+    config["response_cache"] = {"active": False}
+    config["router_classifier"] = {"active": False}
+    config.setdefault("pipeline", {})["stream_responses"] = stream
+    config.setdefault("context", {})["prompts_path"] = "./config/prompts.json"
+    config["logging"] = {"streams": {
+        "role_payload": {"path": os.path.join(log_dir, "role_payload.json")},
+        "provider_payload": {"path": os.path.join(log_dir, "payloads_log.json")},
+        "usage": {"path": os.path.join(log_dir, "usage.json")},
+    }}
+    return config
+
+
+def build_mcp_config(scenario: dict, tool_latency_ms: float) -> dict:
+    """Prompt builder from the repository config plus the offline tool server."""
+    with open(MCP_CONFIG_PATH, "r", encoding="utf-8") as f:
+        servers = json.load(f)["servers"]
+    prompt_server = next(s for s in servers if s["name"] == "prompt_builder")
+    tools = [tool for server in servers for tool in server.get("tools", []) if tool.get("name") in BENCH_TOOLS]
+    abilities = [ability for server in servers if server["name"] in ("base_tools", "memory") for ability in server.get("abilities", [])]
+    return {"servers": [
+        prompt_server,
+        {
+            "name": "bench_tools",
+            "type": "local_class",
+            "class": "benchmarks.bench_mcp.BenchToolsMCP",
+            "init_params": {"latency_ms": tool_latency_ms, "results": scenario.get("tool_results", {})},
+            "tools": tools,
+            "prompts": [],
+            "abilities": abilities,
+        },
+    ]}
+
+
+class ScenarioRunner:
+    """Builds a pipeline for one scenario and structure and times its runs."""
+
+    def __init__(self, stub: StubProvider, scenario: dict, app_config: dict, tool_latency_ms: float, workers: int) -> None:
+        self.stub = stub
+        self.scenario = scenario
+        app_config = copy.deepcopy(app_config)
+        app_config["pipeline"].update(scenario.get("pipeline", {}))
+        self.mcp_connector = MCPConnector(build_mcp_config(scenario, tool_latency_ms), app_config=app_config)
+        providers_manager = ProvidersManager(app_config["providers"])
+        model = Model(**app_config["agent"]["model"])
+        self.engine = PipelineEngine(providers_manager, model, app_config, mcp_connector=self.mcp_connector)
+        self.workers = workers
+        self._bus = None
+        self._bus_history = None
+
+    def run_engine(self) -> float:
+        """One run of `run_pipeline` on a fresh history. Returns wall time in seconds."""
+        history_manager = HistoryManager()
+        history_manager.add_dialog_record("user", self.scenario["input"])
+        payload = {"input_message": {"text": self.scenario["input"], "image_hashes": []}}
+        started = time.perf_counter()
+        self.engine.run_pipeline(payload, history_manager, send_status=lambda msg: None, send_partial=lambda text: None)
+        return time.perf_counter() - started
+
+    def run_bus(self) -> float:
+        """One request through the MessageBus and backend worker, until the final response."""
+        if self._bus is None:
+            self._bus = MessageBus()
+            histories = ChatHistories()
+            self._bus_history = histories.get("bench")
+            threading.Thread(
+                target=backend_worker_loop,
+                args=(self._bus, self.engine, histories, self.workers),
+                daemon=True,
+            ).start()
+        # Keep every run below the summary threshold
+        with self._bus_history._lock:
+            self._bus_history.conversational_history = []
+
+        background_calls = self.stub.get_stats()["calls"].get("MemoryCreation", 0)
+        started = time.perf_counter()
+        self._bus.send_to_backend(AgentRequest(frontend_type="bench", chat_id="bench", action="message", text=self.scenario["input"]))
+        deadline = started + RESPONSE_TIMEOUT
+        while True:
+            response = self._bus.backend_to_frontend.get(timeout=max(0.1, deadline - time.perf_counter()))
+            if response.type == "final_response":
+                elapsed = time.perf_counter() - started
+                break
+        # Let the post-pipeline MemoryCreation call finish so it does not leak into the next run
+        while self.stub.get_stats()["calls"].get("MemoryCreation", 0) <= background_calls and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        return elapsed
+
+
+def run_case(stub: StubProvider, runner: ScenarioRunner, mode: str, iterations: int, latency: dict) -> dict:
+    run = runner.run_engine if mode == "engine" else runner.run_bus
+    script = runner.scenario["script"]
+
+    # Warm-up run (connection pool, imports, first prompt builds)
+    stub.load_script(script, latency)
+    run()
+
+    stub.reset_stats()
+    usage_tracker.reset()
+    durations = []
+    for _ in range(iterations):
+        stub.load_script(script, latency)
+        durations.append(run())
+    stats = stub.get_stats()
+    usage = usage_tracker.get_stats()["total"]
+    return {
+        "scenario": runner.scenario["name"],
+        "mode": mode,
+        "iterations": iterations,
+        "llm_calls_per_run": stats["total_calls"] / iterations,
+        "calls_per_role": {role: count / iterations for role, count in sorted(stats["calls"].items())},
+        "bytes_sent_per_run": stats["total_bytes"] / iterations,
+        "tokens_per_run": usage["total_tokens"] / iterations,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "mean_ms": sum(durations) / len(durations) * 1000,
+    }
+
+
+def print_report(structure: str, results: list[dict]) -> None:
+    print(f"\n== {STRUCTURES[structure]} ==")
+    print(f"{'scenario':<28}{'mode':<8}{'calls':>7}{'bytes':>10}{'tokens':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['scenario']:<28}{r['mode']:<8}{r['llm_calls_per_run']:>7.1f}{r['bytes_sent_per_run']:>10.0f}{r['tokens_per_run']:>9.0f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+        print(f"{'':<36}" + ", ".join(f"{role}={count:g}" for role, count in r["calls_per_role"].items()))
+
+
+def restore_history(records: list[dict]) -> HistoryManager:
+    history_manager = HistoryManager()
+    for record in records:
+        history_manager.conversational_history.append(HistoryRecord(
+            record["role"], record["message"],
+            datetime.strptime(record["create_time"], "%Y-%m-%d %H:%M:%S"),
+            record["hash"], image_hashes=record.get("image_hashes", []),
+        ))
+    return history_manager
+
+
+def run_replay(base_config: dict, path: str, speed: float, iterations: int, tool_latency_ms: float) -> list[dict]:
+    """Re-run every recorded pipeline input against the archived provider responses."""
+    traffic_archive.configure({"mode": "replay", "path": path, "speed": speed})
+    app_config = copy.deepcopy(base_config)
+    app_config["response_cache"] = {"active": False}
+    # Keys are never sent while replaying, but models still look them up
+    for name in re.findall(r'"api_key_name":\s*"([^"]+)"', json.dumps(app_config.get("agent", {}))):
+        os.environ.setdefault(name, "replay")
+
+    mcp_connector = MCPConnector(build_mcp_config({}, tool_latency_ms), app_config=app_config)
+    providers_manager = ProvidersManager(app_config["providers"])
+    model = Model(**app_config["agent"]["model"])
+    engine = PipelineEngine(providers_manager, model, app_config, mcp_connector=mcp_connector)
+
+    results = []
+    for recorded in traffic_archive.iter_inputs():
+        durations = []
+        for _ in range(iterations):
+            traffic_archive.reset_replay()
+            history_manager = restore_history(recorded["history"])
+            started = time.perf_counter()
+            with traffic_archive.replay_session(recorded["session"]):
+                engine.run_pipeline(recorded["payload"], history_manager, send_status=lambda msg: None, send_partial=lambda text: None)
+            durations.append(time.perf_counter() - started)
+        replayed = traffic_archive.get_replay_stats(recorded["session"])
+        results.append({
+            "session": recorded["session"],
+            "input": recorded["payload"].get("input_message", {}).get("text", "")[:40],
+            "recorded_ms": recorded["duration_ms"],
+            "recorded_calls": len(recorded["requests"]),
+            "recorded_bytes": sum(r["request_bytes"] for r in recorded["requests"]),
+            "replayed_calls": replayed["calls"],
+            "replayed_bytes": replayed["request_bytes"],
+            "misses": replayed["misses"],
+            "p50_ms": percentile(durations, 50) * 1000,
+            "p95_ms": percentile(durations, 95) * 1000,
+        })
+    return results
+
+
+def print_replay_report(results: list[dict]) -> None:
+    print(f"\n== replay ({traffic_archive.path}, speed {traffic_archive.speed:g}) ==")
+    print(f"{'input':<42}{'calls':>11}{'bytes':>19}{'rec ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        calls = f"{r['recorded_calls']}->{r['replayed_calls']}"
+        sent = f"{r['recorded_bytes']}->{r['replayed_bytes']}"
+        print(f"{r['input']:<42}{calls:>11}{sent:>19}{r['recorded_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    print(f"Matches: {traffic_archive.get_replay_stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks against a stub LLM provider.")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Injected latency per LLM call.")
+    parser.add_argument("--tool-latency-ms", type=float, default=20.0, help="Injected latency per tool call.")
+    parser.add_argument("--structure", choices=["google", "openai", "both"], default="both")
+    parser.add_argument("--mode", choices=["engine", "bus", "both"], default="both")
+    parser.add_argument("--scenario", action="append", help="Scenario name (repeatable); all by default.")
+    parser.add_argument("--workers", type=int, default=1, help="Backend worker pool size in bus mode.")
+    parser.add_argument("--no-stream", action="store_true", help="Disable Formatter streaming.")
+    parser.add_argument("--prompt-cache", action="store_true", help="Enable provider prompt caching (Gemini cachedContents, cache_prompt).")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--replay", metavar="PATH", help="Replay the pipeline inputs recorded in this traffic archive.")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Replay speed factor (0 = no recorded delays).")
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        base_config = json.load(f)
+    tracer.configure({"active": False})
+
+    if args.replay:
+        results = run_replay(base_config, args.replay, args.replay_speed, args.iterations, args.tool_latency_ms)
+        print_replay_report(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"replay": results}, f, indent=2)
+            print(f"\nResults written to {args.json}")
+        return
+
+    with open(base_config.get("context", {}).get("prompts_path", "./config/prompts.json"), "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+
+    log_dir = tempfile.mkdtemp(prefix="tinyagent-bench-")
+    stub = StubProvider(prompts).start()
+    latency = {"default": args.latency_ms}
+    structures = ["google", "openai"] if args.structure == "both" else [args.structure]
+    modes = ["engine", "bus"] if args.mode == "both" else [args.mode]
+    scenarios = [s for s in SCENARIOS if not args.scenario or s["name"] in args.scenario]
+
+    report = {}
+    try:
+        for structure in structures:
+            app_config = build_app_config(base_config, stub.base_url, structure, log_dir, stream=not args.no_stream, prompt_cache=args.prompt_cache)
+            payload_logger.configure(app_config["logging"])
+            results = []
+            for scenario in scenarios:
+                runner = ScenarioRunner(stub, scenario, app_config, args.tool_latency_ms, args.workers)
+                for mode in modes:
+                    results.append(run_case(stub, runner, mode, args.iterations, latency))
+            print_report(structure, results)
+            report[structure] = results
+    finally:
+        stub.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
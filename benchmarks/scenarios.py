@@ -0,0 +1,163 @@
+"""Scripted benchmark scenarios.
+
+Each scenario has a user ``input``, a ``script`` of replies per role (see
+StubProvider), optional ``tool_results`` overriding BenchToolsMCP output and
+optional ``pipeline`` settings applied on top of config.json.
+Roles that are not scripted get an empty ``{"result": {}}`` reply.
+"""
+
+
+def _reply(notes: str, **result) -> dict:
+    return {"notes": notes, "result": result}
+
+
+MEMORY_SKIP = _reply("No past context needed.", action="skip", query="")
+MEMORY_CREATION_SKIP = {"notes": "Nothing to remember.", "create_memory": False}
+VERIFIED = _reply("The step result satisfies the goal.", resolution="success")
+
+SCENARIOS = [
+    {
+        "name": "conversation",
+        "input": "Hi! How was your day?",
+        "script": {
+            "MemoryRetrieval": [MEMORY_SKIP],
+            "Router": [_reply(
+                "Small talk.", type="conversation", allowed=True,
+                task_summary="User greets the agent and asks about its day.",
+                answer="My day was good, thanks for asking.",
+            )],
+            "PersonalityFormatter": [_reply(
+                "Friendly tone.",
+                final_user_message="Hey! My day has been great, thanks for asking. How about yours?",
+            )],
+            "MemoryCreation": [MEMORY_CREATION_SKIP],
+        },
+    },
+    {
+        "name": "task_single_step",
+        "input": "What's the weather in Kyiv right now?",
+        "script": {
+            "MemoryRetrieval": [MEMORY_SKIP],
+            "Router": [_reply(
+                "Needs the weather tool.", type="task", allowed=True,
+                task_summary="Report the current weather in Kyiv.", answer="",
+            )],
+            "TaskDeconstructor": [
+                _reply("Fetch the weather first.", decision="next_task", next_task={"id": 1, "description": "Fetch the current weather in Kyiv."}),
+                _reply("Weather fetched.", decision="task_completed"),
+            ],
+            "Worker": [_reply(
+                "Call fetch_weather.", action="tool", tool_name="fetch_weather",
+                arguments={"location": "Kyiv"}, message="", status="success",
+            )],
+            "Verifier": [VERIFIED],
+            "Aggregator": [_reply("Single fact.", answer="It is 14.2°C and partly cloudy in Kyiv, wind 11 km/h.")],
+            "PersonalityFormatter": [_reply(
+                "Concise.",
+                final_user_message="Right now Kyiv has 14°C with some clouds and a light 11 km/h wind.",
+            )],
+            "MemoryCreation": [MEMORY_CREATION_SKIP],
+        },
+    },
+    {
+        "name": "task_multi_step",
+        "input": "Find the latest SpaceX news, read the top article and summarize it.",
+        # Long fetch result so tasks_history compaction kicks in
+        "tool_results": {"web_fetch": "Starship flight test report. " + "Detailed telemetry and commentary. " * 120},
+        "script": {
+            "MemoryRetrieval": [MEMORY_SKIP],
+            "Router": [_reply(
+                "Needs web search.", type="task", allowed=True,
+                task_summary="Find the latest SpaceX news, read the top article and summarize it.", answer="",
+            )],
+            "TaskDeconstructor": [
+                _reply("Search first.", decision="next_task", next_task={"id": 1, "description": "Search the web for the latest SpaceX news."}),
+                _reply("Read the top result.", decision="next_task", next_task={"id": 2, "description": "Fetch https://example.com/starship."}),
+                _reply("Summarize.", decision="next_task", next_task={"id": 3, "description": "Summarize the fetched article in three sentences."}),
+                _reply("Done.", decision="task_completed"),
+            ],
+            "Worker": [
+                _reply("Search.", action="tool", tool_name="web_search", arguments={"query": "SpaceX latest news", "count": 5}, message="", status="success"),
+                _reply("Fetch.", action="tool", tool_name="web_fetch", arguments={"url": "https://example.com/starship"}, message="", status="success"),
+                _reply("Summarize.", action="text", tool_name="", arguments={}, status="success",
+                       message="Starship completed its flight test with a booster catch; telemetry looked nominal."),
+            ],
+            "Verifier": [VERIFIED],
+            "HistoryCompressor": [_reply("Kept facts.", compressed_text="Starship flight test completed at 07:00 local time, booster caught.")],
+            "Aggregator": [_reply("Combine steps.", answer="SpaceX completed a Starship flight test at 07:00 local time, including a booster catch.")],
+            "PersonalityFormatter": [_reply(
+                "Informative.",
+                final_user_message="Big SpaceX news: Starship just finished a flight test, and the booster was caught on return!",
+            )],
+            "MemoryCreation": [MEMORY_CREATION_SKIP],
+        },
+    },
+]
+
+# The conversation with the Router writing the reply itself (no Formatter call)
+_conversation = SCENARIOS[0]
+SCENARIOS.append({
+    "name": "conversation_direct",
+    "input": _conversation["input"],
+    "pipeline": {"direct_conversation": {"active": True}},
+    "script": dict(
+        _conversation["script"],
+        Router=[_reply(
+            "Small talk.", type="conversation", allowed=True,
+            final_user_message="Hey! My day has been great, thanks for asking. How about yours?",
+            task_summary="User greets the agent and asks about its day.",
+            answer="My day was good, thanks for asking.",
+        )],
+    ),
+})
+
+# The single-step task with one FinalAnswer call instead of Aggregator + Formatter
+_single_step = SCENARIOS[1]
+SCENARIOS.append({
+    "name": "task_single_step_final",
+    "input": _single_step["input"],
+    "pipeline": {"fused_final_stage": {"active": True}},
+    "script": dict(
+        {role: replies for role, replies in _single_step["script"].items() if role not in ("Aggregator", "PersonalityFormatter")},
+        FinalAnswer=[_reply(
+            "Single fact, concise.",
+            final_user_message="Right now Kyiv has 14°C with some clouds and a light 11 km/h wind.",
+        )],
+    ),
+})
+
+# The multi-step task in fused step mode: each StepReview judges the step and plans
+# the next one, so the Verifier and all but the first Deconstructor call drop out
+_multi_step = SCENARIOS[2]
+SCENARIOS.append({
+    "name": "task_multi_step_fused",
+    "input": _multi_step["input"],
+    "tool_results": _multi_step["tool_results"],
+    "pipeline": {"step_mode": "fused"},
+    "script": dict(
+        _multi_step["script"],
+        TaskDeconstructor=_multi_step["script"]["TaskDeconstructor"][:1],
+        StepReview=[
+            _reply("Search results found.", resolution="success", confidence=0.9, decision="next_task",
+                   next_task={"id": 2, "description": "Fetch https://example.com/starship."}),
+            _reply("Article fetched.", resolution="success", confidence=0.9, decision="next_task",
+                   next_task={"id": 3, "description": "Summarize the fetched article in three sentences."}),
+            _reply("Summary written.", resolution="success", confidence=0.95, decision="task_completed"),
+        ],
+    ),
+})
+
+# The single-step task with malformed role output: the Worker's fenced, Python-style
+# JSON is repaired locally, the Deconstructor's prose answer costs one JsonRepair call
+_decomposition = _single_step["script"]["TaskDeconstructor"]
+SCENARIOS.append({
+    "name": "task_single_step_malformed",
+    "input": _single_step["input"],
+    "script": dict(
+        _single_step["script"],
+        Worker=["```json\n{'notes': 'Call fetch_weather.', 'result': {'action': 'tool', 'tool_name': 'fetch_weather', "
+                "'arguments': {'location': 'Kyiv',}, 'message': '', 'status': 'success', 'cached': True,},}\n```"],
+        TaskDeconstructor=[_decomposition[0], "The weather is fetched, so the task is completed."],
+        JsonRepair=[_decomposition[1]],
+    ),
+})
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# prompts.json key -> role name used in scripts and reports
+PROMPT_ROLES = {
+    "router_role_prompt": "Router",
+    "router_direct_role_prompt": "Router",
+    "memory_retrieval_role_prompt": "MemoryRetrieval",
+    "deconstructor_role_prompt": "TaskDeconstructor",
+    "worker_role_prompt": "Worker",
+    "verifier_role_prompt": "Verifier",
+    "aggregator_role_prompt": "Aggregator",
+    "formatter_role_prompt": "PersonalityFormatter",
+    "history_compressor_role_prompt": "HistoryCompressor",
+    "summary_role_prompt": "Summary",
+    "memory_creation_role_prompt": "MemoryCreation",
+    "step_review_role_prompt": "StepReview",
+    "final_answer_role_prompt": "FinalAnswer",
+    "json_repair_prompt": "JsonRepair",
+}
+SIGNATURE_CHARS = 80
+STREAM_CHUNK_CHARS = 24
+
+
+class StubProvider:
+    """Local LLM endpoint speaking both provider structures.
+
+    - google-compatible: ``POST /v1beta/models/<model>:generateContent`` and
+      ``:streamGenerateContent?alt=sse``
+    - openai-compatible: ``POST /v1/chat/completions`` (``"stream": true`` for SSE)
+    - Gemini context caching: ``POST /v1beta/cachedContents`` registers a prompt
+      prefix that later requests reference with ``cachedContent``
+
+    The calling role is recognised from its system prompt. Responses come from
+    a script: role -> list of replies consumed in order (the last one repeats),
+    each reply a dict (sent as JSON) or a string. ``latency_ms`` maps role ->
+    injected delay before the reply; ``"default"`` applies to unlisted roles.
+    Token usage (~4 characters per token of request and reply) is reported like
+    the real APIs do: ``usageMetadata`` / ``usage``, in the last stream event.
+    """
+
+    def __init__(self, prompts: dict[str, str], host: str = "127.0.0.1", port: int = 0) -> None:
+        self._signatures = {
+            text[:SIGNATURE_CHARS]: PROMPT_ROLES[key]
+            for key, text in prompts.items() if key in PROMPT_ROLES and text
+        }
+        self._lock = threading.Lock()
+        self._script: dict[str, list] = {}
+        self._positions: dict[str, int] = {}
+        self._cached_contents: dict[str, list[dict]] = {}
+        self.latency_ms: dict[str, float] = {"default": 0.0}
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubProvider":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def load_script(self, script: dict[str, list], latency_ms: dict[str, float] | None = None) -> None:
+        """Replace the scripted replies (and latencies) for the next run."""
+        with self._lock:
+            self._script = {role: list(replies) for role, replies in script.items()}
+            self._positions = {}
+            if latency_ms is not None:
+                self.latency_ms = dict(latency_ms)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls: dict[str, int] = {}
+            self.bytes_received: dict[str, int] = {}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "bytes_received": dict(self.bytes_received),
+                "total_calls": sum(self.calls.values()),
+                "total_bytes": sum(self.bytes_received.values()),
+            }
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _detect_role(self, texts: list[str]) -> str:
+        for text in texts:
+            for signature, role in self._signatures.items():
+                if signature in text:
+                    return role
+        return "Unknown"
+
+    def _next_reply(self, role: str, body_size: int) -> tuple[str, float]:
+        with self._lock:
+            self.calls[role] = self.calls.get(role, 0) + 1
+            self.bytes_received[role] = self.bytes_received.get(role, 0) + body_size
+            replies = self._script.get(role) or [{"notes": "stub", "result": {}}]
+            position = self._positions.get(role, 0)
+            self._positions[role] = position + 1
+            reply = replies[min(position, len(replies) - 1)]
+            latency = self.latency_ms.get(role, self.latency_ms.get("default", 0.0))
+        text = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+        return text, latency / 1000.0
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this the client waits on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    body = json.loads(raw)
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid JSON"}})
+                    return
+
+                if self.path.endswith("/cachedContents"):
+                    with stub._lock:
+                        name = f"cachedContents/{len(stub._cached_contents) + 1}"
+                        stub._cached_contents[name] = body.get("contents", [])
+                        stub.calls["PromptCache"] = stub.calls.get("PromptCache", 0) + 1
+                        stub.bytes_received["PromptCache"] = stub.bytes_received.get("PromptCache", 0) + len(raw)
+                    self._send_json(200, {"name": name, "model": body.get("model")})
+                    return
+                if ":generateContent" in self.path or ":streamGenerateContent" in self.path:
+                    structure = "google"
+                    contents = body.get("contents", [])
+                    if body.get("cachedContent"):
+                        cached = stub._cached_contents.get(body["cachedContent"])
+                        if cached is None:
+                            self._send_json(404, {"error": {"message": f"{body['cachedContent']} not found"}})
+                            return
+                        contents = cached + contents
+                    texts = [part.get("text", "") for content in contents for part in content.get("parts", [])]
+                    stream = ":streamGenerateContent" in self.path
+                elif self.path.endswith("/chat/completions"):
+                    structure = "openai"
+                    texts = [m["content"] if isinstance(m["content"], str) else json.dumps(m["content"]) for m in body.get("messages", [])]
+                    stream = bool(body.get("stream"))
+                else:
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+
+                text, delay = stub._next_reply(stub._detect_role(texts), len(raw))
+                time.sleep(delay)
+                prompt_tokens, output_tokens = len(raw) // 4, len(text) // 4 + 1
+                if structure == "google":
+                    usage = {"usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                                               "totalTokenCount": prompt_tokens + output_tokens}}
+                else:
+                    usage = {"usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens,
+                                       "total_tokens": prompt_tokens + output_tokens}}
+                if stream:
+                    include_usage = structure == "google" or (body.get("stream_options") or {}).get("include_usage")
+                    self._send_stream(structure, text, usage if include_usage else {})
+                elif structure == "google":
+                    self._send_json(200, dict(usage, candidates=[{"content": {"role": "model", "parts": [{"text": text}]}}]))
+                else:
+                    self._send_json(200, dict(usage, choices=[{"index": 0, "message": {"role": "assistant", "content": text}}]))
+
+            def _send_json(self, code: int, data: dict) -> None:
+                payload = json.dumps(data).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, structure: str, text: str, usage: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(text), STREAM_CHUNK_CHARS):
+                    piece = text[i:i + STREAM_CHUNK_CHARS]
+                    if structure == "google":
+                        event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+                    else:
+                        event = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+                    if structure == "google" and i + STREAM_CHUNK_CHARS >= len(text):
+                        event.update(usage)
+                    self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if structure == "openai" and usage:
+                    self._write_chunk(f"data: {json.dumps(dict(usage, choices=[]))}\n\n".encode("utf-8"))
+                if structure == "openai":
+                    self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        return Handler
@@ -0,0 +1,152 @@
+import json
+from imports.history_manager import HistoryRecord
+from imports.payload_logger import payload_logger
+
+DEFAULT_PRIORITY = ["memory", "history", "tasks_history", "tools", "identity"]
+
+
+def _serialize(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, HistoryRecord):
+        return value.message
+    if isinstance(value, list) and value and isinstance(value[0], HistoryRecord):
+        return "\n".join(record.message for record in value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class ContextPacker:
+    """Keeps role payloads inside per-role token budgets.
+
+    Token counts are estimated from serialized size (``chars_per_token``).
+    When a payload exceeds its role budget, sections are trimmed in
+    ``priority`` order, lowest priority first, until the payload fits:
+
+    - ``memory``: least relevant memories (end of list) are dropped
+    - ``history``: oldest dialog records are dropped
+    - ``tasks_history``: long step results are truncated, then oldest steps dropped
+    - ``tools``: parameter descriptions are removed
+    - ``identity``: the text is truncated
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.chars_per_token = float(config.get("chars_per_token", 4))
+        self.priority = list(config.get("priority", DEFAULT_PRIORITY))
+        self.min_history_records = int(config.get("min_history_records", 2))
+        self.min_tasks_history_entries = int(config.get("min_tasks_history_entries", 2))
+        self.result_chars = int(config.get("result_chars", 1500))
+        self.budgets = dict(config.get("roles", {}))
+
+    def estimate_tokens(self, value) -> int:
+        """Rough token estimate of a payload value."""
+        return int(len(_serialize(value)) / self.chars_per_token) + 1
+
+    def pack(self, role_name: str, payload: dict) -> dict:
+        """Return *payload* trimmed to the role budget. The input payload is not mutated."""
+        budget = self.budgets.get(role_name, self.budgets.get("default"))
+        if not budget:
+            return payload
+
+        sizes = {key: self.estimate_tokens(value) for key, value in payload.items()}
+        total = sum(sizes.values())
+        if total <= budget:
+            return payload
+
+        packed = dict(payload)
+        dropped = []
+        for section in self.priority:
+            if total <= budget:
+                break
+            if section not in packed:
+                continue
+            trim = getattr(self, f"_trim_{section}", None)
+            if trim is None:
+                continue
+            excess = total - budget
+            packed[section], note = trim(packed[section], excess)
+            new_size = self.estimate_tokens(packed[section])
+            if note:
+                dropped.append(f"{section}: {note} (~{sizes[section]} -> ~{new_size} tokens)")
+            total += new_size - sizes[section]
+            sizes[section] = new_size
+
+        if payload_logger.debug:
+            print(f"[DEBUG] ContextPacker({role_name}): budget {budget} tokens, packed to ~{total}. " + ("; ".join(dropped) or "nothing trimmable"))
+        if total > budget:
+            print(f"[DEBUG] ContextPacker({role_name}): still over budget after trimming all sections.")
+        return packed
+
+    # ------------------------------------------------------------------
+    # Section trimmers: (value, excess_tokens) -> (trimmed_value, note)
+    # ------------------------------------------------------------------
+
+    def _trim_memory(self, memories: list, excess: int) -> tuple[list, str]:
+        memories = list(memories)
+        removed = 0
+        while memories and excess > 0:
+            excess -= self.estimate_tokens(memories.pop())
+            removed += 1
+        return memories, f"dropped {removed} least relevant memories" if removed else ""
+
+    def _trim_history(self, records: list, excess: int) -> tuple[list, str]:
+        records = list(records)
+        removed = 0
+        while len(records) > self.min_history_records and excess > 0:
+            excess -= self.estimate_tokens(records.pop(0))
+            removed += 1
+        return records, f"dropped {removed} oldest records" if removed else ""
+
+    def _trim_tasks_history(self, entries: list, excess: int) -> tuple[list, str]:
+        entries = list(entries)
+        truncated = 0
+        # 1. Truncate long results of older steps (the latest step stays intact)
+        for i, entry in enumerate(entries[:-1]):
+            if excess <= 0:
+                break
+            result_text = _serialize(entry.get("result", ""))
+            if len(result_text) > self.result_chars:
+                before = self.estimate_tokens(entry)
+                entry = dict(entry)
+                entry["result"] = result_text[:self.result_chars] + "... (truncated by context packer)"
+                entries[i] = entry
+                excess -= before - self.estimate_tokens(entry)
+                truncated += 1
+        # 2. Drop the oldest steps
+        removed_ids = []
+        while len(entries) > self.min_tasks_history_entries and excess > 0:
+            entry = entries.pop(0)
+            excess -= self.estimate_tokens(entry)
+            removed_ids.append(entry.get("id"))
+        notes = []
+        if truncated:
+            notes.append(f"truncated {truncated} step results")
+        if removed_ids:
+            notes.append(f"dropped steps {removed_ids}")
+        return entries, ", ".join(notes)
+
+    def _trim_tools(self, tools: list, excess: int) -> tuple[list, str]:
+        compacted = []
+        removed = 0
+        for tool in tools:
+            tool = dict(tool)
+            params = tool.get("parameters")
+            if isinstance(params, dict) and isinstance(params.get("properties"), dict):
+                params = dict(params)
+                properties = {}
+                for name, prop in params["properties"].items():
+                    if isinstance(prop, dict) and "description" in prop:
+                        prop = {k: v for k, v in prop.items() if k != "description"}
+                        removed += 1
+                    properties[name] = prop
+                params["properties"] = properties
+                tool["parameters"] = params
+            compacted.append(tool)
+        if not removed:
+            return tools, ""
+        return compacted, f"removed {removed} parameter descriptions"
+
+    def _trim_identity(self, identity: str, excess: int) -> tuple[str, str]:
+        keep_chars = max(0, len(identity) - int(excess * self.chars_per_token))
+        if keep_chars >= len(identity):
+            return identity, ""
+        return identity[:keep_chars], f"truncated to {keep_chars} chars"
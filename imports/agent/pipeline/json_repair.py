@@ -0,0 +1,147 @@
+import json
+import re
+
+THINK_RE = re.compile(r"<think>.*?(</think>|$)", re.DOTALL)
+FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+def decode_json_object(text: str) -> tuple[dict | None, bool]:
+    """
+    Extracts the JSON object from a model response.
+
+    Returns (object, repaired). The first object is decoded as-is when possible;
+    otherwise a repaired copy is tried that fixes the usual slips: code fences,
+    single-quoted strings, Python literals, trailing commas, raw newlines in
+    strings and output cut off mid-object. Returns (None, False) when nothing
+    usable is found.
+    """
+    text = FENCE_RE.sub("", THINK_RE.sub("", text or ""))
+    start = text.find("{")
+    if start == -1:
+        return None, False
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        if isinstance(value, dict):
+            return value, False
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in _repair_candidates(text[start:]):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value, True
+    return None, False
+
+
+def _repair_candidates(text: str) -> list[str]:
+    """Rewrite *text* into strict JSON; the second candidate drops a cut-off last member."""
+    out = []
+    stack = []
+    quote = None
+    last_comma = None  # (output length, open brackets) before the last comma between members
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\" and i + 1 < len(text):
+                out.append(text[i:i + 2] if text[i + 1] != "'" else "'")
+                i += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            elif char == "\t":
+                out.append("\\t")
+            elif char != "\r":
+                out.append(char)
+            i += 1
+            continue
+
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                out.append(stack.pop())
+            if not stack:
+                break
+        elif char == ",":
+            last_comma = (len(out), list(stack))
+            out.append(char)
+        elif char.isalpha():
+            word = re.match(r"[A-Za-z_]+", text[i:]).group(0)
+            out.append(PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if not stack and not quote:
+        return ["".join(out)]
+
+    candidates = [_close("".join(out) + ('"' if quote else ""), stack)]
+    if last_comma:
+        length, open_brackets = last_comma
+        candidates.append(_close("".join(out[:length]), open_brackets))
+    return candidates
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close(text: str, stack: list[str]) -> str:
+    """Close the brackets left open by output that stopped early."""
+    text = text.rstrip().rstrip(",")
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def validate_json(value, schema: dict, path: str = "$") -> list[str]:
+    """
+    Checks *value* against the subset of JSON Schema role schemas use (type,
+    properties, required, items, enum). Returns a list of problems, empty when valid.
+    """
+    errors = []
+    expected = schema.get("type")
+    python_type = JSON_TYPES.get(expected)
+    if python_type and (not isinstance(value, python_type) or (isinstance(value, bool) and expected != "boolean")):
+        return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: missing required field '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value and value[key] is not None:
+                errors.extend(validate_json(value[key], subschema, f"{path}.{key}"))
+    elif isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate_json(item, schema["items"], f"{path}[{index}]"))
+    return errors
@@ -1,9 +1,20 @@
 import json
+import asyncio
+import functools
+import threading
 import traceback
-from typing import Callable, Optional
+import contextvars
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Optional
 from imports.providers_manager import ProvidersManager, Model
 from imports.history_manager import HistoryRecord
+from imports.payload_logger import payload_logger
+from imports.tracing import tracer
+from imports.traffic_archive import traffic_archive
+from imports.usage_tracker import usage_tracker
 from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.route_classifier import RouteClassifier
+from imports.agent.pipeline.context_packer import ContextPacker
 
 # Import Roles
 from imports.agent.roles.router_role import RouterRole
@@ -16,6 +27,11 @@ from imports.agent.roles.memory_retrieval_role import MemoryRetrievalRole
 from imports.agent.roles.memory_creation_role import MemoryCreationRole
 from imports.agent.roles.summary_role import SummaryRole
 from imports.agent.roles.history_compressor_role import HistoryCompressorRole
+from imports.agent.roles.step_review_role import StepReviewRole
+from imports.agent.roles.final_answer_role import FinalAnswerRole
+
+# Invalid output quoted back to the model when asking it to fix the JSON
+JSON_REPROMPT_MAX_CHARS = 8000
 
 class PipelineEngine:
     def __init__(self, providers_manager: ProvidersManager, model: Model, config: dict, image_manager=None, mcp_connector=None):
@@ -24,6 +40,51 @@ class PipelineEngine:
         self.config = config
         self.image_manager = image_manager
         self.mcp_connector = mcp_connector
+        self.role_models = self._build_role_models(config.get("agent", {}))
+
+        pipeline_config = config.get("pipeline", {})
+        self.context_deadline = float(pipeline_config.get("context_deadline", 20))
+        self.stream_responses = bool(pipeline_config.get("stream_responses", False))
+        compaction_config = pipeline_config.get("compaction", {})
+        self.compaction_enabled = bool(compaction_config.get("active", False))
+        self.compaction_threshold = int(compaction_config.get("entry_threshold_chars", 3000))
+        self.compaction_raw_for_aggregator = bool(compaction_config.get("raw_for_aggregator", False))
+        # "fused": the Worker reviews its own step result and plans the next step in one follow-up call
+        self.step_mode = pipeline_config.get("step_mode", "separate")
+        self.review_min_confidence = float(pipeline_config.get("fused_step", {}).get("min_confidence", 0.7))
+        self.direct_max_chars = int(pipeline_config.get("direct_conversation", {}).get("max_chars", 4000))
+        # One FinalAnswer call instead of Aggregator + Formatter at the end of a task
+        final_stage_config = pipeline_config.get("fused_final_stage", {})
+        self.fused_final_stage = bool(final_stage_config.get("active", False))
+        self.final_max_chars = int(final_stage_config.get("max_chars", 12000))
+        # One follow-up call to fix role output that is still invalid after local repair
+        self.json_reprompt = bool(pipeline_config.get("json_output", {}).get("reprompt", True))
+        self.json_stats = {"parsed": 0, "repaired": 0, "reprompted": 0, "failed": 0}
+        self._json_stats_lock = threading.Lock()
+        
+        # Roles whose byte-identical requests may be answered from the response cache
+        cache_config = config.get("response_cache", {})
+        self.cached_roles = set(cache_config.get("roles", [])) if cache_config.get("active", False) else set()
+        # Bounded executor shared by the other blocking calls of the async pipeline
+        # (role post-processing, history writes, classifier learning, asyncio.to_thread)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(pipeline_config.get("blocking_workers", 8)),
+            thread_name_prefix="pipeline-blocking",
+        )
+        # Small pool reserved for the blocking pre-routing lookups: they never queue
+        # behind role post-processing or other work on the shared executor
+        self._context_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(pipeline_config.get("context_workers", 4)),
+            thread_name_prefix="pipeline-context",
+        )
+        # Event loop thread running `run_pipeline` calls, started on first use
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_lock = threading.Lock()
+
+        # Per-role token budgets for role payloads
+        self.context_packer = ContextPacker(config.get("context_budget", {}))
+        # Per-role generation settings (output caps, thinking budgets, stop sequences, JSON mode)
+        self.generation_config = config.get("generation", {})
 
         # Initialize Roles
         self.router = RouterRole(self)
@@ -36,6 +97,29 @@ class PipelineEngine:
         self.memory_creation = MemoryCreationRole(self)
         self.summary = SummaryRole(self)
         self.history_compressor = HistoryCompressorRole(self)
+        self.step_review = StepReviewRole(self)
+        self.final_answer = FinalAnswerRole(self)
+        
+        # Optional local pre-router reusing the memory embedding model
+        self.route_classifier = None
+        classifier_config = config.get("router_classifier", {})
+        embedding_model = mcp_connector.get_embedding_model() if mcp_connector else None
+        if classifier_config.get("active", False) and embedding_model:
+            try:
+                self.route_classifier = RouteClassifier(self._traced_embed(embedding_model), classifier_config)
+                # Redacted log entries hold hashes instead of messages, so they would be learned as noise
+                if payload_logger.redaction == "off":
+                    self.route_classifier.learn_in_background(lambda: payload_logger.iter_entries("role_payload"))
+            except Exception as e:
+                print(f"Failed to initialize RouteClassifier: {e}")
+
+    @staticmethod
+    def _traced_embed(embedding_model) -> Callable[[list[str]], list]:
+        """Wrap an embedding model so each embed call is recorded as a span."""
+        def embed(texts: list[str]) -> list:
+            with tracer.span("embedding", "embedding", texts=len(texts)):
+                return list(embedding_model.embed(texts))
+        return embed
 
     def _clean_payload(self, data, skip=False):
         """Recursively removes empty strings, lists, and dicts, except in specific nested keys."""
@@ -65,23 +149,79 @@ class PipelineEngine:
         else:
             return data
 
+    @staticmethod
+    def _build_role_models(agent_config: dict) -> dict[str, Model]:
+        """
+        Resolve ``agent.role_models`` (role name -> inline model dict or the name of
+        another ``agent`` model entry such as ``"summary_model"``) into Model objects.
+        Without a map, the memory and summary roles use ``summary_model`` as before.
+        """
+        role_models = agent_config.get("role_models")
+        if role_models is None and agent_config.get("summary_model"):
+            role_models = {name: "summary_model" for name in ("MemoryRetrieval", "Summary", "MemoryCreation")}
+
+        resolved = {}
+        for role_name, spec in (role_models or {}).items():
+            if isinstance(spec, str):
+                spec = agent_config.get(spec)
+            if isinstance(spec, dict):
+                resolved[role_name] = Model(**spec)
+            else:
+                print(f"Ignoring invalid model for role {role_name} in agent.role_models")
+        return resolved
+
+    def generation_for(self, role_name: str) -> dict:
+        """Generation settings of a role: ``generation.default`` overlaid with ``generation.roles[role_name]``."""
+        generation = dict(self.generation_config.get("default", {}))
+        generation.update(self.generation_config.get("roles", {}).get(role_name, {}))
+        return generation
+
+    def count_json_output(self, key: str) -> None:
+        with self._json_stats_lock:
+            self.json_stats[key] += 1
+
+    def get_json_output_stats(self) -> dict:
+        """Return role outputs parsed as-is, repaired locally, fixed by a reprompt, or unusable."""
+        with self._json_stats_lock:
+            return dict(self.json_stats)
+
+    def reprompt_json(self, role: AIRole, response_text: str, errors: list[str]) -> str:
+        """
+        Asks *role*'s model once to turn its invalid output into JSON matching the
+        role schema. Only the broken output, the problems and the schema are sent,
+        none of the role's context. Returns the new response ("" when disabled).
+        """
+        if not self.json_reprompt:
+            return ""
+        return self.generate_response(role=role, **self._json_repair_request(role, response_text, errors))
+
+    async def reprompt_json_async(self, role: AIRole, response_text: str, errors: list[str]) -> str:
+        """`reprompt_json` through the async provider path."""
+        if not self.json_reprompt:
+            return ""
+        return await self.generate_response_async(role=role, **self._json_repair_request(role, response_text, errors))
+
+    def _json_repair_request(self, role: AIRole, response_text: str, errors: list[str]) -> dict:
+        if payload_logger.debug:
+            print(f"[DEBUG] {role.name} output is invalid ({'; '.join(errors[:3])}), asking the model to fix it")
+        SYSTEM_PROMPT = self.mcp_connector.generate_prompt("json_repair_prompt", {}) if self.mcp_connector else ""
+        user_prompt = f"Invalid output:\n{response_text[:JSON_REPROMPT_MAX_CHARS]}\n\n"
+        user_prompt += "Problems:\n" + "\n".join(f"- {error}" for error in errors[:10]) + "\n\n"
+        if role.output_schema:
+            user_prompt += f"Required JSON schema:\n{json.dumps(role.output_schema, ensure_ascii=False)}\n"
+        return {"system_prompt": SYSTEM_PROMPT, "user_prompt": user_prompt}
+
+    def resolve_model(self, role: AIRole) -> Model:
+        """Model used for *role*: its entry in agent.role_models, else the main model."""
+        return self.role_models.get(role.name, self.model)
+
     def log_step(self, role_name: str, payload: dict, output: dict):
-        """Log inputs and outputs of each role for debugging reasoning."""
-        
-        class HistoryEncoder(json.JSONEncoder):
-            def default(self, o):
-                if isinstance(o, HistoryRecord):
-                    return o.to_dict()
-                return super().default(o)
-                
-        log_entry = {
+        """Log inputs and outputs of each role for debugging reasoning (buffered, see PayloadLogger)."""
+        payload_logger.log("role_payload", {
             "role": role_name,
             "input_payload": payload,
             "output": output
-        }
-        with open("logs/role_payload.json", "a") as f:
-            json.dump(log_entry, f, ensure_ascii=False, cls=HistoryEncoder)
-            f.write("\n")
+        })
 
     def execute_tool(self, tool_name: str, arguments: dict) -> str:
         """Executes a tool and returns the result as string."""
@@ -96,11 +236,284 @@ class PipelineEngine:
         except Exception as e:
             return f"Error executing tool {tool_name}: {str(e)}"
 
-    def run_pipeline(self, initial_payload: dict, history_manager, send_status: Optional[Callable[[str], None]] = None) -> dict:
+    async def execute_tool_async(self, tool_name: str, arguments: dict) -> str:
+        """`execute_tool` for the async pipeline (see `MCPConnector.execute_tool_async`)."""
+        if not self.mcp_connector:
+            return "Error: MCP Connector not initialized."
+            
+        try:
+            result = await self.mcp_connector.execute_tool_async(tool_name, arguments)
+            if isinstance(result, (dict, list)):
+                return json.dumps(result, ensure_ascii=False)
+            return str(result)
+        except Exception as e:
+            return f"Error executing tool {tool_name}: {str(e)}"
+
+    async def run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """Runs a blocking call on the shared executor with the caller's context (trace span, usage scope)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, tracer.bind(functools.partial(func, *args, **kwargs)))
+
+    def submit(self, coroutine: Awaitable) -> concurrent.futures.Future:
+        """Schedules *coroutine* on the engine's event loop thread from synchronous code.
+
+        The coroutine runs in a copy of the caller's context, so the current
+        trace and usage scope carry over. Returns a Future of its result.
+        """
+        loop = self._get_loop()
+        context = contextvars.copy_context()
+        future = concurrent.futures.Future()
+
+        def start() -> None:
+            if not future.set_running_or_notify_cancel():
+                coroutine.close()
+                return
+            task = loop.create_task(coroutine, context=context)
+
+            def done(task: asyncio.Task) -> None:
+                if task.cancelled():
+                    future.set_exception(concurrent.futures.CancelledError())
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+            task.add_done_callback(done)
+
+        loop.call_soon_threadsafe(start)
+        return future
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """The engine's event loop, started in a daemon thread on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                # Bridged blocking calls (asyncio.to_thread) share the engine's executor
+                loop.set_default_executor(self._executor)
+                threading.Thread(target=loop.run_forever, name="pipeline-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _retrieve_memories(self, user_input: str) -> list:
+        """Runs the MemoryRetrieval role (LLM decision + memory search)."""
+        retriever_payload = self._clean_payload({"input": user_input})
+        mem_out = await self.memory_retrieval.run_async(retriever_payload)
+        self.log_step("MemoryRetrieval", retriever_payload, mem_out)
+        return mem_out.get("result", {}).get("memories", [])
+
+    async def _fetch_archived_context(self, user_input: str) -> str:
+        """Searches archived dialog pairs and renders them as a context block."""
+        archived_context = ""
+        if self.mcp_connector:
+            try:
+                res = await self.mcp_connector.execute_tool_async("search_archived_messages", {"query": user_input, "limit": 2})
+                if isinstance(res, dict) and "results" in res:
+                    archived_pairs = res["results"]
+                    if archived_pairs:
+                        archived_context = "Recent relevant past interactions:\n"
+                        for i, pair in enumerate(archived_pairs, 1):
+                            archived_context += f"{i}. user: {pair.get('user', '')}\n   model: {pair.get('model', '')}\n\n"
+            except Exception as e:
+                print(f"[DEBUG] Error fetching archived context: {e}")
+        return archived_context
+
+    async def _gather_context(self, user_input: str, history_manager) -> dict:
+        """Fans out the independent pre-routing lookups as concurrent tasks.
+        
+        Model calls and tool calls are awaited on the event loop; the blocking
+        lookups run on the context executor. All jobs are joined with a shared
+        deadline (``pipeline.context_deadline``). Jobs that fail or miss the
+        deadline fall back to empty defaults so the Router is never blocked by a
+        single slow lookup; a dropped job is logged with whether it was still
+        queued or already running.
+        
+        Returns:
+            dict: {"memories", "archived_context", "history", "identity", "language", "route"}
+        """
+        started = set()  # blocking jobs that got a context worker
+
+        def lookup(key: str, func: Callable, *args):
+            def run():
+                started.add(key)
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            return loop.run_in_executor(self._context_executor, tracer.bind(run))
+
+        jobs = {
+            "memories": (lambda: self._retrieve_memories(user_input), []),
+            "archived_context": (lambda: self._fetch_archived_context(user_input), ""),
+            "history": (lambda: lookup("history", history_manager.get_dialog_records), []),
+            "identity": (lambda: lookup("identity", self.mcp_connector.get_identity_prompt), "") if self.mcp_connector else None,
+            "language": (lambda: lookup("language", self.mcp_connector.get_language), "English") if hasattr(self.mcp_connector, "get_language") else None,
+            "route": (lambda: lookup("route", self.route_classifier.classify, user_input), (None, 0.0)) if self.route_classifier else None,
+        }
+        context = {"identity": "", "language": "English", "route": (None, 0.0)}
+        tasks = {}
+        for key, job in jobs.items():
+            if job is None:
+                continue
+            start, default = job
+            context[key] = default
+            tasks[asyncio.ensure_future(start())] = key
+        
+        done, not_done = await asyncio.wait(tasks, timeout=self.context_deadline)
+        for task in done:
+            key = tasks[task]
+            try:
+                context[key] = task.result()
+            except Exception as e:
+                traceback.print_exc()
+                print(f"[DEBUG] Context job '{key}' failed: {e}")
+        for task in not_done:
+            key = tasks[task]
+            task.cancel()
+            if key in ("memories", "archived_context"):
+                state = "cancelled while awaiting its model or tool call"
+            else:
+                state = "still running on a context worker" if key in started else "still queued, cancelled"
+            print(f"[DEBUG] Context job '{key}' dropped after missing the {self.context_deadline}s deadline ({state}); using its default.")
+        
+        return context
+
+    async def _compress_entry(self, entry: dict, instruction: str = "") -> dict | None:
+        """Compresses one tasks_history entry with the HistoryCompressor role.
+        
+        Returns a compressed copy of the entry, or None if compression failed.
+        """
+        compressor_payload = self._clean_payload({"entry": entry, "instruction": instruction})
+        compressor_out = await self.history_compressor.run_async(compressor_payload)
+        self.log_step("HistoryCompressor", compressor_payload, compressor_out)
+        compressed_text = compressor_out.get("result", {}).get("compressed_text", "")
+        if not compressed_text:
+            return None
+        compressed = dict(entry)
+        compressed["result"] = compressed_text
+        compressed["compressed"] = True
+        return compressed
+
+    def _schedule_compaction(self, entry: dict, pending: dict, raw_entries: dict) -> None:
+        """Starts background compression of an oversized tasks_history entry."""
+        if not self.compaction_enabled or entry["id"] in pending:
+            return
+        entry_size = len(json.dumps(entry, ensure_ascii=False))
+        if entry_size <= self.compaction_threshold:
+            return
+        if payload_logger.debug:
+            print(f"[DEBUG] Compacting tasks_history entry {entry['id']} ({entry_size} characters) in background")
+        raw_entries[entry["id"]] = entry
+        pending[entry["id"]] = asyncio.ensure_future(self._compress_entry(entry))
+
+    async def _apply_compactions(self, tasks_history: list, pending: dict, wait: bool = False) -> None:
+        """Replaces entries whose background compression has finished.
+        
+        With `wait=True` unfinished jobs are awaited up to the context deadline;
+        entries whose compression fails or times out keep their raw result.
+        """
+        if wait and pending:
+            await asyncio.wait(pending.values(), timeout=self.context_deadline)
+        for entry_id, future in list(pending.items()):
+            if not future.done():
+                continue
+            del pending[entry_id]
+            try:
+                compressed = future.result()
+            except Exception as e:
+                print(f"[DEBUG] Compaction of entry {entry_id} failed: {e}")
+                continue
+            if not compressed:
+                continue
+            for i, entry in enumerate(tasks_history):
+                if entry["id"] == entry_id:
+                    tasks_history[i] = compressed
+                    break
+
+    @staticmethod
+    def _validate_final_message(role_out: dict, role_name: str, max_chars: int) -> str | None:
+        """Return the role's `final_user_message` if it is usable as the final reply, else None."""
+        message = role_out.get("result", {}).get("final_user_message")
+        if "raw" in role_out:
+            reason = f"unparseable {role_name} output"
+        elif not isinstance(message, str) or not message.strip():
+            reason = "no final_user_message"
+        elif len(message) > max_chars:
+            reason = f"reply longer than {max_chars} characters"
+        elif message.lstrip().startswith(("{", "[")) or '"final_user_message"' in message:
+            reason = "reply looks like JSON"
+        else:
+            return message.strip()
+        if payload_logger.debug:
+            print(f"[DEBUG] {role_name} reply rejected ({reason}), falling back to the Formatter.")
+        return None
+
+    async def _review_step(self, review_payload: dict) -> tuple[dict | None, dict | None]:
+        """
+        Fused step mode: one StepReview call judges the step and proposes the next one.
+        
+        Returns (Verifier-shaped result, Deconstructor-shaped decision). The result is
+        None when the Verifier has to decide instead: tool errors skip the review, and
+        reviews below `fused_step.min_confidence` are escalated. The decision is only
+        returned for confident successful steps; otherwise the Deconstructor plans.
+        """
+        answer = review_payload.get("answer", {})
+        if review_payload.get("worker_output", {}).get("action") == "tool" and VerifierRole._classify_tool_result(answer.get("result")) == "error":
+            self.step_review.count("skipped_on_error")
+            return None, None
+        
+        review_payload = self.context_packer.pack("StepReview", review_payload)
+        review_out = await self.step_review.run_async(review_payload)
+        self.log_step("StepReview", review_payload, review_out)
+        
+        review = review_out.get("result", {})
+        resolution = review.get("resolution")
+        try:
+            confidence = float(review.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if resolution not in ("success", "failure", "interrupt") or confidence < self.review_min_confidence:
+            self.step_review.count("escalated")
+            return None, None
+        
+        self.step_review.count("accepted")
+        notes = review_out.get("notes", "")
+        verifier_out = {"notes": notes, "result": {"resolution": resolution}}
+        decision = review.get("decision")
+        if resolution != "success" or decision not in ("next_task", "task_completed", "task_interrupted"):
+            return verifier_out, None
+        if decision == "next_task" and not review.get("next_task"):
+            return verifier_out, None
+        proposed = {"decision": decision}
+        if decision == "next_task":
+            proposed["next_task"] = review["next_task"]
+        elif decision == "task_interrupted":
+            proposed["reason"] = review.get("reason", "Unknown reason")
+        return verifier_out, {"notes": notes, "result": proposed}
+
+    def run_pipeline(self, initial_payload: dict, history_manager, send_status: Optional[Callable[[str], None]] = None, send_partial: Optional[Callable[[str], None]] = None) -> dict:
+        """Blocking wrapper of `run_pipeline_async`, run on the engine's event loop thread."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is not None and running_loop is self._loop:
+            raise RuntimeError("run_pipeline would block the engine's event loop, await run_pipeline_async instead.")
+        return self.submit(self.run_pipeline_async(initial_payload, history_manager, send_status, send_partial)).result()
+
+    async def run_pipeline_async(self, initial_payload: dict, history_manager, send_status: Optional[Callable[[str], None]] = None, send_partial: Optional[Callable[[str], None]] = None) -> dict:
+        """Runs the pipeline as a coroutine: model, tool and lookup waits cost no thread.
+
+        Can be awaited on any event loop; `send_status` and `send_partial` are
+        called from that loop and must not block.
+        """
+        # In traffic record mode the input and dialog history are archived with the provider calls they cause
+        with traffic_archive.input_session(initial_payload, history_manager.get_dialog_records()):
+            return await self._run_pipeline(initial_payload, history_manager, send_status, send_partial)
+
+    async def _run_pipeline(self, initial_payload: dict, history_manager, send_status: Optional[Callable[[str], None]] = None, send_partial: Optional[Callable[[str], None]] = None) -> dict:
         """
         Executes the main role-based execution pipeline with strict role isolation.
         
         Each role receives ONLY the data it needs — no shared mutable payload.
+        If `send_partial` is given and `pipeline.stream_responses` is enabled,
+        the final user message is streamed to it as it is generated.
         
         Returns:
             dict: {"text": str, "images": list[str]}
@@ -108,43 +521,29 @@ class PipelineEngine:
         # Extract core inputs
         user_input = initial_payload.get("input_message", {}).get("text", "")
         input_images = initial_payload.get("input_message", {}).get("image_hashes", [])
+        on_partial = send_partial if self.stream_responses else None
         
-        # ── 1. Retriever (MemoryRetrieval) ──────────────────────────────
-        # Receives: only input
+        # ── 1. Context fan-out ──────────────────────────────────────────
+        # MemoryRetrieval, archived search and shared resources do not depend
+        # on each other, so they are gathered concurrently before the Router.
         if send_status:
             send_status("Retrieving memories...")
         
-        retriever_payload = self._clean_payload({"input": user_input})
-        mem_out = self.memory_retrieval.run(retriever_payload)
-        self.log_step("MemoryRetrieval", retriever_payload, mem_out)
-        memories = mem_out.get("result", {}).get("memories", [])
+        context = await self._gather_context(user_input, history_manager)
+        memories = context["memories"]
+        archived_context = context["archived_context"]
+        history_records = context["history"]
+        identity = context["identity"]
+        language = context["language"]
         
         # Log memory payload size
         memories_text = json.dumps(memories, ensure_ascii=False)
-        print(f"[DEBUG] memory_payload_size: {len(memories_text)} characters")
-        
-        # ====== ARCHIVED CONTEXT ======
-        archived_context = ""
-        if self.mcp_connector:
-            try:
-                res = self.mcp_connector.execute_tool("search_archived_messages", {"query": user_input, "limit": 2})
-                if isinstance(res, dict) and "results" in res:
-                    archived_pairs = res["results"]
-                    if archived_pairs:
-                        archived_context = "Recent relevant past interactions:\n"
-                        for i, pair in enumerate(archived_pairs, 1):
-                            archived_context += f"{i}. user: {pair.get('user', '')}\n   model: {pair.get('model', '')}\n\n"
-            except Exception as e:
-                print(f"[DEBUG] Error fetching archived context: {e}")
+        if payload_logger.debug:
+            print(f"[DEBUG] memory_payload_size: {len(memories_text)} characters")
 
         user_input_with_context = user_input
         if archived_context:
             user_input_with_context += f"\n\n{archived_context}"
-
-        # Gather shared resources
-        history_records = history_manager.get_dialog_records() #count=5)
-        identity = self.mcp_connector.get_identity_prompt() if self.mcp_connector else ""
-        language = self.mcp_connector.get_language() if hasattr(self.mcp_connector, "get_language") else "English"
         
         # ── 2. Router ───────────────────────────────────────────────────
         # Receives: input, history, identity, memory, input_images
@@ -157,9 +556,23 @@ class PipelineEngine:
             "identity": identity,
             "memory": memories,
             "input_images": input_images,
+            "language": language,
         })
-        router_out = self.router.run(router_payload)
-        self.log_step("Router", router_payload, router_out)
+        router_payload = self.context_packer.pack("Router", router_payload)
+        local_route, route_confidence = context["route"]
+        if local_route:
+            # Confident local classification: skip the Router LLM call
+            router_out = {
+                "notes": f"Routed locally by RouteClassifier (confidence {route_confidence:.3f}).",
+                "result": {"type": local_route, "task_summary": user_input},
+            }
+            self.log_step("RouteClassifier", {"input": user_input}, router_out)
+        else:
+            router_out = await self.router.run_async(router_payload, on_partial=on_partial)
+            self.log_step("Router", router_payload, router_out)
+            if self.route_classifier:
+                # Learn off the critical path
+                self._executor.submit(tracer.bind(self.route_classifier.add_example), user_input, router_out.get("result", {}).get("type", ""))
         
         req_type = router_out.get("result", {}).get("type", "task")
         task_summary = router_out.get("result", {}).get("task_summary", user_input)
@@ -167,6 +580,12 @@ class PipelineEngine:
         
         # ── CONVERSATION PATH ───────────────────────────────────────────
         if req_type == "conversation":
+            if self.router.direct_conversation and not local_route:
+                # Direct mode: the Router already wrote the reply, the Formatter is only a fallback
+                direct_reply = self._validate_final_message(router_out, "Router", self.direct_max_chars)
+                if direct_reply:
+                    return {"text": direct_reply, "images": []}
+            
             if send_status:
                 send_status("Generating response...")
             
@@ -182,7 +601,8 @@ class PipelineEngine:
                 "input_images": input_images,
                 "media": [],
             })
-            formatter_out = self.formatter.run(formatter_payload)
+            formatter_payload = self.context_packer.pack("PersonalityFormatter", formatter_payload)
+            formatter_out = await self.formatter.run_async(formatter_payload, on_partial=on_partial)
             self.log_step("Formatter", formatter_payload, formatter_out)
             
             final_text = formatter_out.get("result", {}).get("final_user_message", "Processing error.")
@@ -196,30 +616,42 @@ class PipelineEngine:
         tasks_history = []
         collected_images = []
         step_counter = 0
+        pending_compactions = {}  # entry id -> Task compressing the entry
+        raw_entries = {}          # entry id -> original entry before compaction
+        proposed_decision = None  # next step planned by the fused step review
         
         # ── Iterative execution loop ────────────────────────────────────
         for iteration in range(MAX_ITERATIONS):
+            await self._apply_compactions(tasks_history, pending_compactions)
             
             # Check for mid-loop summary
             if len(history_manager.get_dialog_records()) >= 20:
                 if send_status:
                     send_status("Summarizing long conversation...")
                 summary_payload = self._clean_payload({"history": history_manager.get_dialog_records()})
-                sum_out = self.summary.run(summary_payload, history_manager=history_manager)
+                sum_out = await self.summary.run_async(summary_payload, history_manager=history_manager)
                 self.log_step("Summary", summary_payload, sum_out)
             
             # ── 3. Deconstructor (next step) ────────────────────────────
-            if send_status:
-                send_status("Planning next step...")
-            
-            deconstructor_payload = self._clean_payload({
-                "task_summary": task_summary,
-                "abilities": abilities,
-                "tasks_history": tasks_history,
-                "media": collected_images,
-            })
-            deconstructor_out = self.deconstructor.run(deconstructor_payload)
-            self.log_step("Deconstructor", deconstructor_payload, deconstructor_out)
+            if proposed_decision:
+                # Fused step mode: the previous step review already planned this step
+                deconstructor_out = proposed_decision
+                proposed_decision = None
+            else:
+                if send_status:
+                    send_status("Planning next step...")
+                
+                deconstructor_payload = self._clean_payload({
+                    "task_summary": task_summary,
+                    "abilities": abilities,
+                    "tasks_history": tasks_history,
+                    "media": collected_images,
+                })
+                deconstructor_payload = self.context_packer.pack("TaskDeconstructor", deconstructor_payload)
+                deconstructor_out = await self.deconstructor.run_async(deconstructor_payload)
+                self.log_step("Deconstructor", deconstructor_payload, deconstructor_out)
+            # Compactions started after the previous step ran while planning
+            await self._apply_compactions(tasks_history, pending_compactions)
             
             decision = deconstructor_out.get("result", {}).get("decision", "next_task")
             
@@ -266,7 +698,8 @@ class PipelineEngine:
                     "abilities": abilities,
                     "verification_feedback": verification_feedback,
                 })
-                worker_out = self.worker.run(worker_payload)
+                worker_payload = self.context_packer.pack("Worker", worker_payload)
+                worker_out = await self.worker.run_async(worker_payload)
                 self.log_step("Worker", worker_payload, worker_out)
                 
                 worker_ans = worker_out.get("result", {})
@@ -283,7 +716,7 @@ class PipelineEngine:
                     if send_status:
                         send_status(f"Executing tool {tool_name}...")
                     
-                    tool_result = self.execute_tool(tool_name, arguments)
+                    tool_result = await self.execute_tool_async(tool_name, arguments)
                     
                     step_result_data = {
                         "tool": tool_name,
@@ -321,19 +754,52 @@ class PipelineEngine:
                         "action": "delete_history_entry",
                         "result": f"Deleted entries {entry_ids}"
                     }
+                    
+                elif action == "compress_history_entry":
+                    entry_ids = worker_ans.get("entry_ids", [])
+                    instruction = worker_ans.get("instruction", "")
+                    compressed_ids = []
+                    for i, entry in enumerate(tasks_history):
+                        if entry["id"] in entry_ids:
+                            pending_compactions.pop(entry["id"], None)
+                            raw_entries.setdefault(entry["id"], entry)
+                            compressed = await self._compress_entry(entry, instruction)
+                            if compressed:
+                                tasks_history[i] = compressed
+                                compressed_ids.append(entry["id"])
+                    step_result_data = {
+                        "action": "compress_history_entry",
+                        "result": f"Compressed entries {compressed_ids}"
+                    }
                 
                 # ── 5. Verifier ─────────────────────────────────────────
-                if send_status:
-                    send_status("Verifying step result...")
+                verifier_out = None
+                if self.step_mode == "fused":
+                    if send_status:
+                        send_status("Reviewing step result...")
+                    review_payload = self._clean_payload({
+                        "task_summary": task_summary,
+                        "current_task": current_task,
+                        "worker_output": worker_ans,
+                        "answer": step_result_data,
+                        "tasks_history": tasks_history,
+                        "abilities": abilities,
+                        "images": step_images,
+                    })
+                    verifier_out, proposed_decision = await self._review_step(review_payload)
                 
-                verifier_payload = self._clean_payload({
-                    "task": current_task,
-                    "worker_output": worker_ans,
-                    "answer": step_result_data,
-                    "images": step_images,
-                })
-                verifier_out = self.verifier.run(verifier_payload)
-                self.log_step("Verifier", verifier_payload, verifier_out)
+                if verifier_out is None:
+                    if send_status:
+                        send_status("Verifying step result...")
+                    
+                    verifier_payload = self._clean_payload({
+                        "task": current_task,
+                        "worker_output": worker_ans,
+                        "answer": step_result_data,
+                        "images": step_images,
+                    })
+                    verifier_out = await self.verifier.run_async(verifier_payload)
+                    self.log_step("Verifier", verifier_payload, verifier_out)
                 
                 resolution = verifier_out.get("result", {}).get("resolution", "failure")
                 
@@ -360,6 +826,8 @@ class PipelineEngine:
                 "media": step_images if step_resolution == "success" else [],
             }
             tasks_history.append(history_entry)
+            # Compress oversized results in the background while the next step is planned
+            self._schedule_compaction(history_entry, pending_compactions, raw_entries)
             
             # Collect images only from successful steps
             if step_resolution == "success" and step_images:
@@ -381,13 +849,44 @@ class PipelineEngine:
         if send_status:
             send_status("Aggregating results...")
         
+        if self.compaction_raw_for_aggregator:
+            # The Aggregator gets the originals, so unfinished compressions are not needed
+            for future in pending_compactions.values():
+                future.cancel()
+            tasks_history = [raw_entries.get(entry["id"], entry) for entry in tasks_history]
+        else:
+            await self._apply_compactions(tasks_history, pending_compactions, wait=True)
+        
+        if self.fused_final_stage:
+            # Aggregate and format in one call; the two-step path below is the fallback
+            final_payload = self._clean_payload({
+                "task_summary": task_summary,
+                "tasks_history": tasks_history,
+                "input": user_input_with_context,
+                "history": history_records,
+                "memory": memories,
+                "identity": identity,
+                "language": language,
+                "input_images": input_images,
+                "media": collected_images,
+            })
+            final_payload = self.context_packer.pack("FinalAnswer", final_payload)
+            final_out = await self.final_answer.run_async(final_payload, on_partial=on_partial)
+            self.log_step("FinalAnswer", final_payload, final_out)
+            
+            final_text = self._validate_final_message(final_out, "FinalAnswer", self.final_max_chars)
+            if final_text:
+                all_images = list(dict.fromkeys(collected_images + final_out.get("result", {}).get("images", [])))
+                return {"text": final_text, "images": all_images}
+        
         aggregator_payload = self._clean_payload({
             "task_summary": task_summary,
             "tasks_history": tasks_history,
             "input_images": input_images,
             "media": collected_images,
         })
-        aggregator_out = self.aggregator.run(aggregator_payload)
+        aggregator_payload = self.context_packer.pack("Aggregator", aggregator_payload)
+        aggregator_out = await self.aggregator.run_async(aggregator_payload)
         self.log_step("Aggregator", aggregator_payload, aggregator_out)
         
         raw_answer = aggregator_out.get("result", {}).get("answer", "Task completed.")
@@ -409,15 +908,20 @@ class PipelineEngine:
             "input_images": input_images,
             "media": all_images,
         })
-        formatter_out = self.formatter.run(formatter_payload)
+        formatter_payload = self.context_packer.pack("PersonalityFormatter", formatter_payload)
+        formatter_out = await self.formatter.run_async(formatter_payload, on_partial=on_partial)
         self.log_step("Formatter", formatter_payload, formatter_out)
         
         final_text = formatter_out.get("result", {}).get("final_user_message", raw_answer)
         return {"text": final_text, "images": all_images}
 
-    def generate_response(self, role: AIRole, system_prompt: str, user_prompt: str, history_records: list[HistoryRecord] | None = None, encode_images: bool = False, input_images: list[str] | None = None) -> str:
+    def generate_response(self, role: AIRole, system_prompt: str, user_prompt: str, history_records: list[HistoryRecord] | None = None, encode_images: bool = False, input_images: list[str] | None = None, on_chunk: Optional[Callable[[str], None]] = None, model: Model | None = None, static_context: str = "") -> str:
         """Utility for roles to query the LLM.
         
+        The prompt is laid out static content first so its prefix stays identical
+        across calls and can be cached by the provider: system prompt, then
+        `static_context`, then history, then the per-call user prompt.
+        
         Args:
             role: The role making the request.
             system_prompt: System-level instructions.
@@ -425,34 +929,94 @@ class PipelineEngine:
             history_records: Optional conversation/task history records.
             encode_images: Whether to encode image data in the payload.
             input_images: Optional list of image hashes to attach to the user prompt.
+            on_chunk: Optional callback; when set the response is streamed and the
+                callback receives the accumulated text after every delta.
+            model: Optional model override; defaults to the role's model
+                (see `resolve_model`). The engine's model is never reassigned,
+                so roles can run concurrently.
+            static_context: Content that rarely changes between calls (identity,
+                tool schemas, abilities), sent right after the system prompt.
         """
+        model, records, request = self._prepare_generation(role, system_prompt, user_prompt, history_records, encode_images, input_images, model, static_context)
+        try:
+            with usage_tracker.scope(role=role.name):
+                if on_chunk:
+                    accumulated = ""
+                    for delta in self.providers_manager.generation_request(model, records, stream=True, **request):
+                        accumulated += delta
+                        self._notify_chunk(on_chunk, accumulated)
+                    return accumulated.strip()
+                return self.providers_manager.generation_request(model, records, **request)
+        except Exception as e:
+            traceback.print_exc()
+            return self._generation_error(e)
+
+    async def generate_response_async(self, role: AIRole, system_prompt: str, user_prompt: str, history_records: list[HistoryRecord] | None = None, encode_images: bool = False, input_images: list[str] | None = None, on_chunk: Optional[Callable[[str], None]] = None, model: Model | None = None, static_context: str = "") -> str:
+        """`generate_response` through `ProvidersManager.generation_request_async`; same arguments and result."""
+        model, records, request = self._prepare_generation(role, system_prompt, user_prompt, history_records, encode_images, input_images, model, static_context)
+        try:
+            with usage_tracker.scope(role=role.name):
+                if on_chunk:
+                    accumulated = ""
+                    deltas = await self.providers_manager.generation_request_async(model, records, stream=True, **request)
+                    async for delta in deltas:
+                        accumulated += delta
+                        self._notify_chunk(on_chunk, accumulated)
+                    return accumulated.strip()
+                return await self.providers_manager.generation_request_async(model, records, **request)
+        except Exception as e:
+            traceback.print_exc()
+            return self._generation_error(e)
+
+    def _prepare_generation(self, role: AIRole, system_prompt: str, user_prompt: str, history_records: list[HistoryRecord] | None, encode_images: bool, input_images: list[str] | None, model: Model | None, static_context: str) -> tuple[Model, list[HistoryRecord], dict]:
+        """Lay out the prompt records of a role call. Returns (model, records, generation_request keyword arguments)."""
+        model = model or self.resolve_model(role)
         
-        # Build the prompt array 
-        records = []
+        # Build the prompt array: static prefix first
+        records = [HistoryRecord("system", system_prompt)]
+        if static_context:
+            records.append(HistoryRecord("system", static_context))
+        prefix_records = len(records)
         
-        # Prepend the existing history from the particular context (task or dialog)
+        # Then the existing history from the particular context (task or dialog)
         if history_records:
             records.extend(history_records)
-
-        # Add system prompt
-        records.append(HistoryRecord("system", system_prompt))
             
         # Append the current step's user prompt to the end
         records.append(HistoryRecord("user", user_prompt))
         
+        prompt_chars = sum(len(record.message) for record in records)
+        if payload_logger.debug:
+            print(f"[DEBUG] {role.name} prompt: {prompt_chars} characters (~{int(prompt_chars / self.context_packer.chars_per_token)} tokens), {len(records)} records")
+        
         image_resolver = self.image_manager.get_image_base64 if self.image_manager else None
 
         if input_images and len(records) > 1:
             records[-1].image_hashes = input_images
             encode_images = True
         
+        generation = self.generation_for(role.name)
+        if generation.get("json") and generation.get("schema", True) and role.output_schema:
+            generation["response_schema"] = role.output_schema
+            generation["schema_name"] = role.name
+        
+        return model, records, {
+            "encode_images": encode_images,
+            "image_resolver": image_resolver,
+            "use_cache": role.name in self.cached_roles,
+            "accept": role.accepts_output,
+            "priority": role.priority,
+            "prefix_records": prefix_records,
+            "generation": generation,
+        }
+
+    @staticmethod
+    def _notify_chunk(on_chunk: Callable[[str], None], accumulated: str) -> None:
         try:
-            return self.providers_manager.generation_request(
-                self.model, 
-                records,
-                encode_images=encode_images, 
-                image_resolver=image_resolver
-            )
+            on_chunk(accumulated)
         except Exception as e:
-            traceback.print_exc()
-            return f'{{"notes": "Error during generation", "result": {{"error": "{str(e)}"}}}}'
+            print(f"[DEBUG] Stream callback failed: {e}")
+
+    @staticmethod
+    def _generation_error(error: Exception) -> str:
+        return f'{{"notes": "Error during generation", "result": {{"error": "{str(error)}"}}}}'
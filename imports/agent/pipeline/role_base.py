@@ -1,16 +1,50 @@
-import json
+import re
 from abc import ABC, abstractmethod
+from imports.agent.pipeline.json_repair import decode_json_object, validate_json
+from imports.tracing import tracer
+
+
+def result_schema(properties: dict, required: list[str]) -> dict:
+    """JSON schema of the usual role output: {"notes": str, "result": {...}}."""
+    return {
+        "type": "object",
+        "properties": {
+            "notes": {"type": "string"},
+            "result": {"type": "object", "properties": properties, "required": required},
+        },
+        "required": ["notes", "result"],
+    }
+
+
+class LocalResult:
+    """Returned by `AIRole.build_request` when the role answers without a model call."""
+
+    def __init__(self, output: dict) -> None:
+        self.output = output
+
 
 class AIRole(ABC):
-    """Base class for all AI roles in the pipeline."""
+    """Base class for all AI roles in the pipeline.
+
+    A role is one model call: `build_request` turns the payload into the
+    prompt, the engine sends it, and `finish` post-processes the decoded
+    output. `run` does this synchronously, `run_async` on the event loop.
+    """
 
     name: str = "BaseRole"
     prompt: str = ""
+    # Rate limiter lane: "interactive" for the request path, "background" for post-pipeline jobs
+    priority: str = "interactive"
+    # JSON schema of the role's output: requested as structured output where the
+    # provider supports it and checked by `parse_json_response`
+    output_schema: dict | None = None
+    # `finish` does blocking I/O (tool calls, history writes); `run_async` runs it on the engine's executor
+    blocking_finish: bool = False
 
     @abstractmethod
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict, **kwargs) -> dict | LocalResult:
         """
-        Executes the role logic utilizing the given payload.
+        Builds the role's model call from the given payload.
         
         Args:
             payload (dict): The shared state information between roles.
@@ -22,26 +56,146 @@ class AIRole(ABC):
                 - `persona`: str
                 
         Returns:
-            dict: Role execution result. Expected structure for most roles:
-                {
-                    "notes": "...internal reasoning...",
-                    "result": {...}
-                }
+            dict: Keyword arguments of `PipelineEngine.generate_response`
+                (``system_prompt``, ``user_prompt``, ``history_records``,
+                ``input_images``, ``on_chunk``, ``static_context``), or a
+                `LocalResult` when no call is needed.
         """
         pass
 
+    def finish(self, parsed: dict, payload: dict, **kwargs) -> dict:
+        """
+        Post-processes the decoded model output. Expected structure for most roles:
+            {
+                "notes": "...internal reasoning...",
+                "result": {...}
+            }
+        """
+        return parsed
+
+    def run(self, payload: dict, **kwargs) -> dict:
+        """Executes the role: build the request, query the model, finish the output."""
+        with tracer.span(f"role:{self.name}", "role", role=self.name):
+            request = self.build_request(payload, **kwargs)
+            if isinstance(request, LocalResult):
+                return request.output
+            response_text = self.engine.generate_response(role=self, **request)
+            return self.finish(self.parse_json_response(response_text), payload, **kwargs)
+
+    async def run_async(self, payload: dict, **kwargs) -> dict:
+        """`run` as a coroutine: the model call goes through the engine's async provider path."""
+        with tracer.span(f"role:{self.name}", "role", role=self.name):
+            request = self.build_request(payload, **kwargs)
+            if isinstance(request, LocalResult):
+                return request.output
+            response_text = await self.engine.generate_response_async(role=self, **request)
+            parsed = await self.parse_json_response_async(response_text)
+            if self.blocking_finish:
+                return await self.engine.run_blocking(self.finish, parsed, payload, **kwargs)
+            return self.finish(parsed, payload, **kwargs)
+
     def parse_json_response(self, response_text: str) -> dict:
         """
         Helper method to extract and parse JSON from the model's response.
+        
+        Malformed JSON is repaired locally first (see `decode_json_object`). If
+        the output still cannot be decoded or does not match `output_schema`,
+        the engine asks the model once to fix it (`PipelineEngine.reprompt_json`).
+        """
+        parsed, errors, reprompt = self._decode_output(response_text)
+        if not errors:
+            return parsed
+        fixed_text = self.engine.reprompt_json(self, response_text, errors) if reprompt else ""
+        return self._settle_output(response_text, parsed, fixed_text, reprompt)
+
+    async def parse_json_response_async(self, response_text: str) -> dict:
+        """`parse_json_response` with the reprompt sent through `PipelineEngine.reprompt_json_async`."""
+        parsed, errors, reprompt = self._decode_output(response_text)
+        if not errors:
+            return parsed
+        fixed_text = await self.engine.reprompt_json_async(self, response_text, errors) if reprompt else ""
+        return self._settle_output(response_text, parsed, fixed_text, reprompt)
+
+    def _decode_output(self, response_text: str) -> tuple[dict | None, list[str], bool]:
+        """Decode and check a response. Returns (parsed, problems, whether a reprompt may fix them)."""
+        parsed, repaired = decode_json_object(response_text)
+        errors = self.check_output(parsed)
+        engine = getattr(self, "engine", None)
+        if not errors:
+            if engine:
+                engine.count_json_output("repaired" if repaired else "parsed")
+            return parsed, errors, False
+        # Generation failures are reported as {"result": {"error": ...}}, a reprompt would not help
+        generation_failed = isinstance(parsed, dict) and isinstance(parsed.get("result"), dict) and "error" in parsed["result"]
+        return parsed, errors, bool(engine) and not generation_failed
+
+    def _settle_output(self, response_text: str, parsed: dict | None, fixed_text: str, reprompted: bool) -> dict:
+        """Pick the reprompted output when it is valid, else the best effort at the original one."""
+        if reprompted:
+            if fixed_text:
+                fixed, _ = decode_json_object(fixed_text)
+                if not self.check_output(fixed):
+                    self.engine.count_json_output("reprompted")
+                    return fixed
+            self.engine.count_json_output("failed")
+        if parsed is not None:
+            return parsed
+        # Fallback if the model didn't wrap in JSON logic
+        return {"notes": "Parsing error", "result": {}, "raw": response_text}
+
+    def accepts_output(self, response_text: str) -> bool:
+        """True when *response_text* decodes to valid output; only such responses go into the response cache."""
+        parsed, _ = decode_json_object(response_text)
+        return not self.check_output(parsed)
+
+    def check_output(self, parsed: dict | None) -> list[str]:
+        """Problems with a decoded response: not JSON at all, or not matching `output_schema`."""
+        if parsed is None:
+            return ["the response is not a JSON object"]
+        return validate_json(parsed, self.output_schema) if self.output_schema else []
+
+
+    @staticmethod
+    def extract_partial_field(response_text: str, key: str) -> str | None:
+        """
+        Decodes the (possibly unfinished) string value of *key* from a JSON
+        document that is still being streamed. Returns None until the value starts.
         """
-        try:
-            start_idx = response_text.find("{")
-            end_idx = response_text.rfind("}")
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx + 1]
-                return json.loads(json_str)
-            else:
-                # Fallback if the model didn't wrap in JSON logic
-                return {"notes": "Parsing error", "result": {}, "raw": response_text}
-        except json.JSONDecodeError as e:
-            return {"notes": f"JSON Decode Error: {e}", "result": {}, "raw": response_text}
+        match = re.search(rf'"{re.escape(key)}"\s*:\s*"', response_text)
+        if not match:
+            return None
+        escapes = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+        value = []
+        i = match.end()
+        while i < len(response_text):
+            char = response_text[i]
+            if char == '"':
+                break
+            if char == "\\":
+                if i + 1 >= len(response_text):
+                    break
+                code = response_text[i + 1]
+                if code == "u":
+                    hex_digits = response_text[i + 2:i + 6]
+                    if len(hex_digits) < 4:
+                        break
+                    try:
+                        code_point = int(hex_digits, 16)
+                    except ValueError:
+                        break
+                    i += 6
+                    if 0xD800 <= code_point < 0xDC00:
+                        # High surrogate: wait for the low half of the pair
+                        low = re.match(r"\\u([dD][c-fC-F][0-9a-fA-F]{2})", response_text[i:i + 6])
+                        if not low:
+                            break
+                        code_point = 0x10000 + ((code_point - 0xD800) << 10) + (int(low.group(1), 16) - 0xDC00)
+                        i += 6
+                    value.append(chr(code_point))
+                    continue
+                value.append(escapes.get(code, code))
+                i += 2
+                continue
+            value.append(char)
+            i += 1
+        return "".join(value)
@@ -0,0 +1,155 @@
+import threading
+import numpy as np
+from typing import Callable, Iterable
+
+# Seed prototypes so the classifier is usable before any Router decision is logged.
+# The embedding model is multilingual, so English seeds also cover other languages.
+DEFAULT_PROTOTYPES = {
+    "conversation": [
+        "Hi!",
+        "Hello, how are you?",
+        "Thanks a lot!",
+        "Good morning",
+        "Good night, talk to you tomorrow",
+        "What do you think about that?",
+        "Tell me a bit about yourself",
+        "Haha, that's funny",
+        "I had a rough day today",
+        "Okay, sounds good",
+    ],
+    "task": [
+        "What's the weather in Kyiv right now?",
+        "Search the web for the latest news about SpaceX",
+        "Play some jazz on Spotify",
+        "Remember that my birthday is on March 3rd",
+        "Open this link and summarize the article",
+        "Find the transcript of this YouTube video",
+        "Create a playlist with songs by Queen",
+        "What did I tell you about my project last week?",
+        "Compare the prices of the two laptops online",
+        "Pause the music",
+    ],
+}
+
+ARCHIVED_CONTEXT_MARKER = "\n\nRecent relevant past interactions:"
+
+
+class RouteClassifier:
+    """Local embedding-based pre-router in front of RouterRole.
+
+    Each label keeps a set of example embeddings (seed prototypes, past Router
+    decisions from the role payload log, and decisions learned at runtime).
+    A message is scored per label by the mean cosine similarity of its ``k``
+    nearest examples; the margin between the best and second-best label is
+    used as confidence.
+    """
+
+    def __init__(self, embed: Callable[[list[str]], Iterable], config: dict) -> None:
+        self._embed = embed
+        self.threshold = float(config.get("threshold", 0.05))
+        self.k = int(config.get("k", 5))
+        self.min_examples = int(config.get("min_examples", 8))
+        self.max_examples = int(config.get("max_examples", 500))
+        self.local_labels = set(config.get("local_labels", ["conversation"]))
+
+        self._examples: dict[str, list[np.ndarray]] = {label: [] for label in DEFAULT_PROTOTYPES}
+        self._example_texts: dict[str, list[str]] = {label: [] for label in DEFAULT_PROTOTYPES}  # parallel to _examples
+        self._known_texts: set[str] = set()
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "fallback": 0}
+
+        self._add_examples([(text, label) for label, texts in DEFAULT_PROTOTYPES.items() for text in texts])
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def strip_context(text: str) -> str:
+        """Remove the archived-context block the pipeline appends to user input."""
+        return text.split(ARCHIVED_CONTEXT_MARKER, 1)[0].strip()
+
+    def learn_from_log(self, entries: Iterable[dict]) -> int:
+        """Load past Router decisions from role payload log entries. Returns the number added."""
+        samples = []
+        try:
+            for entry in entries:
+                if entry.get("role") != "Router":
+                    continue
+                text = self.strip_context(str(entry.get("input_payload", {}).get("input", "")))
+                label = (entry.get("output", {}).get("result") or {}).get("type")
+                if text and label in self._examples:
+                    samples.append((text, label))
+        except (IOError, OSError):
+            return 0
+        return self._add_examples(samples[-self.max_examples:])
+
+    def learn_in_background(self, entries_source: Callable[[], Iterable[dict]]) -> None:
+        """Run `learn_from_log` on a daemon thread so startup is not delayed."""
+        def _learn():
+            added = self.learn_from_log(entries_source())
+            print(f"[DEBUG] RouteClassifier: learned {added} examples from the role payload log")
+        threading.Thread(target=_learn, daemon=True).start()
+
+    def add_example(self, text: str, label: str) -> None:
+        """Learn from a Router decision."""
+        text = self.strip_context(text)
+        if text and label in self._examples:
+            self._add_examples([(text, label)])
+
+    def classify(self, text: str) -> tuple[str | None, float]:
+        """
+        Returns (label, confidence). The label is None when the classifier is not
+        confident enough, or the winning label may not be decided locally.
+        """
+        text = self.strip_context(text)
+        if not text:
+            return None, 0.0
+        with self._lock:
+            matrices = {label: np.stack(vectors) for label, vectors in self._examples.items() if len(vectors) >= self.min_examples}
+        if len(matrices) < 2:
+            return None, 0.0
+
+        query = np.asarray(next(iter(self._embed([text]))), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = {}
+        for label, matrix in matrices.items():
+            similarities = matrix @ query
+            top = np.sort(similarities)[-self.k:]
+            scores[label] = float(top.mean())
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_label, best_score = ranked[0]
+        confidence = best_score - ranked[1][1]
+        local = confidence >= self.threshold and best_label in self.local_labels
+        with self._lock:
+            self.stats["local" if local else "fallback"] += 1
+        return (best_label if local else None), confidence
+
+    def get_stats(self) -> dict:
+        """Return messages decided locally vs. passed to the Router, and the examples kept per label."""
+        with self._lock:
+            return dict(self.stats, examples={label: len(vectors) for label, vectors in self._examples.items()})
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _add_examples(self, samples: list[tuple[str, str]]) -> int:
+        with self._lock:
+            samples = [(text, label) for text, label in samples if text not in self._known_texts]
+        if not samples:
+            return 0
+        vectors = list(self._embed([text for text, _ in samples]))
+        with self._lock:
+            for (text, label), vector in zip(samples, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                vector /= np.linalg.norm(vector) or 1.0
+                self._examples[label].append(vector)
+                self._example_texts[label].append(text)
+                self._known_texts.add(text)
+                # Keep the most recent examples per label
+                if len(self._examples[label]) > self.max_examples:
+                    self._examples[label].pop(0)
+                    self._known_texts.discard(self._example_texts[label].pop(0))
+        return len(samples)
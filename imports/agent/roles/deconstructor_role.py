@@ -1,13 +1,25 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class TaskDeconstructorRole(AIRole):
     name = "TaskDeconstructor"
+    output_schema = result_schema(
+        {
+            "decision": {"type": "string", "enum": ["next_task", "task_completed", "task_interrupted"]},
+            "next_task": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "description": {"type": "string"}},
+                "required": ["description"],
+            },
+            "reason": {"type": "string"},
+        },
+        ["decision"],
+    )
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict) -> dict:
         """
         Deconstructor role: iterative next-step planner.
         
@@ -18,7 +30,7 @@ class TaskDeconstructorRole(AIRole):
             "media": list[str],
         }
         
-        Returns one of:
+        Output is one of:
             {"result": {"decision": "next_task", "next_task": {...}}}
             {"result": {"decision": "task_completed"}}
             {"result": {"decision": "task_interrupted", "reason": str}}
@@ -30,20 +42,19 @@ class TaskDeconstructorRole(AIRole):
         tasks_history = payload.get("tasks_history", [])
         media = payload.get("media", [])
         
+        static_context = f"Available Abilities:\n{json.dumps(abilities, ensure_ascii=False)}\n" if abilities else ""
+        
         user_prompt = f"Task Summary: {task_summary}\n\n"
-        if abilities:
-            user_prompt += f"Available Abilities:\n{json.dumps(abilities, ensure_ascii=False)}\n\n"
         if tasks_history:
-            user_prompt += f"Steps completed so far:\n{json.dumps(tasks_history, indent=2, ensure_ascii=False)}\n\n"
+            user_prompt += f"Steps completed so far:\n{json.dumps(tasks_history, ensure_ascii=False)}\n\n"
         if media:
             user_prompt += f"Available media from previous steps: {json.dumps(media, ensure_ascii=False)}\n\n"
         user_prompt += "Determine the next step or conclude the task."
         if len(tasks_history) > 10:
             user_prompt += f"[SYSTEM NOTICE]: tasks_history is too long. Cleanup required."
 
-        response_text = self.engine.generate_response(
-            role=self,
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
+            static_context=static_context,
         )
-        return self.parse_json_response(response_text)
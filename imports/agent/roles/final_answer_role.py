@@ -0,0 +1,89 @@
+import json
+from typing import Callable, Optional
+from imports.agent.pipeline.role_base import AIRole, result_schema
+
+class FinalAnswerRole(AIRole):
+    name = "FinalAnswer"
+    output_schema = result_schema({"final_user_message": {"type": "string"}}, ["final_user_message"])
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    @staticmethod
+    def _task_images(tasks_history: list) -> list[str]:
+        """Collect all image hashes from tasks_history."""
+        images = []
+        for entry in tasks_history:
+            images.extend(entry.get("media", []))
+        return images
+
+    def build_request(self, payload: dict, on_partial: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        FinalAnswer role: Aggregator and PersonalityFormatter in one call.
+        Synthesizes the task results and writes the final reply in the persona.
+        
+        Payload: {"task_summary": str, "tasks_history": list, "input": str, "history": list, "memory": list,
+                  "identity": str, "language": str, "input_images": list, "media": list}
+        
+        If `on_partial` is given the response is streamed and the callback receives
+        the partially generated `final_user_message` as it grows.
+        
+        Output: {"result": {"final_user_message": str, "images": list[str]}}
+        """
+        SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("final_answer_role_prompt", {}) if self.engine.mcp_connector else ""
+        task_summary = payload.get("task_summary", "")
+        tasks_history = payload.get("tasks_history", [])
+        identity = payload.get("identity", "Be helpful and polite.")
+        language = payload.get("language", "English")
+        history = payload.get("history", [])
+        memory = payload.get("memory", [])
+        user_input = payload.get("input", "")
+        media = payload.get("media", [])
+        input_images = payload.get("input_images", [])
+        
+        images = self._task_images(tasks_history)
+        
+        static_context = f"Agent Persona / Identity: {identity}\n"
+        user_prompt = ""
+        if memory:
+            user_prompt += f"Relevant Memories:\n{json.dumps(memory, ensure_ascii=False)}\n\n"
+        user_prompt += f"Current User Message: {user_input}\n"
+        user_prompt += f"User Task Summary: {task_summary}\n\n"
+        user_prompt += f"Completed Steps History:\n{json.dumps(tasks_history, ensure_ascii=False)}\n"
+        if images:
+            user_prompt += f"Generated images: {json.dumps(images, ensure_ascii=False)}\n"
+        user_prompt += "Please aggregate the findings into the definitive final answer. If any steps failed or were interrupted, mention this and explain the impact.\n"
+        user_prompt += f"\nRespond in {language}.\n"
+        
+        # Notify about generated images
+        all_media = list(dict.fromkeys(media + images))
+        if all_media:
+            hashes_text = ", ".join(all_media)
+            user_prompt += f"\n[SYSTEM NOTICE]: Images were successfully generated during this task with hashes: {hashes_text}. The system will automatically attach these images to your response. You should acknowledge or describe the image(s) in your reply as if you are sending them.\n"
+
+        on_chunk = None
+        if on_partial:
+            last_partial = ""
+            def on_chunk(text: str) -> None:
+                nonlocal last_partial
+                partial = self.extract_partial_field(text, "final_user_message")
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    on_partial(partial)
+
+        return dict(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            history_records=history,
+            input_images=input_images,
+            on_chunk=on_chunk,
+            static_context=static_context,
+        )
+
+    def finish(self, parsed: dict, payload: dict, on_partial: Optional[Callable[[str], None]] = None) -> dict:
+        # Inject images into result
+        if "result" not in parsed:
+            parsed["result"] = {}
+        parsed["result"]["images"] = self._task_images(payload.get("tasks_history", []))
+        
+        return parsed
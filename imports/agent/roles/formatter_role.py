@@ -1,13 +1,15 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+from typing import Callable, Optional
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class PersonalityFormatterRole(AIRole):
     name = "PersonalityFormatter"
+    output_schema = result_schema({"final_user_message": {"type": "string"}}, ["final_user_message"])
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict, on_partial: Optional[Callable[[str], None]] = None) -> dict:
         """
         Formatter role: formats the final response for the user.
         
@@ -16,7 +18,10 @@ class PersonalityFormatterRole(AIRole):
         
         Formatter does NOT have access to: tools, tasks, abilities.
         
-        Returns: {"result": {"final_user_message": str}}
+        If `on_partial` is given the response is streamed and the callback receives
+        the partially generated `final_user_message` as it grows.
+        
+        Output: {"result": {"final_user_message": str}}
         """
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("formatter_role_prompt", {}) if self.engine.mcp_connector else ""
         raw_answer = payload.get("raw_answer", "")
@@ -30,7 +35,8 @@ class PersonalityFormatterRole(AIRole):
         
         #history_text = "\n".join([f"{r.role}: {r.message}" for r in history])
         
-        user_prompt = f"Agent Persona / Identity: {identity}\n"
+        static_context = f"Agent Persona / Identity: {identity}\n"
+        user_prompt = ""
         #user_prompt += f"Recent Conversation History:\n{history_text}\n\n"
         if memory:
             user_prompt += f"Relevant Memories:\n{json.dumps(memory, ensure_ascii=False)}\n\n"
@@ -46,11 +52,21 @@ class PersonalityFormatterRole(AIRole):
             hashes_text = ", ".join(media)
             user_prompt += f"\n[SYSTEM NOTICE]: Images were successfully generated during this task with hashes: {hashes_text}. The system will automatically attach these images to your response. You should acknowledge or describe the image(s) in your reply as if you are sending them.\n"
 
-        response_text = self.engine.generate_response(
-            role=self,
+        on_chunk = None
+        if on_partial:
+            last_partial = ""
+            def on_chunk(text: str) -> None:
+                nonlocal last_partial
+                partial = self.extract_partial_field(text, "final_user_message")
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    on_partial(partial)
+
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
             history_records=history,
             input_images=input_images,
+            on_chunk=on_chunk,
+            static_context=static_context,
         )
-        return self.parse_json_response(response_text)
@@ -1,13 +1,14 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class HistoryCompressorRole(AIRole):
     name = "HistoryCompressor"
+    output_schema = result_schema({"compressed_text": {"type": "string"}}, ["compressed_text"])
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict) -> dict:
         """
         HistoryCompressor role: Compresses a single long history entry.
         
@@ -16,7 +17,7 @@ class HistoryCompressorRole(AIRole):
             "instruction": str
         }
         
-        Returns: {"notes": str, "result": {"compressed_text": str}}
+        Output: {"notes": str, "result": {"compressed_text": str}}
         """
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("history_compressor_role_prompt", {}) if self.engine.mcp_connector else ""
         
@@ -29,9 +30,7 @@ class HistoryCompressorRole(AIRole):
             
         user_prompt += "Please compress this entry, preserving ALL essential facts, dates, names, links, and data, but removing noise and formatting overhead."
 
-        response_text = self.engine.generate_response(
-            role=self,
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
         )
-        return self.parse_json_response(response_text)
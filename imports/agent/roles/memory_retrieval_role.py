@@ -1,39 +1,33 @@
-from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class MemoryRetrievalRole(AIRole):
     name = "MemoryRetrieval"
+    blocking_finish = True
+    output_schema = result_schema(
+        {"action": {"type": "string", "enum": ["search", "skip"]}, "query": {"type": "string"}},
+        ["action"],
+    )
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict) -> dict:
         """
         Retriever role: receives ONLY input, performs memory search.
         
         Payload: {"input": str}
-        Returns: {"result": {"memories": [...]}}
+        Output: {"result": {"memories": [...]}}
         """
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("memory_retrieval_role_prompt", {}) if self.engine.mcp_connector else ""
         user_input = payload.get("input", "")
         
-        # We can use summary_model if available, but default model is fine
-        summary_model = self.engine.config.get("agent", {}).get("summary_model")
-        original_model = self.engine.model
-        
-        if summary_model:
-            from imports.providers_manager import Model
-            self.engine.model = Model(**summary_model)
-            
-        try:
-            response_text = self.engine.generate_response(
-                role=self,
-                system_prompt=SYSTEM_PROMPT,
-                user_prompt=user_input,
-            )
-            parsed = self.parse_json_response(response_text)
-        finally:
-            self.engine.model = original_model
-        
+        # The model comes from agent.role_models (summary_model by default)
+        return dict(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_input,
+        )
+
+    def finish(self, parsed: dict, payload: dict) -> dict:
         action = parsed.get("result", {}).get("action", "skip")
         query = parsed.get("result", {}).get("query", "")
         
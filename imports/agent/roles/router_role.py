@@ -1,38 +1,76 @@
-from imports.agent.pipeline.role_base import AIRole
+import re
+from typing import Callable, Optional
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class RouterRole(AIRole):
     name = "Router"
     
     def __init__(self, engine):
         self.engine = engine
+        # In direct mode the Router also writes the final reply for conversations
+        direct_config = engine.config.get("pipeline", {}).get("direct_conversation", {})
+        self.direct_conversation = bool(direct_config.get("active", False))
+        properties = {
+            "type": {"type": "string", "enum": ["conversation", "task"]},
+            "allowed": {"type": "boolean"},
+        }
+        if self.direct_conversation:
+            # Right after the type, so the reply can be streamed before the rest is written
+            properties["final_user_message"] = {"type": "string"}
+        properties["task_summary"] = {"type": "string"}
+        properties["answer"] = {"type": "string"}
+        self.output_schema = result_schema(properties, ["type", "allowed"])
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict, on_partial: Optional[Callable[[str], None]] = None) -> dict:
         """
         Router role: determines request type (conversation vs task).
         
-        Payload: {"input": str, "history": list, "identity": str, "memory": list, "input_images": list}
-        Returns: {"result": {"type": "conversation" | "task"}}
+        Payload: {"input": str, "history": list, "identity": str, "memory": list, "input_images": list, "language": str}
+        Output: {"result": {"type": "conversation" | "task"}}
+        
+        With `pipeline.direct_conversation` active the result also carries
+        `final_user_message` for conversations, written in the agent's persona and
+        `language`. If `on_partial` is given the response is streamed and the
+        callback receives that message as it grows (only once the type is known
+        to be "conversation").
         """
-        SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("router_role_prompt", {}) if self.engine.mcp_connector else ""
+        prompt_name = "router_direct_role_prompt" if self.direct_conversation else "router_role_prompt"
+        SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt(prompt_name, {}) if self.engine.mcp_connector else ""
         user_input = payload.get("input", "")
         identity = payload.get("identity", "")
         history = payload.get("history", [])
         memory = payload.get("memory", [])
         input_images = payload.get("input_images", [])
+        language = payload.get("language", "English")
 
         #history_text = "\n".join([f"{r.role}: {r.message} , image: {r.image_hashes}" for r in history])
         
-        user_prompt = f"Agent Identity / Rules:\n{identity}\n\n"
+        static_context = f"Agent Identity / Rules:\n{identity}\n"
+        user_prompt = ""
         #user_prompt += f"Recent Conversation History:\n{history_text}\n\n"
         if memory:
             user_prompt += f"Relevant Memories:\n{memory}\n\n"
         user_prompt += f"User Input: {user_input}\n"
+        if self.direct_conversation:
+            user_prompt += f"\nIf this is a conversation, write final_user_message in {language}.\n"
+        
+        on_chunk = None
+        if on_partial and self.direct_conversation:
+            last_partial = ""
+            def on_chunk(text: str) -> None:
+                nonlocal last_partial
+                if not re.search(r'"type"\s*:\s*"conversation"', text):
+                    return
+                partial = self.extract_partial_field(text, "final_user_message")
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    on_partial(partial)
         
-        response_text = self.engine.generate_response(
-            role=self,
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
             history_records=history,
             input_images=input_images,
+            on_chunk=on_chunk,
+            static_context=static_context,
         )
-        return self.parse_json_response(response_text)
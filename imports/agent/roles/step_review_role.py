@@ -0,0 +1,91 @@
+import json
+import threading
+from imports.agent.pipeline.role_base import AIRole, result_schema
+
+class StepReviewRole(AIRole):
+    name = "StepReview"
+    output_schema = result_schema(
+        {
+            "resolution": {"type": "string", "enum": ["success", "failure", "interrupt"]},
+            "confidence": {"type": "number"},
+            "decision": {"type": "string", "enum": ["next_task", "task_completed", "task_interrupted"]},
+            "next_task": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "description": {"type": "string"}},
+                "required": ["description"],
+            },
+            "reason": {"type": "string"},
+        },
+        ["resolution", "confidence"],
+    )
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.stats = {"reviews": 0, "accepted": 0, "escalated": 0, "skipped_on_error": 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Return review calls, reviews trusted as-is and reviews escalated to the Verifier."""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def build_request(self, payload: dict) -> dict:
+        """
+        StepReview role (fused step mode): the Worker's follow-up call after its
+        action ran. Judges the step result and proposes what happens next, doing
+        the work of the Verifier and the following Deconstructor call at once.
+
+        Payload: {
+            "task_summary": str,
+            "current_task": dict,
+            "worker_output": dict,
+            "answer": dict,
+            "tasks_history": list,
+            "abilities": list,
+            "images": list[str],
+        }
+
+        Output: {"notes": str, "result": {
+            "resolution": "success"|"failure"|"interrupt",
+            "confidence": float,
+            "decision": "next_task"|"task_completed"|"task_interrupted",
+            "next_task": {...}, "reason": str,
+        }}
+        """
+        SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("step_review_role_prompt", {}) if self.engine.mcp_connector else ""
+        self.count("reviews")
+
+        task_summary = payload.get("task_summary", "")
+        current_task = payload.get("current_task", {})
+        worker_output = payload.get("worker_output", {})
+        answer = payload.get("answer", {})
+        tasks_history = payload.get("tasks_history", [])
+        abilities = payload.get("abilities", [])
+        images = payload.get("images", [])
+
+        static_context = f"Available Abilities:\n{json.dumps(abilities, ensure_ascii=False)}\n" if abilities else ""
+
+        user_prompt = f"Task Summary: {task_summary}\n\n"
+        if tasks_history:
+            user_prompt += f"Steps completed before this one:\n{json.dumps(tasks_history, ensure_ascii=False)}\n\n"
+        user_prompt += f"Current step: {json.dumps(current_task, ensure_ascii=False)}\n"
+        if worker_output:
+            user_prompt += f"Your output for this step: {json.dumps(worker_output, ensure_ascii=False)}\n"
+        if answer:
+            user_prompt += f"Execution Results: {json.dumps(answer, ensure_ascii=False)}\n"
+        if images:
+            user_prompt += f"Generated images in this step: {json.dumps(images, ensure_ascii=False)}\n"
+        user_prompt += "\nJudge this step and decide what happens next."
+        if len(tasks_history) > 10:
+            user_prompt += f"[SYSTEM NOTICE]: tasks_history is too long. Cleanup required."
+
+        return dict(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            input_images=images,
+            static_context=static_context,
+        )
@@ -1,65 +1,69 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.role_base import AIRole, LocalResult
 
 class SummaryRole(AIRole):
     name = "Summary"
+    priority = "background"
+    blocking_finish = True
+    output_schema = {
+        "type": "object",
+        "properties": {"summary": {"type": "string"}},
+        "required": ["summary"],
+    }
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict, history_manager=None) -> dict:
+    def build_request(self, payload: dict, history_manager=None) -> dict | LocalResult:
         """
         Summary Creator role: creates a summary from conversation history.
         
-        Payload: {"history": list[HistoryRecord]}
+        Payload: {"history": list[HistoryRecord]}, the snapshot to summarize;
+        read from the history manager (and stored in the payload for `finish`)
+        when missing.
         """
         if not history_manager:
-            return {"status": "skipped, no history manager"}
+            return LocalResult({"status": "skipped, no history manager"})
             
-        records = history_manager.get_dialog_records()
+        records = payload.get("history")
+        if records is None:
+            records = payload["history"] = history_manager.get_dialog_records()
         if len(records) < 20:
-             return {"status": f"skipped, {len(records)} < 20 records"}
+             return LocalResult({"status": f"skipped, {len(records)} < 20 records"})
              
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("summary_role_prompt", {}) if self.engine.mcp_connector else ""
         records_text = [r.to_dict() for r in records]
         user_prompt = f"Conversational History to summarize:\n{json.dumps(records_text, indent=2, ensure_ascii=False)}"
         
-        # We can use summary_model if available, but default model is fine
-        summary_model = self.engine.config.get("agent", {}).get("summary_model")
-        original_model = self.engine.model
+        # The model comes from agent.role_models (summary_model by default)
+        return dict(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+        )
+
+    def finish(self, parsed: dict, payload: dict, history_manager=None) -> dict:
+        summary_text = parsed.get("summary", "")
         
-        if summary_model:
-            from imports.providers_manager import Model
-            self.engine.model = Model(**summary_model)
+        if summary_text:
+            # Archive the snapshot that was summarized, not records added since
+            records = payload.get("history", [])
+            old_records = records[:-5]
+            user_msg = ""
+            for rec in old_records:
+                if rec.role == "user":
+                    user_msg = rec.message
+                elif rec.role == "model" and user_msg:
+                    if self.engine.mcp_connector:
+                        try:
+                            self.engine.mcp_connector.execute_tool("save_archived_message", {
+                                "user_msg": user_msg,
+                                "model_msg": rec.message
+                            })
+                        except Exception as e:
+                            print(f"Error saving archived message: {e}")
+                    user_msg = ""
             
-        try:
-            response_text = self.engine.generate_response(
-                role=self,
-                system_prompt=SYSTEM_PROMPT,
-                user_prompt=user_prompt,
-            )
-            parsed = self.parse_json_response(response_text)
-            summary_text = parsed.get("summary", "")
+            added_since = max(0, len(history_manager.get_dialog_records()) - len(records))
+            history_manager.compress_dialog_history(summary_text, keep_recent=5 + added_since)
             
-            if summary_text:
-                old_records = records[:-5]
-                user_msg = ""
-                for rec in old_records:
-                    if rec.role == "user":
-                        user_msg = rec.message
-                    elif rec.role == "model" and user_msg:
-                        if self.engine.mcp_connector:
-                            try:
-                                self.engine.mcp_connector.execute_tool("save_archived_message", {
-                                    "user_msg": user_msg,
-                                    "model_msg": rec.message
-                                })
-                            except Exception as e:
-                                print(f"Error saving archived message: {e}")
-                        user_msg = ""
-                
-                history_manager.compress_dialog_history(summary_text, keep_recent=5)
-                
-            return parsed
-        finally:
-            self.engine.model = original_model
+        return parsed
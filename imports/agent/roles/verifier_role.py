@@ -1,13 +1,86 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+import threading
+from imports.agent.pipeline.role_base import AIRole, LocalResult, result_schema
+from imports.mcp.tool_cache import ToolResultCache
 
 class VerifierRole(AIRole):
     name = "Verifier"
+    output_schema = result_schema(
+        {"resolution": {"type": "string", "enum": ["success", "failure", "interrupt"]}},
+        ["resolution"],
+    )
 
     def __init__(self, engine):
         self.engine = engine
+        self.pre_verifier_enabled = bool(engine.config.get("pipeline", {}).get("pre_verifier", False))
+        self.stats = {"llm_calls": 0, "skipped_success": 0, "skipped_failure": 0}
+        self._stats_lock = threading.Lock()
 
-    def run(self, payload: dict) -> dict:
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Return LLM verifier calls and the number of calls decided locally."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["skipped_calls"] = stats["skipped_success"] + stats["skipped_failure"]
+        return stats
+
+    @staticmethod
+    def _classify_tool_result(result) -> str:
+        """Classify a tool result as "error", "empty" or "result"."""
+        if isinstance(result, str):
+            stripped = result.strip()
+            if stripped.startswith("{"):
+                try:
+                    result = json.loads(stripped)
+                except json.JSONDecodeError:
+                    return "result"
+            elif stripped.startswith("Error"):
+                # PipelineEngine.execute_tool reports exceptions as plain strings
+                return "error"
+            else:
+                return "result" if stripped else "empty"
+        if not isinstance(result, dict):
+            return "result" if result not in (None, "", [], {}) else "empty"
+        if ToolResultCache.is_error_result(result):
+            return "error"
+        if "tool_result" in result:
+            return "empty" if result["tool_result"] in (None, "", [], {}) else "result"
+        if "data" in result:
+            return "empty" if result["data"] in (None, "", [], {}) else "result"
+        return "result"
+
+    def pre_verify(self, payload: dict) -> dict | None:
+        """
+        Deterministic fast path in front of the LLM verifier.
+        
+        Decides obvious outcomes locally using the per-tool `verifier` rules from
+        mcp_config.json. Returns a Verifier-shaped result, or None when the case is
+        ambiguous and the LLM has to decide.
+        """
+        worker_output = payload.get("worker_output", {})
+        answer = payload.get("answer", {})
+        action = worker_output.get("action")
+        
+        if not action:
+            return {"notes": "Pre-verifier: the Worker returned no valid action.", "result": {"resolution": "failure"}}
+        if action != "tool" or not self.engine.mcp_connector:
+            return None
+        
+        tool_name = answer.get("tool", worker_output.get("tool_name", ""))
+        kind = self._classify_tool_result(answer.get("result"))
+        decision = self.engine.mcp_connector.get_verifier_rules(tool_name).get(kind, "llm")
+        if decision not in ("success", "failure"):
+            return None
+        
+        notes = f"Pre-verifier: tool '{tool_name}' returned {kind}, resolved as {decision} by rule."
+        if kind == "error":
+            notes += f" Tool output: {str(answer.get('result'))[:500]}"
+        return {"notes": notes, "result": {"resolution": decision}}
+
+    def build_request(self, payload: dict) -> dict | LocalResult:
         """
         Verifier role: evaluates a single step result.
         
@@ -15,7 +88,7 @@ class VerifierRole(AIRole):
         
         Verifier does NOT see: history, identity, memory.
         
-        Returns: {"result": {"resolution": "success"|"failure"|"interrupt"}, "notes": str}
+        Output: {"result": {"resolution": "success"|"failure"|"interrupt"}, "notes": str}
         """
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("verifier_role_prompt", {}) if self.engine.mcp_connector else ""
         current_step = payload.get("task", {})
@@ -24,7 +97,14 @@ class VerifierRole(AIRole):
         images = payload.get("images", [])
         
         if not current_step:
-            return {"notes": "No current step to verify.", "result": {"resolution": "success"}}
+            return LocalResult({"notes": "No current step to verify.", "result": {"resolution": "success"}})
+        
+        if self.pre_verifier_enabled:
+            local_out = self.pre_verify(payload)
+            if local_out:
+                self._count(f"skipped_{local_out['result']['resolution']}")
+                return LocalResult(local_out)
+        self._count("llm_calls")
             
         user_prompt = f"Step description: {json.dumps(current_step, ensure_ascii=False)}\n"
         
@@ -43,10 +123,8 @@ class VerifierRole(AIRole):
         if images:
             user_prompt += f"Generated images in this step: {json.dumps(images, ensure_ascii=False)}\n"
 
-        response_text = self.engine.generate_response(
-            role=self,
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
             input_images=images,
         )
-        return self.parse_json_response(response_text)
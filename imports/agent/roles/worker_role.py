@@ -1,13 +1,26 @@
 import json
-from imports.agent.pipeline.role_base import AIRole
+from imports.agent.pipeline.role_base import AIRole, result_schema
 
 class WorkerRole(AIRole):
     name = "Worker"
+    output_schema = result_schema(
+        {
+            "action": {"type": "string", "enum": ["tool", "ask_user", "text", "delete_history_entry", "compress_history_entry", "interrupt"]},
+            "tool_name": {"type": "string"},
+            "arguments": {"type": "object"},
+            "message": {"type": "string"},
+            "entry_ids": {"type": "array", "items": {"type": "integer"}},
+            "instruction": {"type": "string"},
+            "status": {"type": "string", "enum": ["success", "interrupt"]},
+            "answer": {"type": "string"},
+        },
+        ["action"],
+    )
 
     def __init__(self, engine):
         self.engine = engine
 
-    def run(self, payload: dict) -> dict:
+    def build_request(self, payload: dict) -> dict:
         """
         Worker role: executes a single task step.
         
@@ -20,7 +33,7 @@ class WorkerRole(AIRole):
         
         Worker does NOT have access to: identity, history, memory, tasks_history.
         
-        Returns: {"result": {"action": "tool"|"text"|"ask_user"|"interrupt", "status": "success"|"interrupt", "answer": str, "media": list[str], ...}}
+        Output: {"result": {"action": "tool"|"text"|"ask_user"|"interrupt", "status": "success"|"interrupt", "answer": str, "media": list[str], ...}}
         """
         SYSTEM_PROMPT = self.engine.mcp_connector.generate_prompt("worker_role_prompt", {}) if self.engine.mcp_connector else ""
         current_task = payload.get("current_task", {})
@@ -31,20 +44,20 @@ class WorkerRole(AIRole):
         
         tools_text = json.dumps(tools, ensure_ascii=False)
         
+        static_context = f"Available tools:\n{tools_text}\n"
+        if abilities:
+            static_context += f"Your abilities:\n{json.dumps(abilities, ensure_ascii=False)}\n"
+        
         user_prompt = f"Current step: {json.dumps(current_task, ensure_ascii=False)}\n"
-        user_prompt += f"Available tools:\n{tools_text}\n"
         if tasks_history:
-            user_prompt += f"Steps completed so far:\n{json.dumps(tasks_history, indent=2, ensure_ascii=False)}\n\n"
-        if abilities:
-            user_prompt += f"Your abilities:\n{json.dumps(abilities, ensure_ascii=False)}\n"
+            user_prompt += f"Steps completed so far:\n{json.dumps(tasks_history, ensure_ascii=False)}\n\n"
         if feedback:
             user_prompt += f"Feedback from Verifier on previous run: {feedback}\n"
             
         user_prompt += "\nIf the task is unexecutable (e.g. no tool for it, impossible constraints), use action 'interrupt', status 'interrupt' and return 'task_unexecutable' as answer."
 
-        response_text = self.engine.generate_response(
-            role=self,
+        return dict(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
+            static_context=static_context,
         )
-        return self.parse_json_response(response_text)
@@ -2,7 +2,10 @@ from dataclasses import dataclass, field
 from datetime import datetime
 from hashlib import md5
 import os
+import re
+import shutil
 import json
+import threading
 
 DEBUG = os.getenv("DEBUG", "False")
 
@@ -41,6 +44,8 @@ class HistoryManager:
         self.conversational_history: list[HistoryRecord] = []
         self.task_history: list[HistoryRecord] = []
         self.file_path: str | None = None
+        # Guards the conversational history when several chat workers run in parallel
+        self._lock = threading.RLock()
         
         if history_path:
             self.file_path = history_path
@@ -53,8 +58,9 @@ class HistoryManager:
         new_record = HistoryRecord(role, message.strip(), image_hashes=image_hashes or [])
         if DEBUG:
             print(f"Adding dialog record: {new_record}")
-        self.conversational_history.append(new_record)
-        self.save_history()
+        with self._lock:
+            self.conversational_history.append(new_record)
+            self.save_history()
 
     def add_task_record(self, role: str, message: str, image_hashes: list[str] | None = None) -> None:
         """Adds a record to the short-lived task history."""
@@ -64,10 +70,11 @@ class HistoryManager:
         self.task_history.append(new_record)
 
     def get_dialog_records(self, count: int = 0) -> list[HistoryRecord]:
-        """Returns the conversation history."""
-        if count == 0:
-            return self.conversational_history
-        return self.conversational_history[-count:]
+        """Returns a copy of the conversation history."""
+        with self._lock:
+            if count == 0:
+                return list(self.conversational_history)
+            return self.conversational_history[-count:]
 
     def get_task_records(self, count: int = 0) -> list[HistoryRecord]:
         """Returns the current task history."""
@@ -85,27 +92,29 @@ class HistoryManager:
         """Saves only the conversational history."""
         if self.file_path:
             try:
-                records_list = []
-                for record in self.conversational_history:
-                    records_list.append(record.to_dict())
-                history_json = {
-                    "records": records_list
-                }
-                with open(self.file_path, "w") as f:
-                    json.dump(history_json, f, indent=4, ensure_ascii=False)
+                with self._lock:
+                    records_list = []
+                    for record in self.conversational_history:
+                        records_list.append(record.to_dict())
+                    history_json = {
+                        "records": records_list
+                    }
+                    with open(self.file_path, "w") as f:
+                        json.dump(history_json, f, indent=4, ensure_ascii=False)
             except IOError as e:
                 print(f"Failed to save history. Error: {e}")
 
     def compress_dialog_history(self, summary_text: str, keep_recent: int = 5) -> None:
         """Replaces old history with a summary node, keeping the most recent N messages."""
-        if len(self.conversational_history) <= keep_recent:
-            return
+        with self._lock:
+            if len(self.conversational_history) <= keep_recent:
+                return
+                
+            recent = self.conversational_history[-keep_recent:]
+            summary_record = HistoryRecord(role="model", message=f"Conversation Summary:\n{summary_text}")
             
-        recent = self.conversational_history[-keep_recent:]
-        summary_record = HistoryRecord(role="model", message=f"Conversation Summary:\n{summary_text}")
-        
-        self.conversational_history = [summary_record] + recent
-        self.save_history()
+            self.conversational_history = [summary_record] + recent
+            self.save_history()
 
     def load_history(self, file_path: str) -> None:
         """Loads the conversational history. Supports both old (image_hash) and new (image_hashes) formats."""
@@ -132,4 +141,49 @@ class HistoryManager:
                         ))
             except IOError:
                 print("History file not found or invalid format. Start anew.")
-                self.conversational_history = []
\ No newline at end of file
+                self.conversational_history = []
+
+class ChatHistories:
+    """One HistoryManager per chat, created on first use.
+
+    Chats are processed in parallel, so each keeps its own conversational and
+    task history. With a *history_path* of ``./data/history.json`` the history
+    of chat ``42`` is stored in ``./data/history/42.json``; without one every
+    chat runs in anonymous mode.
+
+    A history file from before per-chat histories (*history_path* itself) is
+    imported into the first chat that is loaded without a file of its own, and
+    then renamed to ``<history_path>.imported``.
+    """
+
+    def __init__(self, history_path: str = "") -> None:
+        self.history_path = history_path
+        self.history_dir = os.path.splitext(history_path)[0] if history_path else ""
+        self._managers: dict[str, HistoryManager] = {}
+        self._lock = threading.Lock()
+        if self.history_dir:
+            os.makedirs(self.history_dir, exist_ok=True)
+
+    def get(self, chat_id) -> HistoryManager:
+        """Returns the HistoryManager of *chat_id*, loading its file the first time."""
+        chat_id = str(chat_id)
+        with self._lock:
+            manager = self._managers.get(chat_id)
+            if manager is None:
+                path = ""
+                if self.history_dir:
+                    path = os.path.join(self.history_dir, re.sub(r"[^\w.-]", "_", chat_id) + ".json")
+                    self._import_legacy_history(chat_id, path)
+                manager = self._managers[chat_id] = HistoryManager(path)
+            return manager
+
+    def _import_legacy_history(self, chat_id: str, path: str) -> None:
+        """Copy the single shared history file of older versions into the chat's file."""
+        if os.path.exists(path) or not os.path.isfile(self.history_path):
+            return
+        try:
+            shutil.copyfile(self.history_path, path)
+            os.replace(self.history_path, self.history_path + ".imported")
+            print(f"Imported dialog history {self.history_path} into chat {chat_id}.")
+        except OSError as e:
+            print(f"Failed to import dialog history {self.history_path}. Error: {e}")
@@ -0,0 +1,438 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import http.client
+import ssl
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import AsyncIterator, Iterator
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+except ImportError:  # async client and HTTP/2; without it blocking transports run on threads
+    httpx = None
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_MAX_THREADS = 32
+# Methods that can be resent safely when a reused connection drops before the response
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HTTPStatusError(Exception):
+    """Raised for HTTP responses with status >= 400. The body is already read."""
+
+    def __init__(self, code: int, body: str, headers: dict) -> None:
+        super().__init__(f"HTTP {code}: {body[:500]}")
+        self.code = code
+        self.body = body
+        self.headers = headers
+
+
+class TransportResponse(ABC):
+    """Minimal response interface shared by all transports.
+
+    Iterating yields raw body lines (bytes), which is what SSE parsing needs;
+    `read()` returns the whole body. Use as a context manager so the
+    connection goes back to the pool.
+    """
+
+    status: int = 0
+    headers: dict = {}
+
+    @abstractmethod
+    def read(self) -> bytes:
+        pass
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[bytes]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class HTTPTransport(ABC):
+    """Base class for provider transports. Implementations must be thread-safe."""
+
+    @abstractmethod
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> TransportResponse:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# ------------------------------------------------------------------
+# http.client keep-alive pool
+# ------------------------------------------------------------------
+
+class _PooledResponse(TransportResponse):
+    def __init__(self, transport: "PooledHTTPTransport", key: tuple, conn: http.client.HTTPConnection, response: http.client.HTTPResponse) -> None:
+        self._transport = transport
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._released = False
+        self.status = response.status
+        self.headers = {k.lower(): v for k, v in response.getheaders()}
+
+    def read(self) -> bytes:
+        try:
+            return self._response.read()
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            while True:
+                line = self._response.readline()
+                if not line:
+                    break
+                yield line
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        # A connection can only be reused once its response body is fully consumed
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            self._response.close()
+        self._transport._release(self._key, self._conn, reusable)
+
+
+class PooledHTTPTransport(HTTPTransport):
+    """HTTP/1.1 transport keeping idle keep-alive connections per host.
+
+    At most ``max_connections`` idle connections are kept per (scheme, host, port).
+    A request on a reused connection that the server already closed is retried
+    once on a fresh connection when it failed while being sent, or for
+    idempotent methods. A POST that may have reached the server is not resent.
+    """
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, max_connections: int = DEFAULT_MAX_CONNECTIONS) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self._idle: dict[tuple, deque] = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+        self.stats = {"new_connections": 0, "reused_connections": 0}
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> TransportResponse:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                sent = True
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused and attempt == 0 and (not sent or method.upper() in IDEMPOTENT_METHODS):
+                    continue
+                raise ConnectionError(f"Connection to {key[1]} failed: {e}") from e
+            except BaseException:
+                conn.close()
+                raise
+
+            wrapped = _PooledResponse(self, key, conn, response)
+            if wrapped.status >= 400:
+                error_body = wrapped.read().decode("utf-8", errors="replace")
+                raise HTTPStatusError(wrapped.status, error_body, wrapped.headers)
+            return wrapped
+        raise ConnectionError(f"Connection to {key[1]} failed.")
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                while idle:
+                    idle.pop().close()
+            self._idle.clear()
+
+    def _acquire(self, key: tuple) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats["reused_connections"] += 1
+                return idle.pop(), True
+            self.stats["new_connections"] += 1
+
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        conn.connect()
+        # The connect timeout only covers the handshake; reads use the read timeout
+        conn.sock.settimeout(self.read_timeout)
+        return conn, False
+
+    def _release(self, key: tuple, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, deque())
+                if len(idle) < self.max_connections:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+
+# ------------------------------------------------------------------
+# httpx transport (HTTP/2)
+# ------------------------------------------------------------------
+
+class _HTTPXResponse(TransportResponse):
+    def __init__(self, response) -> None:
+        self._response = response
+        self.status = response.status_code
+        self.headers = {k.lower(): v for k, v in response.headers.items()}
+
+    def read(self) -> bytes:
+        try:
+            return self._response.read()
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            for line in self._response.iter_lines():
+                yield line.encode("utf-8")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class HTTPXTransport(HTTPTransport):
+    """Transport backed by a shared ``httpx.Client`` (HTTP/2 when ``h2`` is installed)."""
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, max_connections: int = DEFAULT_MAX_CONNECTIONS, http2: bool = True) -> None:
+        self._client = httpx.Client(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> TransportResponse:
+        request = self._client.build_request(method, url, content=body, headers=headers)
+        try:
+            response = self._client.send(request, stream=True)
+        except httpx.TransportError as e:
+            raise ConnectionError(f"Request to {url} failed: {e}") from e
+        wrapped = _HTTPXResponse(response)
+        if wrapped.status >= 400:
+            error_body = wrapped.read().decode("utf-8", errors="replace")
+            raise HTTPStatusError(wrapped.status, error_body, wrapped.headers)
+        return wrapped
+
+    def close(self) -> None:
+        self._client.close()
+
+
+# ------------------------------------------------------------------
+# asyncio transports
+# ------------------------------------------------------------------
+
+class AsyncTransportResponse(ABC):
+    """Async counterpart of `TransportResponse`.
+
+    ``async for`` yields raw body lines (bytes); ``await read()`` returns the
+    whole body. Use as an async context manager so the connection goes back
+    to the pool.
+    """
+
+    status: int = 0
+    headers: dict = {}
+
+    @abstractmethod
+    async def read(self) -> bytes:
+        pass
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+
+class AsyncHTTPTransport(ABC):
+    """Base class for async provider transports, shared by every coroutine of a process."""
+
+    @abstractmethod
+    async def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> AsyncTransportResponse:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _AsyncHTTPXResponse(AsyncTransportResponse):
+    def __init__(self, response) -> None:
+        self._response = response
+        self.status = response.status_code
+        self.headers = {k.lower(): v for k, v in response.headers.items()}
+
+    async def read(self) -> bytes:
+        try:
+            return await self._response.aread()
+        finally:
+            await self.aclose()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for line in self._response.aiter_lines():
+                yield line.encode("utf-8")
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._response.aclose()
+
+
+class AsyncHTTPXTransport(AsyncHTTPTransport):
+    """Transport backed by a shared ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is installed)."""
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, max_connections: int = DEFAULT_MAX_CONNECTIONS, http2: bool = True) -> None:
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> AsyncTransportResponse:
+        request = self._client.build_request(method, url, content=body, headers=headers)
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.TransportError as e:
+            raise ConnectionError(f"Request to {url} failed: {e}") from e
+        wrapped = _AsyncHTTPXResponse(response)
+        if wrapped.status >= 400:
+            error_body = (await wrapped.read()).decode("utf-8", errors="replace")
+            raise HTTPStatusError(wrapped.status, error_body, wrapped.headers)
+        return wrapped
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class _ThreadedAsyncResponse(AsyncTransportResponse):
+    def __init__(self, transport: "ThreadedAsyncTransport", response: TransportResponse) -> None:
+        self._transport = transport
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    async def read(self) -> bytes:
+        return await self._transport.run(self._response.read)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        lines = iter(self._response)
+        try:
+            while True:
+                line = await self._transport.run(next, lines, None)
+                if line is None:
+                    break
+                yield line
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._transport.run(self._response.close)
+
+
+class ThreadedAsyncTransport(AsyncHTTPTransport):
+    """Runs a blocking `HTTPTransport` on its own pool of *max_threads* threads.
+
+    Used when httpx is not installed and for the traffic archive's recording
+    and replay transports, which stay synchronous. The pool is separate from
+    the pipeline's executor, so streams waiting on the network never hold the
+    threads other blocking work needs; context variables (the replayed
+    session) follow each call.
+    """
+
+    def __init__(self, transport: HTTPTransport, max_threads: int = DEFAULT_MAX_THREADS) -> None:
+        self.transport = transport
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="http")
+
+    async def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> AsyncTransportResponse:
+        response = await self.run(self.transport.request, method, url, body, headers)
+        return _ThreadedAsyncResponse(self, response)
+
+    async def run(self, func, *args):
+        """Await ``func(*args)`` on the transport's threads in the caller's context."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(context.run, func, *args))
+
+    async def aclose(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def create_transport(config: dict) -> HTTPTransport:
+    """Build a transport from a provider's ``transport`` settings.
+
+    ``http2: true`` selects the httpx transport when httpx (with ``h2``) is
+    installed; otherwise the http.client keep-alive pool is used.
+    """
+    connect_timeout = float(config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT))
+    read_timeout = float(config.get("read_timeout", DEFAULT_READ_TIMEOUT))
+    max_connections = int(config.get("max_connections", DEFAULT_MAX_CONNECTIONS))
+
+    if config.get("http2", False):
+        if httpx is None:
+            print("HTTP transport: httpx is not installed, using HTTP/1.1 keep-alive pool.")
+        else:
+            try:
+                return HTTPXTransport(connect_timeout, read_timeout, max_connections, http2=True)
+            except ImportError:
+                print("HTTP transport: h2 is not installed, using HTTP/1.1 keep-alive pool.")
+    return PooledHTTPTransport(connect_timeout, read_timeout, max_connections)
+
+
+def create_async_transport(config: dict, transport: HTTPTransport) -> AsyncHTTPTransport:
+    """Async counterpart of `create_transport` for the same ``transport`` settings.
+
+    Uses ``httpx.AsyncClient`` (HTTP/2 with ``http2: true`` when ``h2`` is
+    installed). Without httpx the blocking *transport* runs on a thread pool
+    of ``max_threads`` threads.
+    """
+    connect_timeout = float(config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT))
+    read_timeout = float(config.get("read_timeout", DEFAULT_READ_TIMEOUT))
+    max_connections = int(config.get("max_connections", DEFAULT_MAX_CONNECTIONS))
+
+    if httpx is None:
+        print("HTTP transport: httpx is not installed, running the HTTP/1.1 keep-alive pool on threads.")
+        return ThreadedAsyncTransport(transport, int(config.get("max_threads", DEFAULT_MAX_THREADS)))
+    if config.get("http2", False):
+        try:
+            return AsyncHTTPXTransport(connect_timeout, read_timeout, max_connections, http2=True)
+        except ImportError:
+            print("HTTP transport: h2 is not installed, using HTTP/1.1 for the async client.")
+    return AsyncHTTPXTransport(connect_timeout, read_timeout, max_connections, http2=False)
@@ -1,3 +1,5 @@
+import asyncio
+import inspect
 from typing import Any
 
 
@@ -9,8 +11,14 @@ class MCPServer:
 
     Standard RPC methods:
         tool_list, tool_execute, prompt_list, prompt_generate, resource_list
+
+    Servers doing network I/O may implement their handlers as coroutines and
+    set ``is_async``; the async pipeline then awaits them on its event loop
+    instead of running them on the connector's thread pool.
     """
 
+    is_async: bool = False
+
     def handle_rpc(self, method: str, params: dict | None = None) -> Any:
         """Universal JSON-RPC style entry point.
 
@@ -25,4 +33,20 @@ class MCPServer:
         handler = getattr(self, f"_rpc_{method}", None)
         if handler is None:
             raise ValueError(f"Unknown RPC method: {method}")
-        return handler(params)
+        result = handler(params)
+        if inspect.iscoroutine(result):
+            # Coroutine handler called from synchronous code
+            return asyncio.run(result)
+        return result
+
+    async def handle_rpc_async(self, method: str, params: dict | None = None) -> Any:
+        """`handle_rpc` for servers with coroutine handlers (``is_async``)."""
+        if params is None:
+            params = {}
+        handler = getattr(self, f"_rpc_{method}", None)
+        if handler is None:
+            raise ValueError(f"Unknown RPC method: {method}")
+        result = handler(params)
+        if inspect.iscoroutine(result):
+            return await result
+        return result
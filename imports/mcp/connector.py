@@ -1,9 +1,19 @@
 import json
+import asyncio
 import importlib
 import concurrent.futures
 from typing import Any
 from imports.mcp.base import MCPServer
 from imports.mcp.remote import RemoteMCPServer
+from imports.mcp.tool_cache import ToolResultCache
+from imports.tracing import tracer
+
+# Tool config keys that tune the connector and are not part of the schema sent to the LLM
+TOOL_CONFIG_KEYS = ("timeout", "cacheable", "cache_ttl", "verifier")
+DEFAULT_CACHE_TTL = 300
+DEFAULT_TOOL_WORKERS = 16
+# Pre-verifier outcome per kind of tool result: "success", "failure" or "llm" (ask the Verifier)
+DEFAULT_VERIFIER_RULES = {"error": "failure", "empty": "llm", "result": "llm"}
 
 
 class MCPConnector:
@@ -12,18 +22,28 @@ class MCPConnector:
     Loads MCP servers dynamically from mcp_config.json.
     Aggregates tools, prompts, and ability descriptions from all registered
     servers and routes calls to the correct server.
+
+    Synchronous servers run on one shared thread pool (``tool_workers`` in
+    mcp_config.json), also when called from the async pipeline.
     """
 
     def __init__(self, config_data: dict, app_config: dict | None = None, image_manager=None) -> None:
         self._servers: list[MCPServer] = []
         self._tool_registry: dict[str, MCPServer] = {}    # tool_name -> server
         self._tool_timeouts: dict[str, int] = {}            # tool_name -> timeout_seconds
+        self._tool_cache_ttls: dict[str, float] = {}        # tool_name -> cache_ttl (cacheable tools only)
+        self._tool_cache = ToolResultCache()
+        self._tool_verifier_rules: dict[str, dict] = {}     # tool_name -> pre-verifier rules
         self._prompt_registry: dict[str, MCPServer] = {}   # prompt_name -> server
         self._tool_schemas: list[dict] = []
         self._prompt_schemas: list[dict] = []
         self._ability_prompts: list[str] = []
         self._server_abilities: dict[str, list[str]] = {}  # server_name -> abilities
         self._tool_to_server_name: dict[str, str] = {}     # tool_name -> server_name
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(config_data.get("tool_workers", DEFAULT_TOOL_WORKERS)),
+            thread_name_prefix="mcp-tool",
+        )
         
         self.app_config = app_config
         self.image_manager = image_manager
@@ -90,10 +110,14 @@ class MCPConnector:
                 name = tool.get("name")
                 if name:
                     self._tool_registry[name] = server_instance
-                    self._tool_schemas.append(tool)
+                    self._tool_schemas.append({k: v for k, v in tool.items() if k not in TOOL_CONFIG_KEYS})
                     self._tool_to_server_name[name] = server_name
                     if "timeout" in tool:
                         self._tool_timeouts[name] = int(tool["timeout"])
+                    if tool.get("cacheable"):
+                        self._tool_cache_ttls[name] = float(tool.get("cache_ttl", DEFAULT_CACHE_TTL))
+                    if "verifier" in tool:
+                        self._tool_verifier_rules[name] = dict(tool["verifier"])
             
             # Prompts
             for prompt in server_cfg.get("prompts", []):
@@ -126,34 +150,100 @@ class MCPConnector:
         
         Uses the per-tool timeout from config if set, otherwise falls back to
         timeout_seconds argument (default 30s).
+        
+        Tools marked ``cacheable`` in config are served from the result cache
+        for ``cache_ttl`` seconds, and identical concurrent calls share one
+        execution.
         """
         server = self._tool_registry.get(name)
         if server is None:
             raise ValueError(f"Tool '{name}' is not registered in any MCP server.")
         
+        with tracer.span(f"tool:{name}", "tool", tool=name) as span:
+            if name in self._tool_cache_ttls:
+                executed = []
+                def call():
+                    executed.append(True)
+                    return self._execute_on_server(server, name, arguments, timeout_seconds)
+                result = self._tool_cache.get_or_run(name, arguments, self._tool_cache_ttls[name], call)
+                span.set_attribute("cache_hit", not executed)
+            else:
+                result = self._execute_on_server(server, name, arguments, timeout_seconds)
+            span.set_attribute("error", ToolResultCache.is_error_result(result))
+            return result
+
+    async def execute_tool_async(self, name: str, arguments: dict, timeout_seconds: int | None = None) -> Any:
+        """`execute_tool` for coroutines, with the same timeouts, caching and error results.
+
+        Servers with ``is_async`` are awaited directly; synchronous servers run
+        on the shared tool thread pool, so the event loop is never blocked.
+        """
+        server = self._tool_registry.get(name)
+        if server is None:
+            raise ValueError(f"Tool '{name}' is not registered in any MCP server.")
+        
+        with tracer.span(f"tool:{name}", "tool", tool=name) as span:
+            if name in self._tool_cache_ttls:
+                executed = []
+                async def call():
+                    executed.append(True)
+                    return await self._execute_on_server_async(server, name, arguments, timeout_seconds)
+                result = await self._tool_cache.get_or_run_async(name, arguments, self._tool_cache_ttls[name], call)
+                span.set_attribute("cache_hit", not executed)
+            else:
+                result = await self._execute_on_server_async(server, name, arguments, timeout_seconds)
+            span.set_attribute("error", ToolResultCache.is_error_result(result))
+            return result
+
+    def get_verifier_rules(self, name: str) -> dict[str, str]:
+        """Return the pre-verifier rules of a tool merged over the defaults."""
+        rules = dict(DEFAULT_VERIFIER_RULES)
+        rules.update(self._tool_verifier_rules.get(name, {}))
+        return rules
+
+    def get_cache_stats(self) -> dict[str, dict]:
+        """Return per-tool result cache counters and hit rates."""
+        return self._tool_cache.get_stats()
+
+    def _execute_on_server(self, server: MCPServer, name: str, arguments: dict, timeout_seconds: int | None) -> Any:
+        """Run the tool on its server, converting timeouts and exceptions to error results."""
+        effective_timeout = self._tool_timeout(name, timeout_seconds)
+        future = self._executor.submit(tracer.bind(server.handle_rpc), "tool_execute", {"name": name, "arguments": arguments})
+        try:
+            return future.result(timeout=effective_timeout)
+        except concurrent.futures.TimeoutError:
+            return self._error_result(name, arguments, f"Error: Tool execution timed out after {effective_timeout} seconds.")
+        except Exception as e:
+            return self._error_result(name, arguments, str(e))
+
+    async def _execute_on_server_async(self, server: MCPServer, name: str, arguments: dict, timeout_seconds: int | None) -> Any:
+        """Async `_execute_on_server`: awaits async servers, bridges synchronous ones through the tool pool."""
+        effective_timeout = self._tool_timeout(name, timeout_seconds)
+        params = {"name": name, "arguments": arguments}
+        if getattr(server, "is_async", False):
+            call = server.handle_rpc_async("tool_execute", params)
+        else:
+            call = asyncio.wrap_future(self._executor.submit(tracer.bind(server.handle_rpc), "tool_execute", params))
+        try:
+            return await asyncio.wait_for(call, effective_timeout)
+        except asyncio.TimeoutError:
+            return self._error_result(name, arguments, f"Error: Tool execution timed out after {effective_timeout} seconds.")
+        except Exception as e:
+            return self._error_result(name, arguments, str(e))
+
+    def _tool_timeout(self, name: str, timeout_seconds: int | None) -> float:
         # Per-tool timeout takes priority over the argument default
-        effective_timeout = self._tool_timeouts.get(name, timeout_seconds if timeout_seconds is not None else 30)
-            
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(server.handle_rpc, "tool_execute", {"name": name, "arguments": arguments})
-            try:
-                return future.result(timeout=effective_timeout)
-            except concurrent.futures.TimeoutError:
-                return {
-                    "tool_name": name,
-                    "tool_arguments": arguments,
-                    "tool_result": None,
-                    "truncate": False,
-                    "error": f"Error: Tool execution timed out after {effective_timeout} seconds."
-                }
-            except Exception as e:
-                return {
-                    "tool_name": name,
-                    "tool_arguments": arguments,
-                    "tool_result": None,
-                    "truncate": False,
-                    "error": str(e)
-                }
+        return self._tool_timeouts.get(name, timeout_seconds if timeout_seconds is not None else 30)
+
+    @staticmethod
+    def _error_result(name: str, arguments: dict, error: str) -> dict:
+        return {
+            "tool_name": name,
+            "tool_arguments": arguments,
+            "tool_result": None,
+            "truncate": False,
+            "error": error
+        }
 
     def generate_prompt(self, name: str, arguments: dict) -> str:
         """Route a prompt generation request to the owning MCP server."""
@@ -170,6 +260,11 @@ class MCPConnector:
                 return prompt_func()
         return ""
 
+    def get_embedding_model(self):
+        """Return the text embedding model loaded by the memory MCP, if any."""
+        memory_rag = getattr(self.memory_mcp, "memory_rag", None)
+        return getattr(memory_rag, "embedding_model", None)
+
     def get_language(self) -> str:
         """Return the configured language from identity MCP."""
         if self.identity_mcp:
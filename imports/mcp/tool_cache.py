@@ -0,0 +1,116 @@
+import asyncio
+import concurrent.futures
+import copy
+import json
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+
+class ToolResultCache:
+    """In-memory TTL cache for tool results with in-flight deduplication.
+
+    Keys are the tool name plus its canonicalized arguments. While a call is
+    running, identical calls wait for the same result instead of hitting the
+    server again. Error results are never stored.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[float, Any]] = {}                 # key -> (expires_at, result)
+        self._in_flight: dict[str, concurrent.futures.Future] = {}      # key -> pending call
+        self._stats: dict[str, dict[str, int]] = {}                     # tool_name -> counters
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name: str, arguments: dict) -> str:
+        """Canonical key: tool name + arguments with sorted keys and no whitespace."""
+        args = json.dumps(arguments or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return f"{name}:{args}"
+
+    @staticmethod
+    def is_error_result(result: Any) -> bool:
+        """True for the error shapes returned by MCP servers."""
+        if not isinstance(result, dict):
+            return False
+        return result.get("error") is not None or result.get("status") == "error"
+
+    def get_or_run(self, name: str, arguments: dict, ttl_seconds: float, call: Callable[[], Any]) -> Any:
+        """Return a cached result, join an identical in-flight call, or run *call*."""
+        key = self.make_key(name, arguments)
+        found, value, owner = self._lookup(name, key)
+        if found:
+            return value
+        if not owner:
+            return copy.deepcopy(value.result())
+
+        try:
+            result = call()
+        except BaseException as e:
+            self._fail(key, value, e)
+            raise
+        self._store(key, value, result, ttl_seconds)
+        return result
+
+    async def get_or_run_async(self, name: str, arguments: dict, ttl_seconds: float, call: Callable[[], Awaitable[Any]]) -> Any:
+        """`get_or_run` for coroutines; waiting for an identical in-flight call does not block the loop."""
+        key = self.make_key(name, arguments)
+        found, value, owner = self._lookup(name, key)
+        if found:
+            return value
+        if not owner:
+            return copy.deepcopy(await asyncio.wrap_future(value))
+
+        try:
+            result = await call()
+        except BaseException as e:
+            self._fail(key, value, e)
+            raise
+        self._store(key, value, result, ttl_seconds)
+        return result
+
+    def _lookup(self, name: str, key: str) -> tuple[bool, Any, bool]:
+        """Return (True, cached result, False) on a hit, else (False, in-flight Future, whether the caller owns it)."""
+        with self._lock:
+            stats = self._stats.setdefault(name, {"hits": 0, "misses": 0, "deduplicated": 0})
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                stats["hits"] += 1
+                return True, copy.deepcopy(entry[1]), False
+            if entry:
+                del self._entries[key]
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+                stats["misses"] += 1
+            else:
+                stats["deduplicated"] += 1
+        return False, future, owner
+
+    def _fail(self, key: str, future: concurrent.futures.Future, error: BaseException) -> None:
+        with self._lock:
+            self._in_flight.pop(key, None)
+        future.set_exception(error)
+
+    def _store(self, key: str, future: concurrent.futures.Future, result: Any, ttl_seconds: float) -> None:
+        with self._lock:
+            if not self.is_error_result(result):
+                now = time.monotonic()
+                # Drop expired entries so the cache does not grow without bound
+                for stale_key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                    del self._entries[stale_key]
+                self._entries[key] = (now + ttl_seconds, copy.deepcopy(result))
+            self._in_flight.pop(key, None)
+        future.set_result(result)
+
+    def get_stats(self) -> dict[str, dict]:
+        """Return per-tool hit/miss/dedup counters and hit rates."""
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                calls = stats["hits"] + stats["misses"] + stats["deduplicated"]
+                report[name] = dict(stats)
+                report[name]["hit_rate"] = (stats["hits"] + stats["deduplicated"]) / calls if calls else 0.0
+            return report
@@ -1,5 +1,7 @@
 from imports.providers_manager import ProvidersManager, Model
 from imports.history_manager import HistoryRecord
+from imports.tracing import tracer
+from imports.usage_tracker import usage_tracker
 from qdrant_client import QdrantClient, models
 from fastembed import TextEmbedding
 from fastembed.common.model_description import PoolingType, ModelSource
@@ -100,15 +102,15 @@ class MemoryRAG:
                          {"type": "fact", "source": "autonomous"}
         """
         query_filter = self._build_filter(filters) if filters else None
-        query_vector = list(self.embedding_model.embed([query]))[0].tolist()
+        query_vector = self._embed_text(query)
 
-        results = self.client.query_points(
+        results = self._query_points(
             collection_name=COLLECTION_NAME,
             query=query_vector,
             query_filter=query_filter,
             limit=limit,
             score_threshold=similarity_threshold,
-        ).points
+        )
 
         texts: list[str] = []
         current_time = time.time()
@@ -148,14 +150,14 @@ class MemoryRAG:
             memory_type: Category of the memory (e.g. "fact", "result", "error").
             context: Situational background.
         """
-        vector = list(self.embedding_model.embed([memory]))[0].tolist()
+        vector = self._embed_text(memory)
 
         # Check for near-duplicates
-        existing = self.client.query_points(
+        existing = self._query_points(
             collection_name=COLLECTION_NAME,
             query=vector,
             limit=1,
-        ).points
+        )
 
         if existing:
             top = existing[0]
@@ -173,10 +175,11 @@ class MemoryRAG:
                     message=merge_memory_prompt.format(old_fact=old_text, new_fact=memory)
                 )
                 try:
-                    merged_text = self.providers_manager.generation_request(
-                        self.merge_model, [history_record]
-                    ).strip()
-                    merged_vector = list(self.embedding_model.embed([merged_text]))[0].tolist()
+                    with usage_tracker.scope(role="MemoryMerge"):
+                        merged_text = self.providers_manager.generation_request(
+                            self.merge_model, [history_record], priority="background"
+                        ).strip()
+                    merged_vector = self._embed_text(merged_text)
                 except Exception as e:
                     print(f"Error during memory merge: {e}")
                     return
@@ -237,6 +240,16 @@ class MemoryRAG:
 
         return json.dumps(all_points, ensure_ascii=False, indent=2)
 
+    def _embed_text(self, text: str) -> list[float]:
+        with tracer.span("embedding", "embedding", texts=1):
+            return list(self.embedding_model.embed([text]))[0].tolist()
+
+    def _query_points(self, collection_name: str, **kwargs):
+        with tracer.span("qdrant:query_points", "qdrant", collection=collection_name, limit=kwargs.get("limit", 0)) as span:
+            points = self.client.query_points(collection_name=collection_name, **kwargs).points
+            span.set_attribute("results", len(points))
+            return points
+
     def _ensure_collection(self) -> None:
         """Create the collection if it doesn't exist."""
         collections = [c.name for c in self.client.get_collections().collections]
@@ -265,7 +278,7 @@ class MemoryRAG:
 
     def add_archived_message(self, user_msg: str, model_msg: str) -> None:
         text = f"User: {user_msg}\nModel: {model_msg}"
-        vector = list(self.embedding_model.embed([text]))[0].tolist()
+        vector = self._embed_text(text)
         point_id = str(uuid.uuid4())
         payload = {
             "user": user_msg,
@@ -278,12 +291,12 @@ class MemoryRAG:
         )
 
     def search_archived_messages(self, query: str, limit: int = 2) -> list[dict]:
-        query_vector = list(self.embedding_model.embed([query]))[0].tolist()
-        results = self.client.query_points(
+        query_vector = self._embed_text(query)
+        results = self._query_points(
             collection_name=ARCHIVED_COLLECTION_NAME,
             query=query_vector,
             limit=limit,
-        ).points
+        )
         
         return [p.payload for p in results if p.payload]
 
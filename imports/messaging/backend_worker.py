@@ -1,118 +1,206 @@
+import os
+import asyncio
 import traceback
 from imports.messaging.queue_manager import MessageBus
 from imports.messaging.message_models import AgentRequest, AgentResponse
+from imports.messaging.chat_scheduler import AsyncChatScheduler, ChatScheduler
 from imports.agent.pipeline.pipeline_engine import PipelineEngine
-from imports.history_manager import HistoryManager
+from imports.history_manager import ChatHistories, HistoryManager
+from imports.rate_limiter import rate_limiter
+from imports.payload_logger import payload_logger
+from imports.tracing import tracer
+from imports.usage_tracker import usage_tracker
 
-def backend_worker_loop(bus: MessageBus, pipeline_engine: PipelineEngine, history_manager: HistoryManager) -> None:
-    """
-    Background thread that continually reads from frontend_to_backend queue
-    and passes tasks to the single PipelineEngine instance.
-    """
-    while True:
-        try:
-            request: AgentRequest = bus.frontend_to_backend.get()
-            
-            # Helper function to inject into PipelineEngine for intermediate status updates
-            def send_status(msg: str) -> None:
-                bus.send_to_frontend(AgentResponse(
-                    frontend_type=request.frontend_type,
-                    chat_id=request.chat_id,
-                    type="status_update",
-                    text=msg
-                ))
+# Post-pipeline jobs still running (the event loop only keeps weak references to tasks)
+_background_jobs: set[asyncio.Task] = set()
 
-            # Process image if present in the text (sent by telegram plugin)
-            if request.text.startswith("[IMAGE_URL_ATTACHED]:"):
-                parts = request.text.split("\n", 1)
-                image_url = parts[0].replace("[IMAGE_URL_ATTACHED]:", "")
-                caption = parts[1] if len(parts) > 1 else ""
-                
-                try:
-                    send_status("Downloading image attachment...")
-                    if pipeline_engine.image_manager:
-                        image_hash = pipeline_engine.image_manager.save_image_from_url(image_url)
-                        request.image_hashes.append(image_hash)
-                    request.text = caption
-                except Exception as e:
-                    send_status(f"Failed to download image: {e}")
-                    request.text = caption
-            
-            if not request.text or not request.text.strip():
-                if request.action == "message":
-                    bus.send_to_frontend(AgentResponse(
-                        frontend_type=request.frontend_type,
-                        chat_id=request.chat_id,
-                        type="final_response",
-                        text="Please provide a message."
-                    ))
-                    continue
+def process_request(bus: MessageBus, pipeline_engine: PipelineEngine, histories: ChatHistories, request: AgentRequest) -> None:
+    """Blocking wrapper of `process_request_async` for the thread-based ChatScheduler.
+
+    The request still runs on the engine's event loop; the calling worker
+    thread only waits for it.
+    """
+    pipeline_engine.submit(process_request_async(bus, pipeline_engine, histories, request)).result()
 
-            # Add User message to Conversational History
-            if request.action == "message":
-                history_manager.add_dialog_record("user", request.text, image_hashes=request.image_hashes)
+async def process_request_async(bus: MessageBus, pipeline_engine: PipelineEngine, histories: ChatHistories, request: AgentRequest) -> None:
+    """
+    Runs a single AgentRequest through the PipelineEngine on the history of
+    its chat and sends the status updates and the final response back to the
+    originating frontend. Each request is recorded as one trace; its token
+    usage (including the post-pipeline jobs) is accounted under one request id.
+    """
+    request_id = os.urandom(8).hex()
+    with tracer.start_trace("request", chat_id=str(request.chat_id), frontend=request.frontend_type, action=request.action, request_id=request_id), \
+            usage_tracker.scope(chat_id=str(request.chat_id), request_id=request_id):
+        history_manager = await pipeline_engine.run_blocking(histories.get, request.chat_id)
+        await _process_request(bus, pipeline_engine, history_manager, request, request_id)
 
-            # Create initial payload for the pipeline
-            initial_payload = {
-                "input_message": {
-                    "text": request.text,
-                    "image_hashes": request.image_hashes,
-                },
-            }
-            
-            # Execute based on action
-            answer = "Unknown action."
-            images = []
-            try:
-                pipeline_result = None
-                if request.action == "message":
-                    pipeline_result = pipeline_engine.run_pipeline(initial_payload, history_manager=history_manager, send_status=send_status)
-                
-                # Extract text and images from pipeline result
-                if isinstance(pipeline_result, dict):
-                    answer = pipeline_result.get("text", "Processing error.")
-                    images = pipeline_result.get("images", [])
-                elif pipeline_result is not None:
-                    answer = str(pipeline_result)
-                
-                # Update dialogue history with final answer and generated images
-                if request.action == "message":
-                    history_manager.add_dialog_record("model", answer, image_hashes=images)
-                history_manager.clear_task_history()
+async def _process_request(bus: MessageBus, pipeline_engine: PipelineEngine, history_manager: HistoryManager, request: AgentRequest, request_id: str) -> None:
+    # Helper function to inject into PipelineEngine for intermediate status updates
+    def send_status(msg: str) -> None:
+        bus.send_to_frontend(AgentResponse(
+            frontend_type=request.frontend_type,
+            chat_id=request.chat_id,
+            type="status_update",
+            text=msg
+        ))
 
-            except Exception as e:
-                # Log stack trace and send error response
-                traceback.print_exc()
-                answer = f"Error processing request: {str(e)}"
+    # Streams the growing final answer; frontends edit a single message in place
+    def send_partial(text: str) -> None:
+        bus.send_to_frontend(AgentResponse(
+            frontend_type=request.frontend_type,
+            chat_id=request.chat_id,
+            type="partial_response",
+            text=text
+        ))
 
-            # Send the final response with all images
+    # Process image if present in the text (sent by telegram plugin)
+    if request.text.startswith("[IMAGE_URL_ATTACHED]:"):
+        parts = request.text.split("\n", 1)
+        image_url = parts[0].replace("[IMAGE_URL_ATTACHED]:", "")
+        caption = parts[1] if len(parts) > 1 else ""
+        
+        try:
+            send_status("Downloading image attachment...")
+            if pipeline_engine.image_manager:
+                image_hash = await pipeline_engine.run_blocking(pipeline_engine.image_manager.save_image_from_url, image_url)
+                request.image_hashes.append(image_hash)
+            request.text = caption
+        except Exception as e:
+            send_status(f"Failed to download image: {e}")
+            request.text = caption
+    
+    if not request.text or not request.text.strip():
+        if request.action == "message":
             bus.send_to_frontend(AgentResponse(
                 frontend_type=request.frontend_type,
                 chat_id=request.chat_id,
                 type="final_response",
-                text=answer,
-                image_hashes=images
+                text="Please provide a message."
             ))
-            
-            # Post-pipeline background jobs
-            if request.action == "message":
-                def post_pipeline_jobs():
-                    try:
-                        # 1. Summary Check
-                        if len(history_manager.get_dialog_records()) >= 20:
-                            sum_payload = {"history": history_manager.get_dialog_records()}
-                            sum_out = pipeline_engine.summary.run(sum_payload, history_manager=history_manager)
-                            pipeline_engine.log_step("Summary", sum_payload, sum_out)
-                            
-                        # 2. Memory Creation
-                        mem_payload = {"history": history_manager.get_dialog_records()}
-                        m_out = pipeline_engine.memory_creation.run(mem_payload)
-                        if m_out and m_out.get("create_memory"):
-                            pipeline_engine.log_step("MemoryCreation", mem_payload, m_out)
-                    except Exception as e:
-                        traceback.print_exc()
-                import threading
-                threading.Thread(target=post_pipeline_jobs, daemon=True).start()
+            return
 
+    # Add User message to Conversational History
+    if request.action == "message":
+        await pipeline_engine.run_blocking(history_manager.add_dialog_record, "user", request.text, image_hashes=request.image_hashes)
+
+    # Create initial payload for the pipeline
+    initial_payload = {
+        "input_message": {
+            "text": request.text,
+            "image_hashes": request.image_hashes,
+        },
+    }
+    
+    # Execute based on action
+    answer = "Unknown action."
+    images = []
+    try:
+        pipeline_result = None
+        if request.action == "message":
+            pipeline_result = await pipeline_engine.run_pipeline_async(initial_payload, history_manager=history_manager, send_status=send_status, send_partial=send_partial)
+        elif request.action == "usage":
+            pipeline_result = usage_tracker.format_chat_report(str(request.chat_id))
+        
+        # Extract text and images from pipeline result
+        if isinstance(pipeline_result, dict):
+            answer = pipeline_result.get("text", "Processing error.")
+            images = pipeline_result.get("images", [])
+        elif pipeline_result is not None:
+            answer = str(pipeline_result)
+        
+        # Update dialogue history with final answer and generated images
+        if request.action == "message":
+            await pipeline_engine.run_blocking(history_manager.add_dialog_record, "model", answer, image_hashes=images)
+        history_manager.clear_task_history()
+
+    except Exception as e:
+        # Log stack trace and send error response
+        traceback.print_exc()
+        answer = f"Error processing request: {str(e)}"
+
+    # Send the final response with all images
+    bus.send_to_frontend(AgentResponse(
+        frontend_type=request.frontend_type,
+        chat_id=request.chat_id,
+        type="final_response",
+        text=answer,
+        image_hashes=images
+    ))
+    _log_request_stats(bus, pipeline_engine, request, request_id)
+    
+    # Post-pipeline background jobs
+    if request.action == "message":
+        async def post_pipeline_jobs():
+            with tracer.start_trace("post_pipeline_jobs", chat_id=str(request.chat_id), request_id=request_id), \
+                    usage_tracker.scope(chat_id=str(request.chat_id), request_id=request_id):
+                try:
+                    # 1. Summary Check
+                    if len(history_manager.get_dialog_records()) >= 20:
+                        sum_payload = {"history": history_manager.get_dialog_records()}
+                        sum_out = await pipeline_engine.summary.run_async(sum_payload, history_manager=history_manager)
+                        pipeline_engine.log_step("Summary", sum_payload, sum_out)
+                    
+                    # 2. Memory Creation
+                    mem_payload = {"history": history_manager.get_dialog_records()}
+                    m_out = await pipeline_engine.memory_creation.run_async(mem_payload)
+                    if m_out and m_out.get("create_memory"):
+                        pipeline_engine.log_step("MemoryCreation", mem_payload, m_out)
+                except Exception as e:
+                    traceback.print_exc()
+        job = asyncio.ensure_future(post_pipeline_jobs())
+        _background_jobs.add(job)
+        job.add_done_callback(_background_jobs.discard)
+
+def _log_request_stats(bus: MessageBus, pipeline_engine: PipelineEngine, request: AgentRequest, request_id: str) -> None:
+    """Write the per-request statistics as one entry of the ``stats`` log stream."""
+    entry = {
+        "chat_id": str(request.chat_id),
+        "request_id": request_id,
+        "rate_limiter_stats": rate_limiter.get_stats(),
+        "verifier_stats": pipeline_engine.verifier.get_stats(),
+        "json_output_stats": pipeline_engine.get_json_output_stats(),
+        "usage": usage_tracker.get_request(request_id),
+    }
+    if pipeline_engine.step_mode == "fused":
+        entry["step_review_stats"] = pipeline_engine.step_review.get_stats()
+    if pipeline_engine.providers_manager.response_cache:
+        entry["response_cache_stats"] = pipeline_engine.providers_manager.response_cache.get_stats()
+    if pipeline_engine.mcp_connector:
+        entry["tool_cache_stats"] = pipeline_engine.mcp_connector.get_cache_stats()
+    if pipeline_engine.route_classifier:
+        entry["route_classifier_stats"] = pipeline_engine.route_classifier.get_stats()
+    if bus.scheduler:
+        entry["scheduler_stats"] = bus.scheduler.get_stats().get(str(request.chat_id))
+    payload_logger.log("stats", entry)
+
+def backend_worker_loop(bus: MessageBus, pipeline_engine: PipelineEngine, histories: ChatHistories, workers: int = 1) -> None:
+    """
+    Background thread that continually reads from frontend_to_backend queue
+    and hands requests to a ChatScheduler running `workers` pipelines.
+    With ``pipeline.async_engine`` active an AsyncChatScheduler runs them as
+    coroutines on the engine's event loop instead, up to
+    ``max_concurrent_requests`` at once.
+    
+    Requests of one chat keep their order; different chats run in parallel,
+    each on its own history from *histories*.
+    """
+    async_config = pipeline_engine.config.get("pipeline", {}).get("async_engine", {})
+    if async_config.get("active", False):
+        scheduler = AsyncChatScheduler(
+            handler=lambda request: process_request_async(bus, pipeline_engine, histories, request),
+            submit=pipeline_engine.submit,
+            max_concurrent=int(async_config.get("max_concurrent_requests", 100)),
+        )
+    else:
+        scheduler = ChatScheduler(
+            handler=lambda request: process_request(bus, pipeline_engine, histories, request),
+            workers=workers,
+        )
+    bus.scheduler = scheduler
+    while True:
+        try:
+            request: AgentRequest = bus.frontend_to_backend.get()
+            scheduler.submit(request)
         except Exception as queue_err:
             print(f"Critical error in backend worker loop: {queue_err}")
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+import time
+import traceback
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+from imports.messaging.message_models import AgentRequest
+from imports.payload_logger import payload_logger
+
+STATS_TTL = 3600  # seconds an idle chat's wait time stats are kept
+
+
+class _ChatQueues:
+    """Per-chat queues and wait time statistics shared by both schedulers.
+
+    ``_pending`` holds the queued requests of each chat and ``_in_flight`` the
+    chats with a request being processed; both are guarded by ``_lock``.
+    Statistics of chats idle for longer than *stats_ttl* seconds are dropped.
+    """
+
+    def __init__(self, stats_ttl: float = STATS_TTL) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[str, deque[tuple[float, AgentRequest]]] = {}  # chat_id -> (enqueued_at, request)
+        self._in_flight: set[str] = set()                                  # chats currently being processed
+        self._stats: OrderedDict[str, dict] = OrderedDict()                # chat_id -> wait time stats, least recently active first
+        self._stats_ttl = stats_ttl
+
+    def get_stats(self) -> dict[str, dict]:
+        """Return queue depth and wait time statistics per chat.
+
+        Returns:
+            dict: chat_id -> {"queue_depth", "in_flight", "processed",
+                              "last_wait", "avg_wait", "max_wait"} (seconds)
+        """
+        with self._lock:
+            self._prune_stats(time.monotonic())
+            chat_ids = set(self._stats) | set(self._pending)
+            report = {}
+            for chat_id in chat_ids:
+                stats = self._stats.get(chat_id) or _empty_stats()
+                processed = stats["processed"]
+                report[chat_id] = {
+                    "queue_depth": len(self._pending.get(chat_id, ())),
+                    "in_flight": chat_id in self._in_flight,
+                    "processed": processed,
+                    "last_wait": stats["last_wait"],
+                    "avg_wait": stats["total_wait"] / processed if processed else 0.0,
+                    "max_wait": stats["max_wait"],
+                }
+            return report
+
+    def _take(self, chat_id: str) -> AgentRequest:
+        """Pop the chat's oldest request and mark the chat in flight. Caller holds ``_lock``."""
+        queue = self._pending[chat_id]
+        enqueued_at, request = queue.popleft()
+        self._in_flight.add(chat_id)
+
+        now = time.monotonic()
+        wait = now - enqueued_at
+        stats = self._stats.setdefault(chat_id, _empty_stats())
+        self._stats.move_to_end(chat_id)
+        stats["last_active"] = now
+        stats["processed"] += 1
+        stats["total_wait"] += wait
+        stats["last_wait"] = wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        self._prune_stats(now)
+        if payload_logger.debug:
+            print(f"[DEBUG] chat {chat_id}: waited {wait:.2f}s, {len(queue)} more queued")
+        return request
+
+    def _prune_stats(self, now: float) -> None:
+        """Drop the statistics of chats idle for longer than the TTL. Caller holds ``_lock``."""
+        while self._stats:
+            chat_id, stats = next(iter(self._stats.items()))
+            if now - stats["last_active"] < self._stats_ttl:
+                break
+            if chat_id in self._pending or chat_id in self._in_flight:
+                # Still busy: keep it and look again after another TTL
+                stats["last_active"] = now
+                self._stats.move_to_end(chat_id)
+            else:
+                del self._stats[chat_id]
+
+
+def _empty_stats() -> dict:
+    return {"processed": 0, "total_wait": 0.0, "last_wait": 0.0, "max_wait": 0.0, "last_active": 0.0}
+
+
+class ChatScheduler(_ChatQueues):
+    """Runs AgentRequests on a pool of pipeline workers.
+
+    Requests of the same ``chat_id`` are processed strictly in arrival order
+    (at most one in flight per chat), while different chats run in parallel.
+    Chats are served round-robin: after a worker finishes one request the chat
+    goes to the back of the ready queue, so a chat with a long backlog cannot
+    starve the others.
+
+    The backend's handler runs the pipeline on the engine's event loop and
+    waits for it, so a worker thread only blocks on that result: ``workers``
+    caps how many requests are in flight, not how many threads do the work.
+    """
+
+    def __init__(self, handler: Callable[[AgentRequest], None], workers: int = 1) -> None:
+        super().__init__()
+        self._handler = handler
+        self._ready = threading.Condition(self._lock)
+        self._ready_chats: deque[str] = deque()                            # chats waiting for a worker
+
+        self._workers: list[threading.Thread] = []
+        for i in range(max(1, workers)):
+            worker = threading.Thread(target=self._worker_loop, name=f"pipeline-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, request: AgentRequest) -> None:
+        """Queue a request behind any earlier requests of the same chat."""
+        chat_id = str(request.chat_id)
+        with self._lock:
+            self._pending.setdefault(chat_id, deque()).append((time.monotonic(), request))
+            if chat_id not in self._in_flight and chat_id not in self._ready_chats:
+                self._ready_chats.append(chat_id)
+                self._ready.notify()
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _next_request(self) -> tuple[str, AgentRequest]:
+        """Block until a chat is ready, then take its oldest request."""
+        with self._lock:
+            while not self._ready_chats:
+                self._ready.wait()
+            chat_id = self._ready_chats.popleft()
+            return chat_id, self._take(chat_id)
+
+    def _release(self, chat_id: str) -> None:
+        """Mark the chat idle and requeue it at the back if it has more work."""
+        with self._lock:
+            self._in_flight.discard(chat_id)
+            if self._pending.get(chat_id):
+                self._ready_chats.append(chat_id)
+                self._ready.notify()
+            else:
+                self._pending.pop(chat_id, None)
+
+    def _worker_loop(self) -> None:
+        while True:
+            chat_id, request = self._next_request()
+            try:
+                self._handler(request)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._release(chat_id)
+
+
+class AsyncChatScheduler(_ChatQueues):
+    """ChatScheduler for coroutine handlers on an event loop.
+
+    Same guarantees as ChatScheduler (per-chat arrival order, one request in
+    flight per chat) without a thread per worker: each chat with queued work
+    is one task, and at most ``max_concurrent`` requests run at once. Chats
+    take turns for the free slots, one request at a time.
+    """
+
+    def __init__(self, handler: Callable[[AgentRequest], Awaitable[None]], submit: Callable[[Awaitable], concurrent.futures.Future], max_concurrent: int = 100) -> None:
+        super().__init__()
+        self._handler = handler
+        self._submit = submit           # schedules a coroutine on the event loop, e.g. PipelineEngine.submit
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._active_chats: set[str] = set()                               # chats with a running task
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, request: AgentRequest) -> None:
+        """Queue a request behind any earlier requests of the same chat. Callable from any thread."""
+        chat_id = str(request.chat_id)
+        with self._lock:
+            self._pending.setdefault(chat_id, deque()).append((time.monotonic(), request))
+            if chat_id in self._active_chats:
+                return
+            self._active_chats.add(chat_id)
+        self._submit(self._run_chat(chat_id))
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    async def _run_chat(self, chat_id: str) -> None:
+        """Process the chat's queue in order, taking a free slot for every request."""
+        while True:
+            async with self._slots:
+                request = self._next_request(chat_id)
+                if request is None:
+                    return
+                try:
+                    await self._handler(request)
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    with self._lock:
+                        self._in_flight.discard(chat_id)
+
+    def _next_request(self, chat_id: str) -> AgentRequest | None:
+        """Take the chat's oldest request, or retire the chat's task when its queue is empty."""
+        with self._lock:
+            queue = self._pending.get(chat_id)
+            if not queue:
+                self._pending.pop(chat_id, None)
+                self._active_chats.discard(chat_id)
+                return None
+            return self._take(chat_id)
@@ -15,6 +15,6 @@ class AgentResponse:
     """Message sent from the backend to a specific frontend chat."""
     frontend_type: str   # e.g., "console", "telegram"
     chat_id: str         # The unique dialog ID
-    type: str            # e.g., "final_response", "status_update", "error"
-    text: str            # The text content to display
+    type: str            # e.g., "final_response", "partial_response", "status_update", "error"
+    text: str            # The text content to display (for "partial_response": the full text generated so far)
     image_hashes: list[str] = field(default_factory=list)  # List of generated image hashes
@@ -1,6 +1,7 @@
 import queue
 from typing import Callable
 from imports.messaging.message_models import AgentRequest, AgentResponse
+from imports.messaging.chat_scheduler import AsyncChatScheduler, ChatScheduler
 
 class MessageBus:
     """Manages the asynchronous queues between frontends and the backend."""
@@ -11,6 +12,9 @@ class MessageBus:
         # Registry of callback functions to handle frontend routing
         # mapping frontend_type -> callback(AgentResponse)
         self._frontend_listeners: dict[str, Callable[[AgentResponse], None]] = {}
+        
+        # Set by the backend worker loop; exposes per-chat queue statistics
+        self.scheduler: ChatScheduler | AsyncChatScheduler | None = None
 
     def send_to_backend(self, request: AgentRequest) -> None:
         """Called by a frontend when user sends input."""
@@ -0,0 +1,249 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Iterator
+from imports.history_manager import HistoryRecord
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+DEFAULT_STREAMS = {
+    "role_payload": {"path": "logs/role_payload.json", "sample_rate": 1.0},
+    "provider_payload": {"path": "logs/payloads_log.json", "sample_rate": 1.0},
+    "usage": {"path": "logs/usage.json", "sample_rate": 1.0},
+    "stats": {"path": "logs/stats.json", "sample_rate": 1.0},
+}
+
+
+class LogEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, HistoryRecord):
+            return o.to_dict()
+        return super().default(o)
+
+
+class PayloadLogger:
+    """Structured JSON-lines logger with a background writer thread.
+
+    ``log()`` only samples, redacts and serializes the entry, then puts it on a
+    bounded queue (entries are dropped and counted when the queue is full).
+    The writer thread flushes entries in batches, rotates files once they
+    exceed ``max_bytes`` and optionally compresses rotated files with gzip or
+    zstd (``zstandard`` package).
+
+    Redaction modes:
+        "off"     — entries are written as-is
+        "content" — strings longer than ``redact_min_chars`` are replaced by
+                    their length and a short SHA-256 prefix
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"written": 0, "dropped": 0, "sampled_out": 0, "rotations": 0}
+        self.configure({})
+
+    def configure(self, config: dict) -> None:
+        """Apply the ``logging`` section of config.json. Call before the first `log()`."""
+        self.queue_size = int(config.get("queue_size", 10000))
+        self.batch_size = int(config.get("batch_size", 200))
+        self.flush_interval = float(config.get("flush_interval", 1.0))
+        self.max_bytes = int(config.get("max_bytes", 20 * 1024 * 1024))
+        self.backups = int(config.get("backups", 5))
+        self.compression = config.get("compression", "gzip")
+        self.redaction = config.get("redaction", "off")
+        self.redact_min_chars = int(config.get("redact_min_chars", 24))
+        # Print per-call diagnostics (prompt sizes, packing, JSON repairs) to the console
+        self.debug = bool(config.get("debug", False))
+        self.streams = {name: dict(settings) for name, settings in DEFAULT_STREAMS.items()}
+        for name, settings in config.get("streams", {}).items():
+            self.streams.setdefault(name, {}).update(settings)
+
+        if self.compression == "zstd" and zstandard is None:
+            print("PayloadLogger: zstandard is not installed, falling back to gzip.")
+            self.compression = "gzip"
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def log(self, stream: str, entry: dict) -> None:
+        """Queue *entry* for the given stream without blocking on disk I/O."""
+        settings = self.streams.get(stream)
+        if not settings:
+            return
+        if random.random() >= float(settings.get("sample_rate", 1.0)):
+            self._count("sampled_out")
+            return
+
+        record = {"ts": time.time(), **entry}
+        if self.redaction == "content":
+            record = self._redact(record)
+        try:
+            line = json.dumps(record, ensure_ascii=False, cls=LogEncoder, default=str)
+        except (TypeError, ValueError) as e:
+            line = json.dumps({"ts": record["ts"], "log_error": str(e)})
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((stream, line))
+        except queue.Full:
+            self._count("dropped")
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until queued entries are written (best effort)."""
+        if not self._queue:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def get_stats(self) -> dict:
+        """Return written/dropped/sampled-out/rotation counters and the current queue size."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize() if self._queue else 0
+        return stats
+
+    def iter_entries(self, stream: str) -> Iterator[dict]:
+        """Yield entries of a stream, oldest rotated file first (compressed files included)."""
+        path = self.streams.get(stream, {}).get("path")
+        if not path:
+            return
+        candidates = []
+        for index in range(self.backups, 0, -1):
+            candidates += [f"{path}.{index}.zst", f"{path}.{index}.gz", f"{path}.{index}"]
+        candidates.append(path)
+        for candidate in candidates:
+            if not os.path.isfile(candidate):
+                continue
+            try:
+                for line in self._read_lines(candidate):
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+            except (IOError, OSError) as e:
+                print(f"PayloadLogger: failed to read {candidate}: {e}")
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _redact(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) <= self.redact_min_chars:
+                return value
+            digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:12]
+            return f"<redacted len={len(value)} sha256={digest}>"
+        if isinstance(value, HistoryRecord):
+            return self._redact(value.to_dict())
+        if isinstance(value, dict):
+            return {k: self._redact(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._redact(v) for v in value]
+        return value
+
+    def _ensure_started(self) -> None:
+        if self._thread:
+            return
+        with self._start_lock:
+            if self._thread:
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._writer_loop, name="payload-logger", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _writer_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"PayloadLogger: failed to write batch: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: list[tuple[str, str]]) -> None:
+        by_stream: dict[str, list[str]] = {}
+        for stream, line in batch:
+            by_stream.setdefault(stream, []).append(line)
+        for stream, lines in by_stream.items():
+            path = self.streams[stream]["path"]
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            self._count("written", len(lines))
+            if self.max_bytes and os.path.getsize(path) > self.max_bytes:
+                self._rotate(path)
+
+    def _rotated_name(self, path: str, index: int) -> str:
+        suffix = {"gzip": ".gz", "zstd": ".zst"}.get(self.compression, "")
+        return f"{path}.{index}{suffix}"
+
+    def _rotate(self, path: str) -> None:
+        """Shift path.N -> path.N+1 (dropping the oldest), then move path to path.1."""
+        oldest = self._rotated_name(path, self.backups)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.backups - 1, 0, -1):
+            source = self._rotated_name(path, index)
+            if os.path.exists(source):
+                os.replace(source, self._rotated_name(path, index + 1))
+
+        target = self._rotated_name(path, 1)
+        if self.compression == "gzip":
+            with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+                dst.writelines(src)
+            os.remove(path)
+        elif self.compression == "zstd":
+            with open(path, "rb") as src, open(target, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+            os.remove(path)
+        else:
+            os.replace(path, target)
+        self._count("rotations")
+
+    @staticmethod
+    def _read_lines(path: str) -> Iterator[str]:
+        if path.endswith(".gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                yield from f
+        elif path.endswith(".zst"):
+            if zstandard is None:
+                return
+            with open(path, "rb") as raw:
+                data = zstandard.ZstdDecompressor().stream_reader(raw).read()
+            yield from data.decode("utf-8").splitlines()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                yield from f
+
+
+# Process-wide logger shared by the pipeline and providers
+payload_logger = PayloadLogger()
@@ -14,17 +14,54 @@ if TOKEN:
     bot = telebot.TeleBot(TOKEN)
     bot.set_my_commands([
         telebot.types.BotCommand("init", "Initialize agent."),
+        telebot.types.BotCommand("usage", "Show token usage."),
     ])
 else:
     bot = None
 
+# Minimum delay between edits of a streamed message (Telegram rate-limits edits)
+STREAM_EDIT_INTERVAL = 1.0
+# chat_id -> {"message_id", "text", "edited_at"} of the message being streamed
+_stream_messages: dict[str, dict] = {}
+
+def _stream_partial(chat_id, text: str) -> None:
+    """Send the first chunk as a new message, then edit it in place as text grows."""
+    state = _stream_messages.get(chat_id)
+    if state is None:
+        message = bot.send_message(chat_id, text)
+        _stream_messages[chat_id] = {"message_id": message.message_id, "text": text, "edited_at": time.monotonic()}
+        return
+    if text == state["text"] or time.monotonic() - state["edited_at"] < STREAM_EDIT_INTERVAL:
+        return
+    try:
+        bot.edit_message_text(text, chat_id, state["message_id"])
+        state["text"] = text
+        state["edited_at"] = time.monotonic()
+    except Exception as e:
+        print(f"Failed to edit streamed message: {e}")
+
+def _send_final_text(chat_id, text: str) -> None:
+    """Finish a streamed message with the final text, or send a new message."""
+    state = _stream_messages.pop(chat_id, None)
+    if state:
+        if text == state["text"]:
+            return
+        try:
+            bot.edit_message_text(text, chat_id, state["message_id"])
+            return
+        except Exception as e:
+            print(f"Failed to finalize streamed message: {e}")
+    bot.send_message(chat_id, text)
+
 def telegram_response_handler(response: AgentResponse) -> None:
     if bot:
         if response.type == "status_update":
             bot.send_message(response.chat_id, f"<i>{response.text}</i>", parse_mode="HTML")
+        elif response.type == "partial_response":
+            _stream_partial(response.chat_id, response.text)
         else:
             # Send text response
-            bot.send_message(response.chat_id, response.text)
+            _send_final_text(response.chat_id, response.text)
             # Send all generated images
             if response.image_hashes:
                 from imports.image_manager import ImageManager
@@ -71,6 +108,18 @@ def bot_process(bus: MessageBus, secret_path: str):
             else:
                 print(f"User is not allowed. User id: {message.from_user.id}")
 
+        @bot.message_handler(commands=["usage"])
+        def show_usage(message):
+            if secret_keeper.check_user(message.from_user.id):
+                bus.send_to_backend(AgentRequest(
+                    frontend_type="telegram",
+                    chat_id=message.chat.id,
+                    action="usage",
+                    text=""
+                ))
+            else:
+                print(f"User is not allowed. User id: {message.from_user.id}")
+
         @bot.message_handler(content_types=['photo'])
         def handle_photo(message):
             if secret_keeper.check_user(message.from_user.id):
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Callable
+
+DEFAULT_MIN_CHARS = 4096
+DEFAULT_TTL_SECONDS = 600
+# Handles are refreshed this long before they expire, so in-flight requests never hit a deleted cache
+REFRESH_MARGIN_SECONDS = 30
+
+
+class PromptCacheManager:
+    """Provider-side caching of stable prompt prefixes.
+
+    Roles send their static content first (system prompt, then identity, tool
+    schemas and abilities) and `generate_response` reports how many leading
+    records form that prefix. Per provider (``prompt_cache`` in config.json):
+
+    - google-compatible: the prefix contents are registered once as a Gemini
+      ``cachedContents`` resource (``ttl_seconds``); requests then reference it
+      by name and only send the remaining contents. Prefixes shorter than
+      ``min_chars`` are sent inline, since Gemini rejects small caches.
+    - openai-compatible: local servers (llama.cpp, LM Studio) keep the KV cache
+      of a common prefix; ``cache_prompt: true`` is added to each request.
+    """
+
+    def __init__(self, providers: list[dict]) -> None:
+        self.configs = {p["name"]: p.get("prompt_cache", {}) for p in providers}
+        self._handles: dict[str, tuple[str, float]] = {}  # prefix key -> (cache name, refresh at)
+        self._rejected: dict[str, float] = {}             # prefix key -> time to try again
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "created": 0, "failed": 0, "inline": 0}
+
+    def apply(self, provider: str, structure: str, model_id: str, body: dict, prefix_count: int,
+              create: Callable[[dict], dict]) -> tuple[dict, str | None]:
+        """Return the request body to send and the cache name it references (None when sent inline).
+
+        *create* posts a ``cachedContents`` request body and returns the decoded response.
+        """
+        config = self.configs.get(provider, {})
+        if not config.get("active", False):
+            return body, None
+        if structure == "openai-compatible":
+            return dict(body, cache_prompt=True), None
+        if structure != "google-compatible" or prefix_count <= 0 or len(body["contents"]) <= prefix_count:
+            return body, None
+
+        prefix = body["contents"][:prefix_count]
+        serialized = json.dumps(prefix, ensure_ascii=False, sort_keys=True)
+        if len(serialized) < int(config.get("min_chars", DEFAULT_MIN_CHARS)):
+            self._count("inline")
+            return body, None
+
+        key = hashlib.sha256(f"{provider}\n{model_id}\n{serialized}".encode("utf-8")).hexdigest()
+        ttl = int(config.get("ttl_seconds", DEFAULT_TTL_SECONDS))
+        now = time.time()
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle and handle[1] > now:
+                self.stats["hits"] += 1
+                name = handle[0]
+            elif self._rejected.get(key, 0) > now or key in self._pending:
+                # Creation failed recently or is in progress on another thread
+                self.stats["inline"] += 1
+                return body, None
+            else:
+                self._pending.add(key)
+                name = None
+
+        if name is None:
+            try:
+                created = create({"model": f"models/{model_id}", "contents": prefix, "ttl": f"{ttl}s"})
+                name = created["name"]
+                with self._lock:
+                    self._handles[key] = (name, now + ttl - REFRESH_MARGIN_SECONDS)
+                    self.stats["created"] += 1
+                print(f"[DEBUG] PromptCache: registered {len(serialized)} chars of prefix for {provider}/{model_id} as {name}")
+            except Exception as e:
+                print(f"[DEBUG] PromptCache: unable to cache prefix for {provider}/{model_id}, sending it inline: {e}")
+                with self._lock:
+                    self._rejected[key] = now + ttl
+                    self.stats["failed"] += 1
+                return body, None
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        cached_body = {k: v for k, v in body.items() if k != "contents"}
+        cached_body["cachedContent"] = name
+        cached_body["contents"] = body["contents"][prefix_count:]
+        return cached_body, name
+
+    def invalidate(self, name: str) -> None:
+        """Forget a cache the provider no longer knows (expired or deleted)."""
+        with self._lock:
+            for key in [key for key, handle in self._handles.items() if handle[0] == name]:
+                del self._handles[key]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, handles=len(self._handles))
@@ -0,0 +1,123 @@
+import email.utils
+import json
+import random
+import re
+import threading
+import time
+from imports.http_transport import HTTPStatusError
+
+
+class ProviderUnavailableError(RuntimeError):
+    """The provider is throttled, failing or its circuit is open; the next fallback model may be tried."""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_delay(error: HTTPStatusError) -> float | None:
+    """Server-requested delay in seconds from ``Retry-After`` or Gemini's ``RetryInfo.retryDelay``."""
+    retry_after = error.headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                retry_date = email.utils.parsedate_to_datetime(retry_after)
+                return max(0.0, retry_date.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    try:
+        details = json.loads(error.body).get("error", {}).get("details", [])
+    except (json.JSONDecodeError, AttributeError):
+        return None
+    for detail in details:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        match = re.fullmatch(r"([\d.]+)s", str(delay or ""))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter; server-requested delays take precedence.
+
+    Delays longer than ``max_retry_after`` are not waited out when a fallback
+    model is available — the provider is reported unavailable instead.
+    """
+
+    RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, config: dict) -> None:
+        self.max_retries = int(config.get("max_retries", 4))
+        self.base_delay = float(config.get("base_delay", 1.0))
+        self.max_delay = float(config.get("max_delay", 30.0))
+        self.max_retry_after = float(config.get("max_retry_after", 20.0))
+
+    def is_retryable(self, code: int) -> bool:
+        return code in self.RETRYABLE_CODES or code >= 500
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, min(1.0, self.base_delay))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker.
+
+    After ``failure_threshold`` consecutive failed calls the circuit opens for
+    ``reset_timeout`` seconds and calls fail fast. Once the timeout passes, a
+    single trial call is let through (half-open); its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, name: str, config: dict) -> None:
+        self.name = name
+        self.failure_threshold = int(config.get("failure_threshold", 3))
+        self.reset_timeout = float(config.get("reset_timeout", 60.0))
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._open_until == 0.0:
+                return "closed"
+            return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def allow(self) -> bool:
+        """True if a call may be made now."""
+        with self._lock:
+            if self._open_until == 0.0:
+                return True
+            if time.monotonic() < self._open_until or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._open_until:
+                print(f"[DEBUG] Circuit for provider '{self.name}' closed.")
+            self._failures = 0
+            self._open_until = 0.0
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a call that neither proved nor disproved provider health (e.g. a rejected request)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, open_for: float | None = None) -> None:
+        """Count a failed call; *open_for* opens the circuit right away (e.g. for a long Retry-After)."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if open_for is not None or self._failures >= self.failure_threshold:
+                duration = self.reset_timeout if open_for is None else open_for
+                self._open_until = time.monotonic() + duration
+                print(f"[DEBUG] Circuit for provider '{self.name}' opened for {duration:.1f}s after {self._failures} failure(s).")
@@ -1,13 +1,21 @@
 from __future__ import annotations
+import asyncio
 import json
 import re
-import urllib.request
-import urllib.error
 import os
 import time
 from imports.history_manager import HistoryRecord
+from imports.response_cache import ResponseCache
+from imports.payload_logger import payload_logger
+from imports.http_transport import AsyncTransportResponse, HTTPStatusError, ThreadedAsyncTransport, TransportResponse, create_async_transport, create_transport
+from imports.traffic_archive import traffic_archive
+from imports.prompt_cache import PromptCacheManager
+from imports.provider_resilience import CircuitBreaker, ProviderUnavailableError, RetryPolicy, parse_retry_delay
+from imports.rate_limiter import rate_limiter
+from imports.tracing import tracer
+from imports.usage_tracker import usage_tracker
 from dataclasses import dataclass
-from typing import Callable
+from typing import AsyncIterator, Callable, Iterator
 
 
 @dataclass
@@ -16,16 +24,181 @@ class Model:
     model_id: str
     api_key_name: str | None
     vision_enabled: bool = False
+    fallbacks: list[Model] | None = None
     def __init__(self, provider: str, model_id: str, api_key_name: str | None,
-                 vision_enabled: bool = False):
+                 vision_enabled: bool = False, fallbacks: list[dict | Model] | None = None):
         self.provider = provider
         self.model_id = model_id
         self.api_key_name = api_key_name
         self.vision_enabled = vision_enabled
+        # Ordered models tried when this one's provider is throttled or failing
+        self.fallbacks = [f if isinstance(f, Model) else Model(**f) for f in fallbacks or []]
+
+# Generation parameters a provider accepts unless its `capabilities` say otherwise
+DEFAULT_CAPABILITIES = {
+    "max_output_tokens": True,
+    "temperature": True,
+    "stop": True,
+    "json_mode": True,
+    "json_schema": False,
+    "thinking": False,
+    "reasoning_effort": False,
+    "stream_usage": False,
+}
+MAX_STOP_SEQUENCES = {"google-compatible": 5, "openai-compatible": 4}
+
+class ThinkFilter:
+    """Incrementally removes ``<think>...</think>`` blocks from streamed text.
+    
+    Tags may be split across chunks, so a possible partial tag at the end of
+    a chunk is held back until the next chunk arrives.
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._in_think = False
+
+    @staticmethod
+    def _partial_tag_len(text: str, tag: str) -> int:
+        """Length of the longest suffix of *text* that is a prefix of *tag*."""
+        for size in range(min(len(text), len(tag) - 1), 0, -1):
+            if tag.startswith(text[-size:]):
+                return size
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        output = ""
+        while self._buffer:
+            if self._in_think:
+                end = self._buffer.find(self.CLOSE_TAG)
+                if end == -1:
+                    keep = self._partial_tag_len(self._buffer, self.CLOSE_TAG)
+                    self._buffer = self._buffer[len(self._buffer) - keep:] if keep else ""
+                    break
+                self._buffer = self._buffer[end + len(self.CLOSE_TAG):]
+                self._in_think = False
+            else:
+                start = self._buffer.find(self.OPEN_TAG)
+                if start == -1:
+                    keep = self._partial_tag_len(self._buffer, self.OPEN_TAG)
+                    output += self._buffer[:len(self._buffer) - keep]
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                output += self._buffer[:start]
+                self._buffer = self._buffer[start + len(self.OPEN_TAG):]
+                self._in_think = True
+        return output
+
+    def flush(self) -> str:
+        """Return any held-back text once the stream has ended."""
+        remaining = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return remaining
 
 class ProvidersManager:
-    def __init__(self, providers: list[dict]):
+    def __init__(self, providers: list[dict], response_cache: ResponseCache | None = None):
         self.providers_dict = {p["name"]: p for p in providers}
+        self.response_cache = response_cache
+        # One pooled keep-alive transport per provider, shared by all threads
+        # (wrapped for recording or replay when `traffic.mode` is set)
+        self.transports = {p["name"]: traffic_archive.wrap(p["name"], create_transport(p.get("transport", {}))) for p in providers}
+        # Async transports for `generation_request_async`; recording and replay stay on the blocking ones
+        self.async_transports = {
+            p["name"]: create_async_transport(p.get("transport", {}), self.transports[p["name"]]) if traffic_archive.mode == "off" else ThreadedAsyncTransport(self.transports[p["name"]])
+            for p in providers
+        }
+        self.retry_policies = {p["name"]: RetryPolicy(p.get("retry", {})) for p in providers}
+        self.circuit_breakers = {p["name"]: CircuitBreaker(p["name"], p.get("circuit_breaker", {})) for p in providers}
+        self.prompt_cache = PromptCacheManager(providers)
+        rate_limiter.configure(providers)
+
+    def get_capabilities(self, provider: str, model_id: str) -> dict:
+        """Generation capabilities of a provider's model: defaults, provider `capabilities`, then its `models` entry."""
+        config = self.providers_dict[provider].get("capabilities", {})
+        capabilities = dict(DEFAULT_CAPABILITIES)
+        capabilities.update({key: value for key, value in config.items() if key != "models"})
+        capabilities.update(config.get("models", {}).get(model_id, {}))
+        return capabilities
+
+    @staticmethod
+    def _to_gemini_schema(schema: dict) -> dict | None:
+        """Convert a role JSON schema into a Gemini ``responseSchema``.
+
+        Returns None when the schema has a free-form object (no properties),
+        which Gemini cannot express; such roles get plain JSON mode instead.
+        """
+        converted = {"type": schema["type"].upper()}
+        if "enum" in schema:
+            converted["enum"] = list(schema["enum"])
+        if schema["type"] == "object":
+            if not schema.get("properties"):
+                return None
+            properties = {}
+            for key, subschema in schema["properties"].items():
+                properties[key] = ProvidersManager._to_gemini_schema(subschema)
+                if properties[key] is None:
+                    return None
+            converted["properties"] = properties
+            # Keep the declared field order (streamed fields like final_user_message rely on it)
+            converted["propertyOrdering"] = list(properties)
+            if schema.get("required"):
+                converted["required"] = list(schema["required"])
+        elif schema["type"] == "array" and "items" in schema:
+            converted["items"] = ProvidersManager._to_gemini_schema(schema["items"])
+            if converted["items"] is None:
+                return None
+        return converted
+
+    @staticmethod
+    def _render_google_generation_config(generation: dict, capabilities: dict) -> dict:
+        """Translate role generation settings into a Gemini ``generationConfig``."""
+        config = {}
+        if generation.get("max_output_tokens") and capabilities["max_output_tokens"]:
+            config["maxOutputTokens"] = int(generation["max_output_tokens"])
+        if generation.get("temperature") is not None and capabilities["temperature"]:
+            config["temperature"] = float(generation["temperature"])
+        if generation.get("stop") and capabilities["stop"]:
+            config["stopSequences"] = list(generation["stop"])[:MAX_STOP_SEQUENCES["google-compatible"]]
+        schema = None
+        if generation.get("response_schema") and capabilities["json_schema"]:
+            schema = ProvidersManager._to_gemini_schema(generation["response_schema"])
+        if generation.get("json") and (schema or capabilities["json_mode"]):
+            config["responseMimeType"] = "application/json"
+            if schema:
+                config["responseSchema"] = schema
+        if generation.get("thinking_budget") is not None and capabilities["thinking"]:
+            config["thinkingConfig"] = {"thinkingBudget": int(generation["thinking_budget"])}
+        return config
+
+    @staticmethod
+    def _render_openai_generation_params(generation: dict, capabilities: dict) -> dict:
+        """Translate role generation settings into openai-compatible request fields."""
+        params = {}
+        if generation.get("max_output_tokens") and capabilities["max_output_tokens"]:
+            params["max_tokens"] = int(generation["max_output_tokens"])
+        if generation.get("temperature") is not None and capabilities["temperature"]:
+            params["temperature"] = float(generation["temperature"])
+        if generation.get("stop") and capabilities["stop"]:
+            params["stop"] = list(generation["stop"])[:MAX_STOP_SEQUENCES["openai-compatible"]]
+        if generation.get("json") and generation.get("response_schema") and capabilities["json_schema"]:
+            params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": generation.get("schema_name", "response"), "schema": generation["response_schema"]},
+            }
+        elif generation.get("json") and capabilities["json_mode"]:
+            params["response_format"] = {"type": "json_object"}
+        if capabilities["reasoning_effort"]:
+            effort = generation.get("reasoning_effort")
+            budget = generation.get("thinking_budget")
+            if not effort and budget is not None and budget >= 0:
+                # No token budgets here: map the budget onto the effort levels
+                effort = "low" if budget <= 2048 else "medium" if budget <= 8192 else "high"
+            if effort:
+                params["reasoning_effort"] = effort
+        return params
 
     def _render_google_compatible_payload(
         self,
@@ -103,11 +276,21 @@ class ProvidersManager:
         payload: list[HistoryRecord],
         encode_images: bool = True,
         image_resolver: Callable[[str], str | None] | None = None,
+        generation: dict | None = None,
+        capabilities: dict | None = None,
     ) -> dict:
+        generation = generation or {}
+        capabilities = capabilities or DEFAULT_CAPABILITIES
         if structure == "google-compatible":
-            return self._render_google_compatible_payload(payload, encode_images, image_resolver)
+            rendered = self._render_google_compatible_payload(payload, encode_images, image_resolver)
+            generation_config = self._render_google_generation_config(generation, capabilities)
+            if generation_config:
+                rendered["generationConfig"] = generation_config
+            return rendered
         elif structure == "openai-compatible":
-            return self._render_openai_compatible_payload(model_id, payload, encode_images, image_resolver)
+            rendered = self._render_openai_compatible_payload(model_id, payload, encode_images, image_resolver)
+            rendered.update(self._render_openai_generation_params(generation, capabilities))
+            return rendered
         else:
             raise ValueError(f"Unknown structure: {structure}")
 
@@ -119,28 +302,181 @@ class ProvidersManager:
             return api_key
         return None
 
-    def _execute_request_with_retries(self, req: urllib.request.Request) -> dict:
-        max_retries = 5
-        for _ in range(max_retries):
+    @staticmethod
+    def _estimate_tokens(payload: list[HistoryRecord], encode_images: bool) -> int:
+        """Rough prompt size for the TPM limit: ~4 characters per token, fixed cost per image."""
+        chars = sum(len(record.message) for record in payload)
+        images = sum(len(record.image_hashes) for record in payload) if encode_images else 0
+        return chars // 4 + images * 258 + 1
+
+    def _open_with_retries(self, provider: str, url: str, body: bytes, headers: dict, can_fail_over: bool = False) -> TransportResponse:
+        """POST *body* to *url*, retrying throttled and failed requests. Caller must close the response.
+        
+        Raises ProviderUnavailableError once retries are exhausted, or right away
+        when the server asks to wait longer than ``max_retry_after`` and
+        *can_fail_over* is set.
+        """
+        transport = self.transports[provider]
+        policy = self.retry_policies[provider]
+        last_error = ""
+        for attempt in range(policy.max_retries + 1):
+            try:
+                return transport.request("POST", url, body=body, headers=headers)
+            except (HTTPStatusError, ConnectionError, TimeoutError, OSError) as e:
+                last_error, retry_after = self._classify_failure(provider, policy, e, can_fail_over)
+            if attempt == policy.max_retries:
+                break
+            time.sleep(self._retry_delay(provider, policy, attempt, last_error, retry_after))
+        raise ProviderUnavailableError(f"Provider '{provider}' failed after {policy.max_retries} retries ({last_error}).")
+
+    async def _open_with_retries_async(self, provider: str, url: str, body: bytes, headers: dict, can_fail_over: bool = False) -> AsyncTransportResponse:
+        """`_open_with_retries` on the provider's async transport, backing off with ``asyncio.sleep``."""
+        transport = self.async_transports[provider]
+        policy = self.retry_policies[provider]
+        last_error = ""
+        for attempt in range(policy.max_retries + 1):
             try:
-                with urllib.request.urlopen(req) as response:
-                    return json.loads(response.read().decode('utf-8'))
-            except urllib.error.HTTPError as e:
-                if e.code == 429:
-                    time.sleep(30)
-                    continue
-                elif e.code >= 500:
-                    time.sleep(5)
-                    continue
-                elif e.code == 400:
-                    error_body = e.read().decode('utf-8')
-                    raise RuntimeError(
-                        f"Request rejected (HTTP 400). The model may not support this input format. "
-                        f"Details: {error_body}"
-                    ) from e
-                else:
-                    raise RuntimeError(f"Request failed with HTTP {e.code}: {e.read().decode('utf-8')}") from e
-        raise RuntimeError(f"Request failed after {max_retries} retries.")
+                return await transport.request("POST", url, body=body, headers=headers)
+            except (HTTPStatusError, ConnectionError, TimeoutError, OSError) as e:
+                last_error, retry_after = self._classify_failure(provider, policy, e, can_fail_over)
+            if attempt == policy.max_retries:
+                break
+            await asyncio.sleep(self._retry_delay(provider, policy, attempt, last_error, retry_after))
+        raise ProviderUnavailableError(f"Provider '{provider}' failed after {policy.max_retries} retries ({last_error}).")
+
+    @staticmethod
+    def _classify_failure(provider: str, policy: RetryPolicy, error: Exception, can_fail_over: bool) -> tuple[str, float | None]:
+        """Raise for a failed attempt that must not be retried, else return (description, server retry delay)."""
+        if not isinstance(error, HTTPStatusError):
+            return str(error) or type(error).__name__, None
+        if error.code == 400:
+            raise RuntimeError(
+                f"Request rejected (HTTP 400). The model may not support this input format. "
+                f"Details: {error.body}"
+            ) from error
+        if not policy.is_retryable(error.code):
+            raise RuntimeError(f"Request failed with HTTP {error.code}: {error.body}") from error
+        retry_after = parse_retry_delay(error)
+        if retry_after is not None and retry_after > policy.max_retry_after and can_fail_over:
+            raise ProviderUnavailableError(f"Provider '{provider}' asked to retry after {retry_after:.0f}s.", retry_after) from error
+        return f"HTTP {error.code}", retry_after
+
+    @staticmethod
+    def _retry_delay(provider: str, policy: RetryPolicy, attempt: int, last_error: str, retry_after: float | None) -> float:
+        delay = policy.backoff(attempt, retry_after)
+        tracer.current_span().add_to_attribute("retries", 1)
+        print(f"[DEBUG] Provider '{provider}' request failed ({last_error}), retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _create_cached_content(self, provider: str, endpoint: str, request: dict, headers: dict) -> dict:
+        """POST a Gemini ``cachedContents`` resource next to the provider's ``models/`` endpoint."""
+        base_url = endpoint.rstrip("/")
+        if base_url.endswith("/models"):
+            base_url = base_url[:-len("/models")]
+        body = json.dumps(request, ensure_ascii=False).encode('utf-8')
+        return self._execute_request_with_retries(provider, f"{base_url}/cachedContents", body, headers)
+
+    def _execute_request_with_retries(self, provider: str, url: str, body: bytes, headers: dict, can_fail_over: bool = False) -> dict:
+        with self._open_with_retries(provider, url, body, headers, can_fail_over) as response:
+            raw = response.read()
+        tracer.current_span().set_attribute("bytes_received", len(raw))
+        return json.loads(raw.decode('utf-8'))
+
+    @staticmethod
+    def _decode_sse_line(raw_line: bytes) -> dict | None:
+        """Decode one Server-Sent Events line; None for anything but a JSON ``data:`` event."""
+        line = raw_line.decode('utf-8').strip()
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            print(f"[DEBUG] Skipping malformed stream event: {data[:200]}")
+            return None
+
+    @staticmethod
+    def _iter_sse_events(response) -> Iterator[dict]:
+        """Yield decoded JSON objects from a Server-Sent Events response body."""
+        for raw_line in response:
+            event = ProvidersManager._decode_sse_line(raw_line)
+            if event is not None:
+                yield event
+
+    @staticmethod
+    def _extract_stream_text(structure: str, event: dict) -> str:
+        """Return the text delta carried by a single streaming event."""
+        if structure == "google-compatible":
+            candidates = event.get("candidates") or [{}]
+            parts = candidates[0].get("content", {}).get("parts", [])
+            return "".join(part.get("text", "") for part in parts if not part.get("thought"))
+        choices = event.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
+
+    def _record_usage(self, model: Model, usage: dict | None, estimated_tokens: int) -> dict:
+        """Account the provider-reported *usage* of a call and settle its rate limiter estimate."""
+        if not usage:
+            return {}
+        usage_tracker.record(model.provider, model.model_id, usage)
+        rate_limiter.settle(model.provider, model.model_id, estimated_tokens, usage["total_tokens"])
+        return {"prompt_tokens": usage["prompt_tokens"], "cached_tokens": usage["cached_tokens"], "output_tokens": usage["output_tokens"]}
+
+    def _stream_response(self, structure: str, response: TransportResponse, model: Model, estimated_tokens: int) -> Iterator[str]:
+        state = _StreamState(structure)
+        try:
+            with response:
+                for event in self._iter_sse_events(response):
+                    text = state.feed(event)
+                    if text:
+                        yield text
+            tail = state.finish()
+            if tail:
+                yield tail
+        finally:
+            tokens = self._record_usage(model, state.usage, estimated_tokens)
+            tracer.record_span("provider_stream", "provider", state.started_ns, chars_received=state.chars, **tokens)
+
+    async def _stream_response_async(self, structure: str, response: AsyncTransportResponse, model: Model, estimated_tokens: int) -> AsyncIterator[str]:
+        state = _StreamState(structure)
+        try:
+            async with response:
+                async for raw_line in response:
+                    event = self._decode_sse_line(raw_line)
+                    text = state.feed(event) if event is not None else ""
+                    if text:
+                        yield text
+            tail = state.finish()
+            if tail:
+                yield tail
+        finally:
+            tokens = self._record_usage(model, state.usage, estimated_tokens)
+            tracer.record_span("provider_stream", "provider", state.started_ns, chars_received=state.chars, **tokens)
+
+    def _cache_stream(self, request: dict, deltas: Iterator[str]) -> Iterator[str]:
+        """Pass stream deltas through and cache the full text once the stream completes."""
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self._store_response(request, "".join(parts).strip())
+
+    async def _cache_stream_async(self, request: dict, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self._store_response(request, "".join(parts).strip())
+
+    def _store_response(self, request: dict, text: str) -> None:
+        """Cache a fresh response unless it is empty or the request's *accept* check rejects it."""
+        if not text:
+            return
+        if request["accept"] and not request["accept"](text):
+            print("[DEBUG] Response cache: not storing a response that failed validation")
+            return
+        self.response_cache.put(request["cache_key"], text)
 
     def generation_request(
         self,
@@ -148,17 +484,231 @@ class ProvidersManager:
         payload: list[HistoryRecord],
         encode_images: bool = True,
         image_resolver: Callable[[str], str | None] | None = None,
-    ) -> str:
-        if model.provider not in self.providers_dict:
-            raise ValueError(f"Provider '{model.provider}' not found.")
-        
-        with open("logs/payloads_log.json", "a") as f:
-            payload_list = []
-            for record in payload:
-                payload_list.append({"role": record.role, "message": record.message, "image_hashes": record.image_hashes})
-            json.dump(payload_list, f, indent=4, ensure_ascii=False)
-            f.write(",\n")
-            
+        stream: bool = False,
+        use_cache: bool = False,
+        priority: str = "interactive",
+        prefix_records: int = 0,
+        generation: dict | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> str | Iterator[str]:
+        """Send *payload* to the model's provider.
+        
+        With ``stream=False`` returns the complete cleaned response text.
+        With ``stream=True`` returns an iterator of text deltas
+        (``streamGenerateContent`` / SSE ``chat/completions``), with
+        ``<think>`` blocks filtered out on the fly.
+        With ``use_cache=True`` byte-identical requests are answered from the
+        response cache (if one is configured) instead of the provider. When
+        *accept* is given, only responses it returns True for are stored or
+        served from the cache (e.g. output that matches the role's schema).
+        When the provider is throttled, failing or its circuit is open, the
+        model's ``fallbacks`` are tried in order.
+        Requests pass the shared rate limiter in the given *priority* lane
+        (``"interactive"`` or ``"background"``).
+        The first *prefix_records* records are the static part of the prompt;
+        providers with ``prompt_cache`` enabled cache them (see PromptCacheManager).
+        *generation* holds the role's generation settings (``max_output_tokens``,
+        ``temperature``, ``stop``, ``json``, ``thinking_budget``,
+        ``reasoning_effort``); each model only receives the ones its provider's
+        ``capabilities`` allow.
+        Token usage reported by the provider is recorded in `usage_tracker`
+        (attributed to the caller's usage scope) and settles the rate limiter's
+        estimate for the call.
+        """
+        chain = self._start_request(model, payload, stream)
+        errors = []
+        for index, candidate in enumerate(chain):
+            breaker = self.circuit_breakers[candidate.provider]
+            if not breaker.allow():
+                errors.append(f"{candidate.provider}: circuit open")
+                continue
+            try:
+                with tracer.span("provider_request", "provider", provider=candidate.provider, model=candidate.model_id, stream=stream, priority=priority):
+                    result = self._request_model(
+                        candidate, payload, encode_images, image_resolver, stream, use_cache, priority,
+                        prefix_records, generation, accept, can_fail_over=index < len(chain) - 1,
+                    )
+            except ProviderUnavailableError as e:
+                self._fail_over(chain, index, breaker, e, errors)
+                continue
+            except Exception:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
+        raise RuntimeError("All providers unavailable: " + "; ".join(errors))
+
+    async def generation_request_async(
+        self,
+        model: Model,
+        payload: list[HistoryRecord],
+        encode_images: bool = True,
+        image_resolver: Callable[[str], str | None] | None = None,
+        stream: bool = False,
+        use_cache: bool = False,
+        priority: str = "interactive",
+        prefix_records: int = 0,
+        generation: dict | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> str | AsyncIterator[str]:
+        """`generation_request` for coroutines: same arguments, fail-over, caching and accounting.
+
+        Requests go through the provider's async transport, so waiting on the
+        network costs no thread. With ``stream=True`` returns an async iterator of
+        text deltas.
+        """
+        chain = self._start_request(model, payload, stream)
+        errors = []
+        for index, candidate in enumerate(chain):
+            breaker = self.circuit_breakers[candidate.provider]
+            if not breaker.allow():
+                errors.append(f"{candidate.provider}: circuit open")
+                continue
+            try:
+                with tracer.span("provider_request", "provider", provider=candidate.provider, model=candidate.model_id, stream=stream, priority=priority):
+                    result = await self._request_model_async(
+                        candidate, payload, encode_images, image_resolver, stream, use_cache, priority,
+                        prefix_records, generation, accept, can_fail_over=index < len(chain) - 1,
+                    )
+            except ProviderUnavailableError as e:
+                self._fail_over(chain, index, breaker, e, errors)
+                continue
+            except Exception:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
+        raise RuntimeError("All providers unavailable: " + "; ".join(errors))
+
+    def _start_request(self, model: Model, payload: list[HistoryRecord], stream: bool) -> list[Model]:
+        """Check the model and its fallbacks, log the payload and return the chain to try."""
+        chain = [model] + model.fallbacks
+        for candidate in chain:
+            if candidate.provider not in self.providers_dict:
+                raise ValueError(f"Provider '{candidate.provider}' not found.")
+
+        payload_logger.log("provider_payload", {
+            "provider": model.provider,
+            "model_id": model.model_id,
+            "stream": stream,
+            "records": [{"role": record.role, "message": record.message, "image_hashes": record.image_hashes} for record in payload],
+        })
+        return chain
+
+    @staticmethod
+    def _fail_over(chain: list[Model], index: int, breaker: CircuitBreaker, error: ProviderUnavailableError, errors: list[str]) -> None:
+        breaker.record_failure(open_for=error.retry_after)
+        errors.append(f"{chain[index].provider}: {error}")
+        if index < len(chain) - 1:
+            print(f"[DEBUG] Provider '{chain[index].provider}' unavailable, failing over to {chain[index + 1].provider}/{chain[index + 1].model_id}")
+
+    def _request_model(
+        self,
+        model: Model,
+        payload: list[HistoryRecord],
+        encode_images: bool,
+        image_resolver: Callable[[str], str | None] | None,
+        stream: bool,
+        use_cache: bool,
+        priority: str,
+        prefix_records: int,
+        generation: dict | None,
+        accept: Callable[[str], bool] | None,
+        can_fail_over: bool,
+    ) -> str | Iterator[str]:
+        """Single-model part of `generation_request`. Streams are opened before returning."""
+        request = self._prepare_request(model, payload, encode_images, image_resolver, stream, use_cache, generation, accept)
+        if request["cached_text"] is not None:
+            return iter([request["cached_text"]]) if stream else request["cached_text"]
+        
+        body, prompt_cache_name = self._apply_prompt_cache(model, request, prefix_records)
+        estimated_tokens = self._estimate_tokens(payload, encode_images)
+        waited = rate_limiter.acquire(model.provider, model.model_id, estimated_tokens, priority)
+        span = self._annotate_request(len(body), waited, prompt_cache_name)
+        
+        try:
+            response = self._open_with_retries(model.provider, request["url"], body, request["headers"], can_fail_over)
+        except RuntimeError as e:
+            if not self._prompt_cache_rejected(e, prompt_cache_name, span):
+                raise
+            response = self._open_with_retries(model.provider, request["url"], request["inline_body"], request["headers"], can_fail_over)
+        
+        if stream:
+            deltas = self._stream_response(request["structure"], response, model, estimated_tokens)
+            if request["cache_key"]:
+                return self._cache_stream(request, deltas)
+            return deltas
+        
+        with response:
+            raw = response.read()
+        return self._parse_response(model, request, raw, estimated_tokens, span)
+
+    async def _request_model_async(
+        self,
+        model: Model,
+        payload: list[HistoryRecord],
+        encode_images: bool,
+        image_resolver: Callable[[str], str | None] | None,
+        stream: bool,
+        use_cache: bool,
+        priority: str,
+        prefix_records: int,
+        generation: dict | None,
+        accept: Callable[[str], bool] | None,
+        can_fail_over: bool,
+    ) -> str | AsyncIterator[str]:
+        """Single-model part of `generation_request_async`. Streams are opened before returning."""
+        request = self._prepare_request(model, payload, encode_images, image_resolver, stream, use_cache, generation, accept)
+        if request["cached_text"] is not None:
+            return self._iter_async([request["cached_text"]]) if stream else request["cached_text"]
+        
+        if self.prompt_cache.configs.get(model.provider, {}).get("active", False) and request["structure"] == "google-compatible":
+            # Registering a new cachedContents prefix is a blocking request
+            body, prompt_cache_name = await asyncio.to_thread(self._apply_prompt_cache, model, request, prefix_records)
+        else:
+            body, prompt_cache_name = self._apply_prompt_cache(model, request, prefix_records)
+        estimated_tokens = self._estimate_tokens(payload, encode_images)
+        waited = await rate_limiter.acquire_async(model.provider, model.model_id, estimated_tokens, priority)
+        span = self._annotate_request(len(body), waited, prompt_cache_name)
+        
+        try:
+            response = await self._open_with_retries_async(model.provider, request["url"], body, request["headers"], can_fail_over)
+        except RuntimeError as e:
+            if not self._prompt_cache_rejected(e, prompt_cache_name, span):
+                raise
+            response = await self._open_with_retries_async(model.provider, request["url"], request["inline_body"], request["headers"], can_fail_over)
+        
+        if stream:
+            deltas = self._stream_response_async(request["structure"], response, model, estimated_tokens)
+            if request["cache_key"]:
+                return self._cache_stream_async(request, deltas)
+            return deltas
+        
+        async with response:
+            raw = await response.read()
+        return self._parse_response(model, request, raw, estimated_tokens, span)
+
+    @staticmethod
+    async def _iter_async(items: list[str]) -> AsyncIterator[str]:
+        for item in items:
+            yield item
+
+    def _prepare_request(
+        self,
+        model: Model,
+        payload: list[HistoryRecord],
+        encode_images: bool,
+        image_resolver: Callable[[str], str | None] | None,
+        stream: bool,
+        use_cache: bool,
+        generation: dict | None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> dict:
+        """Render the request for one model.
+
+        Returns {"structure", "endpoint", "url", "headers", "rendered", "inline_body",
+        "cache_key", "cached_text", "accept"}; ``cached_text`` is set on a response cache hit.
+        """
         provider_info = self.providers_dict[model.provider]
         endpoint = provider_info["endpoint"]
         structure = provider_info["structure"]
@@ -167,7 +717,23 @@ class ProvidersManager:
             structure, model.model_id, payload,
             encode_images=encode_images,
             image_resolver=image_resolver,
+            generation=generation,
+            capabilities=self.get_capabilities(model.provider, model.model_id),
         )
+        request = {"structure": structure, "endpoint": endpoint, "cache_key": None, "cached_text": None, "accept": accept}
+        
+        if use_cache and self.response_cache:
+            request["cache_key"] = ResponseCache.make_key(model.provider, model.model_id, rendered_payload)
+            cached_text = self.response_cache.get(request["cache_key"])
+            if cached_text is not None and accept and not accept(cached_text):
+                print(f"[DEBUG] Response cache: dropping an invalid entry for {model.provider}/{model.model_id}")
+                self.response_cache.discard(request["cache_key"])
+                cached_text = None
+            tracer.current_span().set_attribute("cache_hit", cached_text is not None)
+            if cached_text is not None:
+                print(f"[DEBUG] Response cache hit for {model.provider}/{model.model_id}")
+                request["cached_text"] = cached_text
+                return request
         
         headers = {'Content-Type': 'application/json'}
         api_key = self._get_api_key(model.api_key_name)
@@ -182,20 +748,64 @@ class ProvidersManager:
         if structure == "google-compatible":
             if not request_url.endswith("/"):
                 request_url += "/"
-            request_url += f"{model.model_id}:generateContent"
+            if stream:
+                request_url += f"{model.model_id}:streamGenerateContent?alt=sse"
+            else:
+                request_url += f"{model.model_id}:generateContent"
         elif structure == "openai-compatible":
             if not request_url.endswith("/"):
                 request_url += "/"
             request_url += "chat/completions"
-            
-        req = urllib.request.Request(
-            request_url, 
-            data=json.dumps(rendered_payload, ensure_ascii=False).encode('utf-8'), 
-            headers=headers, 
-            method='POST'
-        )
+            if stream:
+                rendered_payload["stream"] = True
+                if self.get_capabilities(model.provider, model.model_id)["stream_usage"]:
+                    rendered_payload["stream_options"] = {"include_usage": True}
         
-        response_data = self._execute_request_with_retries(req)
+        request.update(
+            url=request_url,
+            headers=headers,
+            rendered=rendered_payload,
+            inline_body=json.dumps(rendered_payload, ensure_ascii=False).encode('utf-8'),
+        )
+        return request
+
+    def _apply_prompt_cache(self, model: Model, request: dict, prefix_records: int) -> tuple[bytes, str | None]:
+        """Body to send, referencing a provider-side cached prefix where possible, and that cache's name."""
+        rendered_payload = request["rendered"]
+        request_payload, prompt_cache_name = self.prompt_cache.apply(
+            model.provider, request["structure"], model.model_id, rendered_payload, prefix_records,
+            lambda cache_request: self._create_cached_content(model.provider, request["endpoint"], cache_request, request["headers"]),
+        )
+        if request_payload is rendered_payload:
+            return request["inline_body"], prompt_cache_name
+        return json.dumps(request_payload, ensure_ascii=False).encode('utf-8'), prompt_cache_name
+
+    @staticmethod
+    def _annotate_request(bytes_sent: int, waited: float, prompt_cache_name: str | None):
+        span = tracer.current_span()
+        span.set_attribute("bytes_sent", bytes_sent)
+        span.set_attribute("rate_limit_wait_ms", round(waited * 1000, 1))
+        span.set_attribute("prompt_cache", prompt_cache_name is not None)
+        return span
+
+    def _prompt_cache_rejected(self, error: RuntimeError, prompt_cache_name: str | None, span) -> bool:
+        """True when *error* means the referenced cached prefix is gone and the prompt must be resent inline."""
+        status_error = error.__cause__
+        if not (prompt_cache_name and isinstance(status_error, HTTPStatusError) and status_error.code in (400, 403, 404)):
+            return False
+        # The cached prefix expired or was deleted: send the prompt inline
+        print(f"[DEBUG] PromptCache: {prompt_cache_name} rejected ({status_error.code}), resending inline")
+        self.prompt_cache.invalidate(prompt_cache_name)
+        span.set_attribute("prompt_cache", False)
+        return True
+
+    def _parse_response(self, model: Model, request: dict, raw: bytes, estimated_tokens: int, span) -> str:
+        """Account usage of a complete response and return its text without ``<think>`` blocks."""
+        structure = request["structure"]
+        span.set_attribute("bytes_received", len(raw))
+        response_data = json.loads(raw.decode('utf-8'))
+        for key, value in self._record_usage(model, usage_tracker.parse_usage(structure, response_data), estimated_tokens).items():
+            span.set_attribute(key, value)
         
         if structure == "google-compatible":
             try:
@@ -211,4 +821,40 @@ class ProvidersManager:
         # Strip <think>...</think> block anywhere in the output
         cleaned_text = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL)
         # Also clean up any leading/trailing whitespace left by the removal
-        return cleaned_text.strip()
+        cleaned_text = cleaned_text.strip()
+        if request["cache_key"]:
+            self._store_response(request, cleaned_text)
+        return cleaned_text
+
+
+class _StreamState:
+    """Text deltas and usage of a response while it streams in."""
+
+    def __init__(self, structure: str) -> None:
+        self.structure = structure
+        self.think_filter = ThinkFilter()
+        self.started_ns = time.time_ns()
+        self.started = False
+        self.chars = 0
+        self.usage = None
+
+    def feed(self, event: dict) -> str:
+        """Return the visible text of one stream event."""
+        # Gemini repeats the running totals in every event, openai-compatible APIs send them last
+        self.usage = usage_tracker.parse_usage(self.structure, event) or self.usage
+        text = self.think_filter.feed(ProvidersManager._extract_stream_text(self.structure, event))
+        if not self.started:
+            text = text.lstrip()
+        if text:
+            self.started = True
+            self.chars += len(text)
+        return text
+
+    def finish(self) -> str:
+        """Return the text held back by the think filter once the stream has ended."""
+        tail = self.think_filter.flush()
+        if not self.started:
+            tail = tail.lstrip()
+        tail = tail.rstrip()
+        self.chars += len(tail)
+        return tail
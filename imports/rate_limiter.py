@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+
+PRIORITIES = ("interactive", "background")
+DEFAULT_BACKGROUND_RESERVE = 0.25
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to ``capacity`` units per minute."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._rate = float(per_minute) / 60.0
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        """Time until *amount* units are available (bucket must be refilled first)."""
+        missing = amount - self.level
+        return max(0.0, missing / self._rate) if self._rate else float("inf")
+
+
+class RateLimiter:
+    """Process-wide RPM/TPM limiter keyed by (provider, model_id).
+
+    Limits come from each provider's ``rate_limits`` section:
+    ``{"rpm": .., "tpm": .., "models": {model_id: {"rpm": .., "tpm": ..}}}``.
+    Callers in the ``background`` lane leave the provider's ``background_reserve``
+    of every bucket to ``interactive`` callers and always yield to waiting interactive
+    calls, so foreground pipeline calls get quota first.
+    """
+
+    def __init__(self) -> None:
+        self._limits: dict[str, dict] = {}
+        self._buckets: dict[tuple[str, str], dict[str, TokenBucket]] = {}
+        self._waiting: dict[tuple[str, str], dict[str, int]] = {}
+        self._condition = threading.Condition()
+        self._stats = {lane: {"requests": 0, "delayed": 0, "total_wait": 0.0, "max_wait": 0.0} for lane in PRIORITIES}
+
+    def configure(self, providers: list[dict]) -> None:
+        """Register ``rate_limits`` of the given providers (existing buckets are kept)."""
+        with self._condition:
+            for provider in providers:
+                limits = provider.get("rate_limits")
+                if limits:
+                    self._limits[provider["name"]] = limits
+
+    def acquire(self, provider: str, model_id: str, tokens: int, priority: str = "interactive") -> float:
+        """Block until one request and *tokens* tokens fit the limits. Returns the time waited."""
+        buckets = self._get_buckets(provider, model_id)
+        if not buckets:
+            return 0.0
+        if priority not in PRIORITIES:
+            priority = "interactive"
+
+        key = (provider, model_id)
+        reserve = self._background_reserve(provider)
+        started = time.monotonic()
+        with self._condition:
+            waiting = self._waiting.setdefault(key, {lane: 0 for lane in PRIORITIES})
+            waiting[priority] += 1
+            try:
+                while True:
+                    delay = self._reserve(buckets, tokens, priority, waiting, reserve)
+                    if delay <= 0:
+                        break
+                    self._condition.wait(min(delay, 1.0))
+            finally:
+                waiting[priority] -= 1
+                self._condition.notify_all()
+        return self._account(provider, model_id, priority, time.monotonic() - started)
+
+    async def acquire_async(self, provider: str, model_id: str, tokens: int, priority: str = "interactive") -> float:
+        """`acquire` for coroutines: waits with ``asyncio.sleep`` instead of blocking the event loop."""
+        buckets = self._get_buckets(provider, model_id)
+        if not buckets:
+            return 0.0
+        if priority not in PRIORITIES:
+            priority = "interactive"
+
+        key = (provider, model_id)
+        reserve = self._background_reserve(provider)
+        started = time.monotonic()
+        with self._condition:
+            waiting = self._waiting.setdefault(key, {lane: 0 for lane in PRIORITIES})
+            waiting[priority] += 1
+        try:
+            while True:
+                with self._condition:
+                    delay = self._reserve(buckets, tokens, priority, waiting, reserve)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(min(delay, 1.0))
+        finally:
+            with self._condition:
+                waiting[priority] -= 1
+                self._condition.notify_all()
+        return self._account(provider, model_id, priority, time.monotonic() - started)
+
+    def settle(self, provider: str, model_id: str, estimated: int, actual: int) -> None:
+        """Correct the TPM bucket once the provider reported the real token count of a call."""
+        bucket = self._get_buckets(provider, model_id).get("tpm")
+        if not bucket:
+            return
+        with self._condition:
+            bucket.refill()
+            # A call that cost more than estimated can leave the bucket in debt; later calls wait for it
+            bucket.level = min(bucket.capacity, bucket.level + min(estimated, bucket.capacity) - actual)
+            self._condition.notify_all()
+
+    def get_stats(self) -> dict:
+        """Queueing delay per lane and the current bucket levels."""
+        with self._condition:
+            report = {}
+            for lane, stats in self._stats.items():
+                report[lane] = dict(stats)
+                report[lane]["avg_wait"] = stats["total_wait"] / stats["requests"] if stats["requests"] else 0.0
+            report["buckets"] = {
+                f"{provider}/{model_id}": {name: round(bucket.level, 1) for name, bucket in buckets.items()}
+                for (provider, model_id), buckets in self._buckets.items()
+            }
+            return report
+
+    def _reserve(self, buckets: dict[str, TokenBucket], tokens: int, priority: str, waiting: dict[str, int], reserve: float) -> float:
+        """Take one request and *tokens* from the buckets, or return how long to wait first. Caller holds the lock.
+
+        Background calls also leave the *reserve* share of every bucket untouched.
+        """
+        wanted = {"rpm": 1.0, "tpm": float(tokens)}
+        delay = 0.0
+        for name, bucket in buckets.items():
+            bucket.refill()
+            # A single call larger than the bucket would never fit
+            amount = min(wanted[name], bucket.capacity)
+            if priority == "background":
+                amount = min(amount + bucket.capacity * reserve, bucket.capacity)
+            delay = max(delay, bucket.seconds_until(amount))
+        if priority == "background" and waiting["interactive"]:
+            delay = max(delay, 0.05)
+        if delay <= 0:
+            for name, bucket in buckets.items():
+                bucket.level -= min(wanted[name], bucket.capacity)
+        return delay
+
+    def _account(self, provider: str, model_id: str, priority: str, waited: float) -> float:
+        with self._condition:
+            stats = self._stats[priority]
+            stats["requests"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            if waited > 0.01:
+                stats["delayed"] += 1
+        if waited > 0.01:
+            print(f"[DEBUG] RateLimiter: {priority} call to {provider}/{model_id} waited {waited:.2f}s")
+        return waited
+
+    def _background_reserve(self, provider: str) -> float:
+        with self._condition:
+            return float(self._limits.get(provider, {}).get("background_reserve", DEFAULT_BACKGROUND_RESERVE))
+
+    def _get_buckets(self, provider: str, model_id: str) -> dict[str, TokenBucket]:
+        with self._condition:
+            key = (provider, model_id)
+            if key not in self._buckets:
+                limits = self._limits.get(provider, {})
+                model_limits = {**limits, **limits.get("models", {}).get(model_id, {})}
+                self._buckets[key] = {
+                    name: TokenBucket(model_limits[name])
+                    for name in ("rpm", "tpm") if model_limits.get(name)
+                }
+            return self._buckets[key]
+
+
+# Process-wide limiter shared by every ProvidersManager (the pipeline and MemoryRAG)
+rate_limiter = RateLimiter()
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Clock times stamped on prompt records ("[14:05, 3 March]") and other timestamps
+# change every minute; they are masked so the same prompt keeps one entry
+_TIMESTAMP_RE = re.compile(
+    r"\[\d{1,2}:\d{2}, \d{1,2} [^\]]+\]"
+    r"|\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"
+    r"|\b\d{1,2}:\d{2}:\d{2}\b"
+)
+
+
+class ResponseCache:
+    """Content-addressed cache of LLM responses.
+
+    Entries are keyed on a SHA-256 of the provider, the model id and the
+    rendered request payload with timestamps masked, so only requests that are
+    identical apart from the time they were sent are reused.
+    An in-memory LRU sits in front of an on-disk store
+    (``<path>/<key[:2]>/<key>.json``); both honour the same TTL.
+    """
+
+    def __init__(self, path: str = "./data/cache/llm/", max_entries: int = 512, ttl_seconds: float = 3600) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (created, text)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0, "discarded": 0}
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(provider: str, model_id: str, rendered_payload: dict) -> str:
+        """Return the content address of a rendered request."""
+        body = json.dumps(rendered_payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        body = _TIMESTAMP_RE.sub("<ts>", body)
+        return hashlib.sha256(f"{provider}\n{model_id}\n{body}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response text, or ``None`` on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                created, text = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return text
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        entry = self._read_disk(key)
+        if entry:
+            created, text = entry
+            if now - created <= self.ttl_seconds:
+                with self._lock:
+                    self._remember(key, created, text)
+                    self._stats["disk_hits"] += 1
+                return text
+            with self._lock:
+                self._stats["expired"] += 1
+            self._remove_disk(key)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        """Store a response in memory and on disk."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, text)
+            self._stats["stores"] += 1
+        self._write_disk(key, created, text)
+
+    def discard(self, key: str) -> None:
+        """Remove an entry, e.g. one whose text turned out to be unusable."""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._stats["discarded"] += 1
+        self._remove_disk(key)
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters and the hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries_in_memory"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, created: float, text: str) -> None:
+        self._memory[key] = (created, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> tuple[float, str] | None:
+        if not self.path:
+            return None
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return float(data["created"]), data["text"]
+        except (IOError, json.JSONDecodeError, KeyError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, created: float, text: str) -> None:
+        if not self.path:
+            return
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "text": text}, f, ensure_ascii=False)
+            os.replace(tmp_path, entry_path)
+        except IOError as e:
+            print(f"ResponseCache: failed to write {entry_path}: {e}")
+
+    def _remove_disk(self, key: str) -> None:
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
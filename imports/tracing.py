@@ -0,0 +1,247 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator
+from imports.payload_logger import payload_logger
+
+SERVICE_NAME = "tinyagent"
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation inside a trace. Attributes are free-form scalars."""
+
+    def __init__(self, trace_id: str, name: str, category: str, parent: "Span | None" = None, attributes: dict | None = None) -> None:
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.category = category
+        self.attributes = dict(attributes or {})
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_to_attribute(self, key: str, amount: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """Returned when no trace is active so call sites never need to check."""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_to_attribute(self, key: str, amount: float) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Collects spans per trace and exports finished traces.
+
+    A trace starts with `start_trace` (one per request) and is exported when its
+    root span ends, as Chrome trace JSON (open in Perfetto / chrome://tracing)
+    and/or OTLP JSON, one file per trace under ``output_dir``. Spans opened
+    outside a trace are no-ops. The active span lives in a context variable;
+    use `bind` to carry it into executor threads.
+    """
+
+    def __init__(self) -> None:
+        self._traces: dict[str, list[Span]] = {}
+        self._lock = threading.Lock()
+        self.configure({})
+
+    def configure(self, config: dict) -> None:
+        """Apply the ``tracing`` section of config.json."""
+        self.active = bool(config.get("active", False))
+        self.output_dir = config.get("output_dir", "logs/traces")
+        self.chrome_trace = bool(config.get("chrome_trace", True))
+        self.otlp = bool(config.get("otlp", True))
+        self.sample_rate = float(config.get("sample_rate", 1.0))
+        self.max_files = int(config.get("max_files", 200))
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def start_trace(self, name: str, **attributes) -> Iterator[Span | _NoopSpan]:
+        """Open a new trace with a root span; exported when the block exits."""
+        if not self.active or random.random() >= self.sample_rate:
+            token = _current_span.set(None)
+            try:
+                yield NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+
+        root = Span(os.urandom(16).hex(), name, "request", attributes=attributes)
+        with self._lock:
+            self._traces[root.trace_id] = []
+        try:
+            with self._activate(root):
+                yield root
+        finally:
+            with self._lock:
+                spans = self._traces.pop(root.trace_id, [])
+            self._export(root, spans)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **attributes) -> Iterator[Span | _NoopSpan]:
+        """Open a child span of the current span (no-op outside a trace)."""
+        parent = _current_span.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        span = Span(parent.trace_id, name, category, parent=parent, attributes=attributes)
+        with self._activate(span):
+            yield span
+
+    @staticmethod
+    def current_span() -> Span | _NoopSpan:
+        return _current_span.get() or NOOP_SPAN
+
+    @staticmethod
+    def bind(func: Callable) -> Callable:
+        """Return *func* bound to a copy of the caller's context (for executors and threads)."""
+        context = contextvars.copy_context()
+        return functools.partial(context.run, func)
+
+    def record_span(self, name: str, category: str, start_ns: int, **attributes) -> None:
+        """Record an already finished child of the current span (e.g. a consumed stream)."""
+        parent = _current_span.get()
+        if parent is None:
+            return
+        span = Span(parent.trace_id, name, category, parent=parent, attributes=attributes)
+        span.start_ns = start_ns
+        span.end_ns = time.time_ns()
+        self._collect(span)
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _activate(self, span: Span) -> Iterator[Span]:
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if span.parent_id is not None:
+                self._collect(span)
+
+    def _collect(self, span: Span) -> None:
+        with self._lock:
+            # Spans that end after their trace was exported are dropped
+            spans = self._traces.get(span.trace_id)
+            if spans is not None:
+                spans.append(span)
+
+    def _export(self, root: Span, spans: list[Span]) -> None:
+        spans = [root] + spans
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            prefix = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{root.trace_id[:8]}")
+            if self.chrome_trace:
+                self._write_json(f"{prefix}.chrome.json", self.to_chrome_trace(spans))
+            if self.otlp:
+                self._write_json(f"{prefix}.otlp.json", self.to_otlp(spans))
+            self._prune_files()
+        except (IOError, OSError) as e:
+            print(f"Tracer: failed to export trace {root.trace_id}: {e}")
+        if payload_logger.debug:
+            print(f"[DEBUG] Trace {root.trace_id[:8]} ({root.name}): {root.duration_ms:.0f} ms, {len(spans)} spans")
+
+    @staticmethod
+    def _write_json(path: str, data: dict) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    def _prune_files(self) -> None:
+        if not self.max_files:
+            return
+        files = sorted(name for name in os.listdir(self.output_dir) if name.endswith(".json"))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            os.remove(os.path.join(self.output_dir, name))
+
+    @staticmethod
+    def to_chrome_trace(spans: list[Span]) -> dict:
+        """Chrome trace event format: one complete ("X") event per span, one row per thread."""
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            args = dict(span.attributes, trace_id=span.trace_id, span_id=span.span_id)
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": ((span.end_ns or span.start_ns) - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    @staticmethod
+    def to_otlp(spans: list[Span]) -> dict:
+        """OTLP/JSON ``ExportTraceServiceRequest`` body."""
+        def attribute(key: str, value: Any) -> dict:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [attribute("category", span.category)] + [attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "imports.tracing"}, "spans": otlp_spans}],
+        }]}
+
+
+# Process-wide tracer
+tracer = Tracer()
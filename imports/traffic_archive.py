@@ -0,0 +1,369 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Iterator
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from imports.http_transport import HTTPStatusError, HTTPTransport, TransportResponse
+from imports.payload_logger import LogEncoder
+
+INDEX_FILE = "index.jsonl"
+DATA_FILE = "records.bin"
+SECRET_QUERY_PARAMS = {"key", "api_key", "access_token"}
+
+# Timestamps and clock times embedded in prompts change on every run
+_TIMESTAMP_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"
+    r"|\b\d{1,2}:\d{2}:\d{2}\b"
+)
+_session_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("traffic_session", default=None)
+
+
+def normalize_request(url: str, body: bytes | None) -> tuple[str, str]:
+    """Return (endpoint, key) used to match a request against recorded traffic.
+
+    The endpoint is the URL without secret query parameters. The key hashes the
+    endpoint and the JSON body with timestamps masked, so the same prompt
+    recorded at another time still matches.
+    """
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k not in SECRET_QUERY_PARAMS]
+    endpoint = parts.path + (f"?{urlencode(query)}" if query else "")
+    try:
+        normalized = json.dumps(json.loads(body or b"null"), sort_keys=True, ensure_ascii=False)
+    except (ValueError, UnicodeDecodeError):
+        normalized = (body or b"").decode("utf-8", errors="replace")
+    normalized = _TIMESTAMP_RE.sub("<ts>", normalized)
+    key = hashlib.sha256(f"{endpoint}\n{normalized}".encode("utf-8")).hexdigest()
+    return endpoint, key
+
+
+class TrafficArchive:
+    """Record/replay of provider HTTP traffic.
+
+    - ``record``: every provider request/response pair is stored with its
+      timing (time to headers, time of each streamed line, total), and every
+      pipeline run stores its input (message and dialog history) so whole
+      sessions can be replayed.
+    - ``replay``: provider transports serve responses from the archive instead
+      of the network, delayed by the recorded timings divided by ``speed``
+      (``0`` disables delays). Requests are matched on their normalized key
+      first, then on the next unused record for the same endpoint within the
+      replayed session, so a build with changed prompts still replays.
+
+    The archive is a directory with ``records.bin`` (zlib-compressed JSON
+    records, appended) and ``index.jsonl`` (one small line per record with its
+    offset, match keys and timings), so replay loads only the index up front.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.configure({})
+
+    def configure(self, config: dict) -> None:
+        """Apply the ``traffic`` section of config.json."""
+        self.mode = config.get("mode", "off")
+        self.path = config.get("path", "logs/traffic")
+        self.speed = float(config.get("speed", 1.0))
+        self.record_inputs = bool(config.get("record_inputs", True))
+        self._index: list[dict] = []
+        self._consumed: set[int] = set()
+        self._replayed: dict[str | None, dict] = {}
+        self.stats = {"recorded": 0, "exact_hits": 0, "endpoint_hits": 0, "misses": 0}
+        if self.mode == "replay":
+            self._load_index()
+        elif self.mode == "record":
+            os.makedirs(self.path, exist_ok=True)
+        elif self.mode != "off":
+            print(f"TrafficArchive: unknown mode '{self.mode}', traffic is not recorded.")
+            self.mode = "off"
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def wrap(self, provider: str, transport: HTTPTransport) -> HTTPTransport:
+        """Wrap a provider transport according to the configured mode."""
+        if self.mode == "record":
+            return RecordingTransport(self, provider, transport)
+        if self.mode == "replay":
+            return ReplayTransport(self, provider)
+        return transport
+
+    @contextlib.contextmanager
+    def input_session(self, payload: dict, history: list) -> Iterator[str | None]:
+        """Record a pipeline input and tag the provider records made inside the block with it."""
+        if self.mode != "record" or not self.record_inputs:
+            yield _session_id.get()
+            return
+        session = os.urandom(8).hex()
+        started = time.time()
+        token = _session_id.set(session)
+        try:
+            yield session
+        finally:
+            _session_id.reset(token)
+            # Written last so the entry carries the pipeline wall time
+            entry = {"kind": "input", "session": session, "started_at": started, "duration_ms": round((time.time() - started) * 1000, 1)}
+            self._append(entry, {"payload": payload, "history": history})
+
+    @contextlib.contextmanager
+    def replay_session(self, session: str | None) -> Iterator[None]:
+        """Serve the provider requests made inside the block from the records of *session*."""
+        token = _session_id.set(session)
+        try:
+            yield
+        finally:
+            _session_id.reset(token)
+
+    def iter_inputs(self) -> Iterator[dict]:
+        """Yield recorded pipeline inputs in recording order.
+
+        Each item has ``session``, ``payload``, ``history`` (dialog records as
+        dicts), the recorded ``duration_ms`` and the index entries of the
+        provider ``requests`` made for it.
+        """
+        requests_per_session: dict[str, list[dict]] = {}
+        for entry in self._index:
+            if entry["kind"] == "provider":
+                requests_per_session.setdefault(entry.get("session"), []).append(entry)
+        inputs = sorted((e for e in self._index if e["kind"] == "input"), key=lambda e: e["started_at"])
+        for entry in inputs:
+            record = self._read_record(entry)
+            yield {
+                "session": entry["session"],
+                "payload": record["payload"],
+                "history": record["history"],
+                "duration_ms": entry["duration_ms"],
+                "requests": requests_per_session.get(entry["session"], []),
+            }
+
+    def get_replay_stats(self, session: str | None = None) -> dict:
+        """Requests served during replay, overall or for one session."""
+        with self._lock:
+            if session is not None:
+                return dict(self._replayed.get(session, {"calls": 0, "request_bytes": 0, "misses": 0}))
+            return dict(self.stats)
+
+    def reset_replay(self) -> None:
+        """Make every recorded response available again (e.g. before another iteration)."""
+        with self._lock:
+            self._consumed.clear()
+            self._replayed.clear()
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.path, INDEX_FILE)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                self._index = [json.loads(line) for line in f if line.strip()]
+        except (IOError, OSError) as e:
+            print(f"TrafficArchive: unable to read {index_path}: {e}")
+            self._index = []
+        print(f"[DEBUG] TrafficArchive: loaded {len(self._index)} records from {self.path}")
+
+    def _append(self, entry: dict, record: dict) -> None:
+        data = zlib.compress(json.dumps(record, ensure_ascii=False, cls=LogEncoder).encode("utf-8"), 6)
+        with self._lock:
+            try:
+                with open(os.path.join(self.path, DATA_FILE), "ab") as f:
+                    entry["offset"] = f.tell()
+                    entry["length"] = len(data)
+                    f.write(data)
+                with open(os.path.join(self.path, INDEX_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.stats["recorded"] += 1
+            except (IOError, OSError) as e:
+                print(f"TrafficArchive: failed to record traffic: {e}")
+
+    def _read_record(self, entry: dict) -> dict:
+        with open(os.path.join(self.path, DATA_FILE), "rb") as f:
+            f.seek(entry["offset"])
+            return json.loads(zlib.decompress(f.read(entry["length"])).decode("utf-8"))
+
+    def _record_exchange(self, provider: str, url: str, body: bytes | None, started: float, ttfb: float,
+                         status: int, headers: dict, response_body: bytes, line_offsets: list[float] | None,
+                         error: str | None = None) -> None:
+        endpoint, key = normalize_request(url, body)
+        entry = {
+            "kind": "provider",
+            "session": _session_id.get(),
+            "provider": provider,
+            "endpoint": endpoint,
+            "key": key,
+            "status": status,
+            "started_at": started,
+            "ttfb_ms": round(ttfb * 1000, 1),
+            "total_ms": round((time.time() - started) * 1000, 1),
+            "request_bytes": len(body or b""),
+            "response_bytes": len(response_body),
+        }
+        record = {
+            "request": (body or b"").decode("utf-8", errors="replace"),
+            "headers": headers,
+            "body": response_body.decode("utf-8", errors="replace"),
+            "line_ms": line_offsets,
+            "error": error,
+        }
+        self._append(entry, record)
+
+    def _match(self, url: str, body: bytes | None) -> dict | None:
+        endpoint, key = normalize_request(url, body)
+        session = _session_id.get()
+        with self._lock:
+            replayed = self._replayed.setdefault(session, {"calls": 0, "request_bytes": 0, "misses": 0})
+            replayed["calls"] += 1
+            replayed["request_bytes"] += len(body or b"")
+            fallback = None
+            for i, entry in enumerate(self._index):
+                if i in self._consumed or entry["kind"] != "provider" or entry["endpoint"] != endpoint:
+                    continue
+                if session is not None and entry.get("session") != session:
+                    continue
+                if entry["key"] == key:
+                    self._consumed.add(i)
+                    self.stats["exact_hits"] += 1
+                    return entry
+                if fallback is None:
+                    fallback = i
+            if fallback is not None:
+                self._consumed.add(fallback)
+                self.stats["endpoint_hits"] += 1
+                return self._index[fallback]
+            self.stats["misses"] += 1
+            replayed["misses"] += 1
+            return None
+
+    def _delay(self, seconds: float) -> None:
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+
+# ------------------------------------------------------------------
+# Transports
+# ------------------------------------------------------------------
+
+class _RecordingResponse(TransportResponse):
+    def __init__(self, recorder: "RecordingTransport", response: TransportResponse, url: str, body: bytes | None, started: float, ttfb: float) -> None:
+        self._recorder = recorder
+        self._response = response
+        self._url = url
+        self._body = body
+        self._started = started
+        self._ttfb = ttfb
+        self._chunks: list[bytes] = []
+        self._line_offsets: list[float] | None = None
+        self._recorded = False
+        self.status = response.status
+        self.headers = response.headers
+
+    def read(self) -> bytes:
+        data = self._response.read()
+        self._chunks.append(data)
+        self.close()
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._line_offsets = []
+        try:
+            for line in self._response:
+                self._chunks.append(line)
+                self._line_offsets.append(round((time.time() - self._started) * 1000, 1))
+                yield line
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._response.close()
+        if not self._recorded:
+            self._recorded = True
+            self._recorder.archive._record_exchange(
+                self._recorder.provider, self._url, self._body, self._started, self._ttfb,
+                self.status, self.headers, b"".join(self._chunks), self._line_offsets,
+            )
+
+
+class RecordingTransport(HTTPTransport):
+    """Passes requests to the real transport and records each exchange once its body is consumed."""
+
+    def __init__(self, archive: TrafficArchive, provider: str, transport: HTTPTransport) -> None:
+        self.archive = archive
+        self.provider = provider
+        self.transport = transport
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> TransportResponse:
+        started = time.time()
+        try:
+            response = self.transport.request(method, url, body=body, headers=headers)
+        except HTTPStatusError as e:
+            self.archive._record_exchange(self.provider, url, body, started, time.time() - started,
+                                          e.code, e.headers, e.body.encode("utf-8"), None)
+            raise
+        except (ConnectionError, TimeoutError, OSError) as e:
+            self.archive._record_exchange(self.provider, url, body, started, time.time() - started,
+                                          0, {}, b"", None, error=str(e) or type(e).__name__)
+            raise
+        return _RecordingResponse(self, response, url, body, started, time.time() - started)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _ReplayResponse(TransportResponse):
+    def __init__(self, archive: TrafficArchive, entry: dict, record: dict) -> None:
+        self._archive = archive
+        self._entry = entry
+        self._record = record
+        self._started = time.time()
+        self.status = entry["status"]
+        self.headers = record.get("headers") or {}
+
+    def read(self) -> bytes:
+        elapsed = (self._entry["total_ms"] - self._entry["ttfb_ms"]) / 1000
+        self._archive._delay(elapsed)
+        return self._record["body"].encode("utf-8")
+
+    def __iter__(self) -> Iterator[bytes]:
+        lines = self._record["body"].encode("utf-8").splitlines(keepends=True)
+        offsets = self._record.get("line_ms") or [self._entry["total_ms"]] * len(lines)
+        ttfb = self._entry["ttfb_ms"]
+        for line, offset in zip(lines, offsets):
+            # Replay the recorded pacing relative to the response headers
+            due = (offset - ttfb) / 1000 / (self._archive.speed or 1)
+            wait = self._started + due - time.time()
+            if self._archive.speed > 0 and wait > 0:
+                time.sleep(wait)
+            yield line
+
+
+class ReplayTransport(HTTPTransport):
+    """Serves recorded responses instead of calling the provider."""
+
+    def __init__(self, archive: TrafficArchive, provider: str) -> None:
+        self.archive = archive
+        self.provider = provider
+
+    def request(self, method: str, url: str, body: bytes | None = None, headers: dict | None = None) -> TransportResponse:
+        entry = self.archive._match(url, body)
+        if entry is None:
+            endpoint, _ = normalize_request(url, body)
+            raise RuntimeError(f"TrafficArchive: no recorded response for {self.provider} {endpoint}")
+        record = self.archive._read_record(entry)
+        self.archive._delay(entry["ttfb_ms"] / 1000)
+        if record.get("error"):
+            raise ConnectionError(record["error"])
+        if entry["status"] >= 400:
+            raise HTTPStatusError(entry["status"], record["body"], record.get("headers") or {})
+        return _ReplayResponse(self.archive, entry, record)
+
+
+# Process-wide archive
+traffic_archive = TrafficArchive()
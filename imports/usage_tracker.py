@@ -0,0 +1,197 @@
+import contextlib
+import contextvars
+import threading
+from collections import OrderedDict
+from typing import Iterator
+from imports.payload_logger import payload_logger
+
+TOKEN_FIELDS = ("prompt_tokens", "cached_tokens", "output_tokens", "reasoning_tokens", "total_tokens")
+
+_usage_scope: contextvars.ContextVar[dict] = contextvars.ContextVar("usage_scope", default={})
+
+
+def _empty_totals() -> dict:
+    return dict({field: 0 for field in TOKEN_FIELDS}, calls=0, cost=0.0)
+
+
+class UsageTracker:
+    """Token usage and cost of every provider call.
+
+    Usage reported by the provider (Gemini ``usageMetadata``, openai-compatible
+    ``usage``) is attributed to the role, chat and request of the active
+    `scope`, aggregated in memory per role, chat and model, and written to the
+    ``usage`` log stream. ``output_tokens`` includes ``reasoning_tokens``;
+    ``cached_tokens`` is the part of ``prompt_tokens`` served from a prompt cache.
+    Cost is computed from ``pricing`` (USD per million tokens, keyed by
+    ``provider/model_id``) and stays 0 for models without prices.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.configure({})
+
+    def configure(self, config: dict) -> None:
+        """Apply the ``usage`` section of config.json. Clears collected usage."""
+        self.active = bool(config.get("active", True))
+        self.pricing = dict(config.get("pricing", {}))
+        self.recent_requests = int(config.get("recent_requests", 200))
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._total = _empty_totals()
+            self._by_role: dict[str, dict] = {}
+            self._by_chat: dict[str, dict] = {}
+            self._by_chat_role: dict[str, dict[str, dict]] = {}
+            self._by_model: dict[str, dict] = {}
+            self._requests: OrderedDict[str, dict] = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def scope(self, **attributes) -> Iterator[None]:
+        """Attribute calls made inside the block to *attributes* (``role``, ``chat_id``, ``request_id``).
+
+        Nested scopes add to the outer one. The scope is a context variable, so
+        executor threads see it when their callable is wrapped with `tracer.bind`.
+        """
+        token = _usage_scope.set({**_usage_scope.get(), **attributes})
+        try:
+            yield
+        finally:
+            _usage_scope.reset(token)
+
+    @staticmethod
+    def parse_usage(structure: str, response: dict) -> dict | None:
+        """Normalized token counts of a provider response or stream event, None if it carries none."""
+        if structure == "google-compatible":
+            metadata = response.get("usageMetadata")
+            if not metadata:
+                return None
+            reasoning = int(metadata.get("thoughtsTokenCount", 0))
+            output = int(metadata.get("candidatesTokenCount", 0)) + reasoning
+            prompt = int(metadata.get("promptTokenCount", 0))
+            return {
+                "prompt_tokens": prompt,
+                "cached_tokens": int(metadata.get("cachedContentTokenCount", 0)),
+                "output_tokens": output,
+                "reasoning_tokens": reasoning,
+                "total_tokens": int(metadata.get("totalTokenCount", prompt + output)),
+            }
+        usage = response.get("usage")
+        if not usage:
+            return None
+        prompt = int(usage.get("prompt_tokens") or 0)
+        output = int(usage.get("completion_tokens") or 0)
+        return {
+            "prompt_tokens": prompt,
+            "cached_tokens": int((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0),
+            "output_tokens": output,
+            "reasoning_tokens": int((usage.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0),
+            "total_tokens": int(usage.get("total_tokens") or prompt + output),
+        }
+
+    def record(self, provider: str, model_id: str, usage: dict) -> dict | None:
+        """Add one call's normalized *usage* to the totals of the current scope. Returns the log entry."""
+        if not self.active:
+            return None
+        scope = _usage_scope.get()
+        model_key = f"{provider}/{model_id}"
+        role = scope.get("role", "unknown")
+        chat_id = str(scope.get("chat_id", "unknown"))
+        request_id = scope.get("request_id")
+        entry = dict(
+            {field: int(usage.get(field, 0)) for field in TOKEN_FIELDS},
+            role=role, chat_id=chat_id, request_id=request_id, model=model_key,
+            cost=self._cost(model_key, usage),
+        )
+
+        with self._lock:
+            buckets = [
+                self._total,
+                self._by_role.setdefault(role, _empty_totals()),
+                self._by_chat.setdefault(chat_id, _empty_totals()),
+                self._by_chat_role.setdefault(chat_id, {}).setdefault(role, _empty_totals()),
+                self._by_model.setdefault(model_key, _empty_totals()),
+            ]
+            if request_id:
+                request = self._requests.get(request_id)
+                if request is None:
+                    request = self._requests[request_id] = {"chat_id": chat_id, "total": _empty_totals(), "by_role": {}}
+                    while len(self._requests) > self.recent_requests:
+                        self._requests.popitem(last=False)
+                buckets += [request["total"], request["by_role"].setdefault(role, _empty_totals())]
+            for bucket in buckets:
+                bucket["calls"] += 1
+                bucket["cost"] += entry["cost"]
+                for field in TOKEN_FIELDS:
+                    bucket[field] += entry[field]
+
+        payload_logger.log("usage", entry)
+        return entry
+
+    def get_stats(self) -> dict:
+        """Totals overall and per role, chat and model."""
+        with self._lock:
+            return {
+                "total": dict(self._total),
+                "by_role": {key: dict(value) for key, value in self._by_role.items()},
+                "by_chat": {key: dict(value) for key, value in self._by_chat.items()},
+                "by_model": {key: dict(value) for key, value in self._by_model.items()},
+            }
+
+    def get_request(self, request_id: str) -> dict | None:
+        """Totals of one recent request (the last ``recent_requests`` are kept), per role."""
+        with self._lock:
+            request = self._requests.get(request_id)
+            if request is None:
+                return None
+            return {
+                "chat_id": request["chat_id"],
+                "total": dict(request["total"]),
+                "by_role": {key: dict(value) for key, value in request["by_role"].items()},
+            }
+
+    def get_chat(self, chat_id: str) -> dict:
+        """Totals of one chat, per role."""
+        with self._lock:
+            return {
+                "total": dict(self._by_chat.get(str(chat_id), _empty_totals())),
+                "by_role": {key: dict(value) for key, value in self._by_chat_role.get(str(chat_id), {}).items()},
+            }
+
+    def format_chat_report(self, chat_id: str) -> str:
+        """Short plain-text usage summary for a chat, with its heaviest roles."""
+        stats = self.get_chat(chat_id)
+        chat = stats["total"]
+        lines = [
+            f"Usage in this chat: {chat['calls']} calls, {chat['prompt_tokens']} prompt tokens "
+            f"({chat['cached_tokens']} cached), {chat['output_tokens']} output tokens, ${chat['cost']:.4f}.",
+            "Tokens by role:",
+        ]
+        roles = sorted(stats["by_role"].items(), key=lambda item: item[1]["total_tokens"], reverse=True)
+        for role, totals in roles:
+            lines.append(f"- {role}: {totals['total_tokens']} tokens in {totals['calls']} calls")
+        return "\n".join(lines)
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    def _cost(self, model_key: str, usage: dict) -> float:
+        prices = self.pricing.get(model_key)
+        if not prices:
+            return 0.0
+        cached = usage.get("cached_tokens", 0)
+        input_price = float(prices.get("input", 0.0))
+        return (
+            (usage.get("prompt_tokens", 0) - cached) * input_price
+            + cached * float(prices.get("cached_input", input_price))
+            + usage.get("output_tokens", 0) * float(prices.get("output", 0.0))
+        ) / 1_000_000
+
+
+# Process-wide tracker shared by every ProvidersManager (the pipeline and MemoryRAG)
+usage_tracker = UsageTracker()
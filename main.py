@@ -2,7 +2,7 @@ import dotenv
 dotenv.load_dotenv()
 
 from imports.image_manager import ImageManager
-from imports.history_manager import HistoryManager
+from imports.history_manager import ChatHistories
 from prompt_toolkit import PromptSession
 from imports.plugins.telegram import bot_process, stop_bot
 from threading import Thread
@@ -18,6 +18,11 @@ from imports.messaging.backend_worker import backend_worker_loop
 from imports.agent.pipeline.pipeline_engine import PipelineEngine
 from imports.providers_manager import ProvidersManager, Model
 from imports.mcp.connector import MCPConnector
+from imports.response_cache import ResponseCache
+from imports.payload_logger import payload_logger
+from imports.tracing import tracer
+from imports.traffic_archive import traffic_archive
+from imports.usage_tracker import usage_tracker
 
 CONFIG_PATH = "config/config.json"
 USE_TELEGRAM_FRONTEND = True
@@ -41,7 +46,7 @@ def console_input_loop(bus: MessageBus) -> None:
         bus.send_to_backend(AgentRequest(
             frontend_type="console",
             chat_id="console",
-            action="message",
+            action="usage" if user_input == "/usage" else "message",
             text=user_input
         ))
 
@@ -50,11 +55,25 @@ def main():
     if not config:
         return
 
+    payload_logger.configure(config.get("logging", {}))
+    tracer.configure(config.get("tracing", {}))
+    traffic_archive.configure(config.get("traffic", {}))
+    usage_tracker.configure(config.get("usage", {}))
+
     bus = MessageBus()
     image_manager = ImageManager()
 
     # Initialize components for PipelineEngine
-    providers_manager = ProvidersManager(config.get("providers", {}))
+    cache_config = config.get("response_cache", {})
+    response_cache = None
+    # Replayed traffic must reach the transports, so the response cache is bypassed
+    if cache_config.get("active", False) and traffic_archive.mode != "replay":
+        response_cache = ResponseCache(
+            path=cache_config.get("path", "./data/cache/llm/"),
+            max_entries=cache_config.get("max_entries", 512),
+            ttl_seconds=cache_config.get("ttl_seconds", 3600),
+        )
+    providers_manager = ProvidersManager(config.get("providers", {}), response_cache=response_cache)
     model = Model(**config.get("agent", {}).get("model", {}))
     
     # Init MCP connector
@@ -83,6 +102,8 @@ def main():
                 print(f"[Image: {img_hash}]")
         elif response.type == "status_update":
             print(f"[STATUS]: {response.text}")
+        elif response.type == "partial_response":
+            pass  # The console prints only the complete answer
         elif response.type == "error":
             print(f"[ERROR]: {response.text}")
         else:
@@ -91,17 +112,18 @@ def main():
     bus.register_frontend("console", console_response_handler)
     # Telegram registers itself in bot_process
 
-    # Initialize HistoryManager
+    # Initialize per-chat histories
     # Here we can pass a specific path if configured, or default
     history_path = config.get("context", {}).get("history_path", "./data/history.json")
-    history_manager = HistoryManager(history_path)
+    histories = ChatHistories(history_path)
 
     # 1. Start generic queues processor
     frontend_listener_thread = Thread(target=frontend_listener_loop, args=(bus,), daemon=True)
     frontend_listener_thread.start()
     
     # 2. Start the Backend Processing loop
-    backend_thread = Thread(target=backend_worker_loop, args=(bus, pipeline_engine, history_manager), daemon=True)
+    pipeline_workers = config.get("pipeline", {}).get("workers", 1)
+    backend_thread = Thread(target=backend_worker_loop, args=(bus, pipeline_engine, histories, pipeline_workers), daemon=True)
     backend_thread.start()
 
     # 3. Start Frontends